@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Commits introducing the errors of the files.
+
+``git blame`` gives the commit that last touched the line of an error. It is
+the one that introduced the error when its version of the file has the error
+and the version of its parent does not, which takes two checks. Otherwise,
+e.g. for an unused import whose use was removed by another commit, the
+versions of the file are bisected for the first one having the error, which
+takes O(log n) checks for n versions instead of checking them all.
+
+An error is recognized in the other versions by its code, its message and
+the text of its line, wherever the line is. The results of the versions are
+looked up by blob in the store, and kept there once checked.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import functools
+import re
+
+from . import results
+from .mirror import MirrorError, _git
+from .receive import read_objects
+from .worker import check_batch
+
+UNCOMMITTED = "0" * 40
+"""Commit of the errors introduced by the working tree."""
+
+_re_error = re.compile(r"^(\d+)(?::\d+)?: (.*)$", re.DOTALL)
+_re_blame = re.compile(r"^([0-9a-f]{40,64}) (\d+) (\d+)")
+
+
+def _signature(error, lines):
+    """Identify an error across the versions of its file.
+
+    :param lines: lines of the file
+    :return: the message of the error, with its code, and the text of its
+        line
+    :rtype: tuple
+    """
+    match = _re_error.match(error)
+    if not match:
+        return error, None
+    line = int(match.group(1))
+    text = lines[line - 1].strip() if 0 < line <= len(lines) else None
+    return match.group(2), text
+
+
+def _signatures(errors, content):
+    lines = content.decode("utf-8", "replace").splitlines()
+    return [_signature(error, lines) for error in errors]
+
+
+def find_blobs(names, git_dir=None):
+    """Get the blobs of files with one ``git cat-file --batch-check``.
+
+    :param names: ``revision:path`` of the files
+    :return: blob by name, None for the missing files
+    :rtype: dict
+    """
+    names = list(names)
+    if not names:
+        return {}
+    stdout = _git(["cat-file", "--batch-check"], git_dir,
+                  stdin="".join(name + "\n" for name in names).encode(
+                      "utf-8"))
+    blobs = {}
+    for name, line in zip(names, stdout.decode("utf-8").splitlines()):
+        fields = line.split()
+        blobs[name] = fields[0] if fields[1:2] == ["blob"] else None
+    return blobs
+
+
+def file_versions(revision, path, git_dir=None):
+    """List the versions of a file, without following its renames.
+
+    :param revision: last commit of the history
+    :return: ``(commit, blob)`` of the commits changing the file, oldest
+        first, the blob is None when the file is deleted
+    :rtype: list
+    """
+    stdout = _git(["log", "--format=%H", "--topo-order", "--reverse",
+                   revision, "--", path], git_dir)
+    shas = stdout.decode("ascii").split()
+    blobs = find_blobs(["{0}:{1}".format(sha, path) for sha in shas],
+                       git_dir)
+    versions = []
+    for sha in shas:
+        blob = blobs["{0}:{1}".format(sha, path)]
+        if not versions or versions[-1][1] != blob:
+            versions.append((sha, blob))
+    return versions
+
+
+def blame_lines(revision, path, lines, content=None, git_dir=None):
+    """Get the commits that last touched lines of a file.
+
+    :param revision: commit the file is read from
+    :param lines: line numbers
+    :param content: content of the file in the working tree, its lines are
+        blamed from ``HEAD`` instead of the commit, the new ones on
+        :data:`UNCOMMITTED`
+    :return: ``(commit, line, path)`` of the lines by line number, with the
+        line number and the path in the commit
+    :rtype: dict
+    """
+    lines = sorted(set(line for line in lines if line))
+    if not lines:
+        return {}
+    args = ["blame", "--line-porcelain"]
+    for line in lines:
+        args += ["-L", "{0},{0}".format(line)]
+    if content is not None:
+        args += ["--contents", "-"]
+    else:
+        args.append(revision)
+    stdout = _git(args + ["--", path], git_dir, stdin=content)
+    blamed = {}
+    entry = None
+    for line in stdout.decode("utf-8", "replace").split("\n"):
+        match = _re_blame.match(line)
+        if match:
+            entry = match.group(1), int(match.group(2)), int(match.group(3))
+        elif line.startswith("filename ") and entry is not None:
+            blamed[entry[2]] = (entry[0], entry[1], line[len("filename "):])
+            entry = None
+    return blamed
+
+
+class Blame(object):
+    """Find the commits introducing the errors of the files."""
+
+    def __init__(self, options, git_dir=None, store=None):
+        """Initialize the search.
+
+        :param options: options of the checks
+        :param git_dir: the git directory, ``GIT_DIR`` by default
+        :param store: where to look the results of the versions up
+        :type store: :class:`kwalitee.results.ResultStore`
+        """
+        self.options = options
+        self.git_dir = git_dir
+        self.store = store
+        self.policy = results.fingerprint(options)
+        self.checks = 0
+        self.lookups = 0
+        self._signatures = {}
+
+    def signatures(self, path, blob, content=None):
+        """Get the errors of a version of a file, checking it if unknown.
+
+        :param path: path the file is checked as
+        :param blob: blob of the version, None if the file is missing
+        :param content: content of the version, read from the repository by
+            default
+        :return: number of errors by signature
+        :rtype: :class:`collections.Counter`
+        """
+        if blob is None:
+            return collections.Counter()
+        if (path, blob) in self._signatures:
+            return self._signatures[(path, blob)]
+        self.lookups += 1
+        if content is None:
+            content = read_objects([blob], self.git_dir)[blob] or b""
+        key = results.file_key(path, blob, self.policy)
+        errors = self.store.get(key) if self.store is not None else None
+        if errors is None:
+            self.checks += 1
+            errors = check_batch([(path, content)], self.options)[0]
+            errors = [str(error) for error in errors or ()]
+            if self.store is not None:
+                self.store.set(key, errors)
+        signatures = collections.Counter(_signatures(errors, content))
+        self._signatures[(path, blob)] = signatures
+        return signatures
+
+    def find(self, path, errors, revision="HEAD", content=None):
+        """Find the commits introducing the errors of a file.
+
+        :param path: path of the file
+        :param errors: errors of the file at the revision
+        :param revision: commit the errors were found in
+        :param content: content of the file in the working tree, on top of
+            the revision which is then ``HEAD``, the errors it introduces
+            are attributed to :data:`UNCOMMITTED`
+        :return: SHA of the commit introducing each error, None if unknown
+        :rtype: list
+        """
+        try:
+            versions = file_versions(revision, path, self.git_dir)
+        except MirrorError:
+            # no commit yet
+            versions = []
+        committed = bool(versions) and versions[-1][1] is not None
+        if content is not None:
+            blob = results.blob_id(content)
+            if not versions or versions[-1][1] != blob:
+                versions.append((UNCOMMITTED, blob))
+        elif committed:
+            content = read_objects([versions[-1][1]], self.git_dir)[
+                versions[-1][1]] or b""
+        if not versions or versions[-1][1] is None:
+            return [None] * len(errors)
+        self.signatures(path, versions[-1][1], content)
+
+        # the same error may be reported on several identical lines, the
+        # n-th of them is introduced once there are n of them
+        occurrences = collections.Counter()
+        wanted = []
+        for signature in _signatures(errors, content):
+            occurrences[signature] += 1
+            wanted.append((signature, occurrences[signature]))
+
+        lines = [_re_error.match(error) for error in errors]
+        # git blame refuses the lines beyond the end, e.g. of W391
+        length = len(content.splitlines())
+        lines = [int(match.group(1)) if match and
+                 0 < int(match.group(1)) <= length else None
+                 for match in lines]
+        blamed = {}
+        if committed:
+            blamed = blame_lines(revision, path, lines, content=content if
+                                 versions[-1][0] == UNCOMMITTED else None,
+                                 git_dir=self.git_dir)
+        candidates = self._candidates(versions, set(blamed.values()))
+
+        commits = []
+        for line, (signature, count) in zip(lines, wanted):
+            present = functools.partial(self._present, path, signature,
+                                        count)
+            commit = candidates.get(blamed.get(line))
+            if commit is None or not present(commit[1]) or \
+                    present(commit[2]):
+                commit = self._bisect(versions, present)
+            commits.append(commit[0])
+        return commits
+
+    def _present(self, path, signature, count, blob):
+        return self.signatures(path, blob)[signature] >= count
+
+    def _candidates(self, versions, blamed):
+        """Get the versions of the blamed commits and of their parents.
+
+        :param blamed: ``(commit, line, path)`` given by
+            :func:`blame_lines`
+        :return: ``(commit, blob, parent blob)`` by blamed line
+        :rtype: dict
+        """
+        names = []
+        for sha, _, name in blamed:
+            if sha != UNCOMMITTED:
+                names += ["{0}:{1}".format(sha, name),
+                          "{0}^:{1}".format(sha, name)]
+        blobs = find_blobs(names, self.git_dir)
+        candidates = {}
+        for sha, line, name in blamed:
+            if sha == UNCOMMITTED:
+                # the working tree on top of the last commit
+                parent = versions[-2][1] if len(versions) > 1 else None
+                candidates[(sha, line, name)] = (sha, versions[-1][1],
+                                                 parent)
+            else:
+                candidates[(sha, line, name)] = (
+                    sha, blobs["{0}:{1}".format(sha, name)],
+                    blobs["{0}^:{1}".format(sha, name)])
+        return candidates
+
+    def _bisect(self, versions, present):
+        """Find the first version having the error, the last one has it.
+
+        :return: the commit of the version
+        :rtype: tuple
+        """
+        low, high = 0, len(versions) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if present(versions[middle][1]):
+                high = middle
+            else:
+                low = middle + 1
+        return versions[low]
@@ -25,7 +25,8 @@
 
 import click
 
-from . import check, githooks, prepare
+from . import check, githooks, lsp, mirror, prepare, serve, status, watch, \
+    worker
 
 
 @click.group()
@@ -39,3 +40,9 @@ def main():  # pragma: no cover
 main.add_command(githooks.githooks)
 main.add_command(prepare.prepare)
 main.add_command(check.check)
+main.add_command(status.status)
+main.add_command(watch.watch)
+main.add_command(lsp.lsp)
+main.add_command(serve.serve)
+main.add_command(mirror.mirror)
+main.add_command(worker.worker)
@@ -33,10 +33,9 @@ from tempfile import mkdtemp
 
 import click
 import colorama
-import yaml
 
-from ..hooks import _read_local_kwalitee_configuration
-from ..kwalitee import get_options
+from .. import results
+from ..options import load_options, load_yaml
 
 
 class Repo(object):
@@ -45,13 +44,9 @@ class Repo(object):
     def __init__(self, repository='.', config=None):
         """Store information about repository and get kwalitee options."""
         self.repository = repository
-        self.options = get_options()
-        self.options.update(_read_local_kwalitee_configuration(
-            directory=repository))
+        self.options = load_options(repository)
         if config:
-            self.options.update(
-                yaml.load(config.read())
-            )
+            self.options = self.options.merge(load_yaml(config.read()))
 
 
 pass_repo = click.make_pass_decorator(Repo)
@@ -146,6 +141,10 @@ def message(obj, commit='HEAD', skip_merge_commits=False):
     template = '{0}commit {{commit.{1}}}{2}\n\n'.format(yellow, sha, reset)
     template += '{message}{errors}'
 
+    # the messages checked by the hooks are not checked again
+    store = results.get_store(repository)
+    policy = results.fingerprint(options, results.MESSAGE)
+
     count = 0
     ident = '    '
     re_line = re.compile('^', re.MULTILINE)
@@ -153,7 +152,11 @@ def message(obj, commit='HEAD', skip_merge_commits=False):
         if skip_merge_commits and _is_merge_commit(commit):
             continue
         message = commit.message
-        errors = check_message(message, **options)
+        if store is None or not message or message.isspace():
+            errors = check_message(message, **options)
+        else:
+            errors = store.cached(results.message_key(message, policy),
+                                  check_message, message, **options)
         message = re.sub(re_line, ident, message)
         if errors:
             count += 1
@@ -175,14 +178,41 @@ def message(obj, commit='HEAD', skip_merge_commits=False):
                 default='HEAD')  # , help='an integer for the accumulator')
 @click.option('-s', '--skip-merge-commits', is_flag=True,
               help='skip merge commits')
+@click.option('--profile', is_flag=True,
+              help='print the time spent by each checker')
+@click.option('--profile-top', type=int, default=10, metavar='N',
+              help='number of the slowest files and checks to print')
+@click.option('--profile-stats', type=click.Path(file_okay=False),
+              default=None, metavar='DIRECTORY',
+              help='dump the cProfile stats of the slowest files')
+@click.option('--final-state', is_flag=True,
+              help='check only the last version of the files changed by the '
+                   'range, once each')
+@click.option('--blame', is_flag=True,
+              help='with --final-state, give the commit that introduced '
+                   'each error')
+@click.option('-j', '--processes', type=int, default=1,
+              help='with --final-state, number of processes checking at the '
+                   'same time, 0 for all the CPUs')
 @pass_repo
-def files(obj, commit='HEAD', skip_merge_commits=False):
-    """Check the files of the commits."""
-    from ..kwalitee import check_file, SUPPORTED_FILES
+def files(obj, commit='HEAD', skip_merge_commits=False, profile=False,
+          profile_top=10, profile_stats=None, final_state=False, blame=False,
+          processes=1):
+    """Check the files of the commits.
+
+    With ``--final-state``, the files changed between the merge base of the
+    range and its last commit are checked at their version of the last
+    commit, instead of every version of every commit.
+    """
+    from ..kwalitee import check_file, filter_files, SUPPORTED_FILES
     from ..hooks import run
+    from .. import profiler
     options = obj.options
     repository = obj.repository
 
+    if profile or profile_stats:
+        profiler.start(top=profile_top, cprofile=bool(profile_stats))
+
     if options.get('colors') is not False:
         colorama.init(autoreset=True)
         reset = colorama.Style.RESET_ALL
@@ -192,6 +222,14 @@ def files(obj, commit='HEAD', skip_merge_commits=False):
     else:
         reset = yellow = green = red = ''
 
+    if final_state:
+        count = _final_state(commit, options, repository, blame, processes,
+                             colors=(reset, yellow, green, red))
+        _print_profile(profile_stats)
+        if count:
+            raise click.Abort
+        return
+
     try:
         sha = 'oid'
         commits = _pygit2_commits(commit, repository)
@@ -236,6 +274,10 @@ def files(obj, commit='HEAD', skip_merge_commits=False):
             return error_template.format(filename=filename, errors='\n'.join(
                 errors if len(errors) else no_errors))
 
+    # the files checked by the hooks are not checked again
+    store = results.get_store(repository)
+    policy = results.fingerprint(options)
+
     count = 0
     ident = '    '
     re_line = re.compile('^', re.MULTILINE)
@@ -247,19 +289,34 @@ def files(obj, commit='HEAD', skip_merge_commits=False):
         tmpdir = mkdtemp()
         errors = {}
         try:
-            for filename in _get_files_modified(commit):
+            # the content of the excluded files and of the ones without any
+            # check is not needed to report on them
+            files_modified, excluded, unchecked = filter_files(
+                _get_files_modified(commit), root=tmpdir, **options)
+            errors.update((filename, None) for filename in excluded)
+            errors.update((filename, []) for filename in unchecked)
+            for filename in files_modified:
                 cmd = "git show {commit_sha}:{filename}"
                 _, out, _ = run(cmd.format(commit_sha=commit_sha,
                                            filename=filename),
                                 raw_output=True)
+                key = results.file_key(filename, results.blob_id(out),
+                                       policy)
+                if store is not None:
+                    errors[filename] = store.get(key)
+                    if errors[filename] is not None:
+                        continue
 
                 destination = os.path.join(tmpdir, filename)
                 _ensure_directory(destination)
 
-                with open(destination, 'w+') as f:
+                with open(destination, 'wb') as f:
                     f.write(out)
 
-                errors[filename] = check_file(destination, **options)
+                errors[filename] = check_file(destination, root=tmpdir,
+                                              **options)
+                if store is not None and errors[filename] is not None:
+                    store.set(key, errors[filename])
         finally:
             shutil.rmtree(tmpdir, ignore_errors=True)
 
@@ -274,10 +331,134 @@ def files(obj, commit='HEAD', skip_merge_commits=False):
                                    message=message.encode('utf-8'),
                                    errors='\n'.join(errors)))
 
+    _print_profile(profile_stats)
+
     if min(count, 1):
         raise click.Abort
 
 
+def _print_profile(profile_stats=None):
+    from .. import profiler
+    if profiler.enabled():
+        stats = profiler.stop()
+        for line in stats.report():
+            click.echo(line, file=sys.stderr)
+        if profile_stats:
+            for filename in stats.dump_stats(profile_stats):
+                click.echo(filename, file=sys.stderr)
+
+
+def _final_state(revision, options, repository, blame, processes, colors):
+    """Check the final state of the files of the range.
+
+    :return: the number of files with errors
+    :rtype: int
+    """
+    from ..blame import Blame
+    from ..kwalitee import is_warning
+    from ..receive import check_files, diff_files
+    from ..state import get_git_directory
+    reset, yellow, green, red = colors
+
+    git_dir = get_git_directory(repository)
+    if git_dir is None:
+        click.echo('ERROR: Please run from within a GIT repository.',
+                   file=sys.stderr)
+        raise click.Abort
+    head, changed = diff_files(revision, git_dir)
+    store = results.get_store(repository)
+    errors = check_files(changed, options, git_dir=git_dir,
+                         processes=processes or None, store=store)
+    blamer = Blame(options, git_dir=git_dir, store=store) if blame else None
+
+    count = 0
+    for filename in sorted(errors):
+        file_errors = errors[filename]
+        if file_errors is None:
+            click.echo('{0}{1} excluded.{2}'.format(yellow, filename, reset))
+            continue
+        if not file_errors:
+            continue
+        if not all(is_warning(error) for error in file_errors):
+            count += 1
+        if blamer is not None:
+            file_errors = _blame_errors(blamer, filename, file_errors, head)
+        click.echo('{0}{1}\n{2}{3}{0}'.format(reset, filename, red,
+                                              '\n'.join(file_errors)))
+
+    if not count:
+        click.echo('{0}Everything is OK.{1}'.format(green, reset))
+    return count
+
+
+def _blame_errors(blamer, filename, errors, revision, content=None):
+    """Prefix the errors with the commit that introduced them."""
+    commits = blamer.find(filename, errors, revision, content=content)
+    return ['{0:7} {1}'.format((commit or '-')[:7], error)
+            for commit, error in zip(commits, errors)]
+
+
+@check.command()
+@click.option('-v', '--verbose', is_flag=True,
+              help='also list the files without errors')
+@click.option('--blame', is_flag=True,
+              help='give the commit that introduced each error, 0000000 if '
+                   'it is not committed yet')
+@pass_repo
+def worktree(obj, verbose=False, blame=False):
+    """Check the files of the working tree.
+
+    Only the files modified since the last run are checked again.
+    """
+    from ..blame import Blame
+    from ..kwalitee import is_warning
+    from ..state import get_git_directory
+    from ..worktree import check_worktree, get_root
+    options = obj.options
+
+    if options.get('colors') is not False:
+        colorama.init(autoreset=True)
+        reset = colorama.Style.RESET_ALL
+        yellow = colorama.Fore.YELLOW
+        green = colorama.Fore.GREEN
+        red = colorama.Fore.RED
+    else:
+        reset = yellow = green = red = ''
+
+    root = get_root(obj.repository)
+    if root is None:
+        click.echo('ERROR: Please run from within a GIT repository.',
+                   file=sys.stderr)
+        raise click.Abort
+
+    store = results.get_store(root)
+    errors = check_worktree(root, options, store=store)
+    blamer = None
+    if blame:
+        blamer = Blame(options, git_dir=get_git_directory(root), store=store)
+
+    count = 0
+    for filename in sorted(errors):
+        file_errors = errors[filename]
+        if file_errors:
+            if not all(is_warning(error) for error in file_errors):
+                count += 1
+            if blamer is not None:
+                with open(os.path.join(root, filename), 'rb') as f:
+                    file_errors = _blame_errors(blamer, filename, file_errors,
+                                                'HEAD', content=f.read())
+            click.echo('{0}{1}\n{2}{3}{0}'.format(
+                reset, filename, red, '\n'.join(file_errors)))
+        elif verbose and file_errors is None:
+            click.echo('{0}{1} excluded.{2}'.format(yellow, filename, reset))
+        elif verbose:
+            click.echo(filename)
+
+    if count:
+        raise click.Abort
+    click.echo('{0}Everything is OK.{1}'.format(green, reset))
+
+
 @check.command()
 @click.argument('commit', metavar='<sha or branch>',
                 default='HEAD')  # , help='an integer for the accumulator')
@@ -340,3 +521,68 @@ def authors(obj, commit='HEAD', skip_merge_commits=False):
 
     if min(count, 1):
         raise click.Abort
+
+
+@check.command('all')
+@click.argument('commit', metavar='<sha or branch>', default='HEAD')
+@click.option('-s', '--skip-merge-commits', is_flag=True,
+              help='skip merge commits')
+@click.option('-j', '--processes', type=int, default=1,
+              help='number of processes checking at the same time, 0 for '
+                   'all the CPUs')
+@pass_repo
+def all_commits(obj, commit='HEAD', skip_merge_commits=False, processes=1):
+    """Check the messages, the authors and the files of the commits.
+
+    The commits are walked once and reported once, with the errors of the
+    three checks together. The authors files are read from each commit.
+    """
+    from ..receive import check_commits, list_commits
+    from ..state import get_git_directory
+    options = obj.options
+    repository = obj.repository
+
+    if options.get('colors') is not False:
+        colorama.init(autoreset=True)
+        reset = colorama.Style.RESET_ALL
+        yellow = colorama.Fore.YELLOW
+        green = colorama.Fore.GREEN
+        red = colorama.Fore.RED
+    else:
+        reset = yellow = green = red = ''
+
+    git_dir = get_git_directory(repository)
+    if git_dir is None:
+        click.echo('ERROR: Please run from within a GIT repository.',
+                   file=sys.stderr)
+        raise click.Abort
+
+    revisions = [commit]
+    if '..' not in commit:
+        revisions.insert(0, '--max-count=1')
+    if skip_merge_commits:
+        revisions.insert(0, '--no-merges')
+    report = check_commits(list_commits(revisions, git_dir), options,
+                           git_dir=git_dir, processes=processes or None,
+                           store=results.get_store(repository))
+
+    template = '{0}commit {{sha}}{1}\n\n{{message}}{{errors}}'.format(
+        yellow, reset)
+    count = 0
+    ident = '    '
+    re_line = re.compile('^', re.MULTILINE)
+    for commit in report.commits:
+        errors = report.errors[commit.sha]
+        if errors:
+            count += 1
+            errors = [red] + errors
+        else:
+            errors = [green, 'Everything is OK.']
+        errors.append(reset)
+        click.echo(template.format(sha=commit.sha,
+                                   message=re.sub(re_line, ident,
+                                                  commit.message),
+                                   errors='\n'.join(errors)))
+
+    if count:
+        raise click.Abort
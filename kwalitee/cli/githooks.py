@@ -26,11 +26,14 @@
 from __future__ import absolute_import, print_function
 
 import os
+import re
+import stat
 import sys
 
 import click
 
 from ..hooks import run
+from ..options import SUPPORTED_FILES, load_options
 
 HOOKS = {
     "pre-commit",
@@ -39,6 +42,82 @@ HOOKS = {
 }
 HOOK_PATH = os.path.join(".git", "hooks")
 
+SHIM_TEMPLATE = """#!/bin/sh
+# kwalitee pre-commit hook, written by 'kwalitee githooks install --shim'.
+#
+# Python is only started when a staged file may be checked. The exclude
+# patterns below are a copy of the ones of .kwalitee.yml, which is always
+# checked once modified after this file.
+hook="{executable}"
+
+config="$(git rev-parse --show-toplevel)/.kwalitee.yml"
+if [ -f "$config" ] && [ "$config" -nt "$0" ]; then
+    exec "$hook" "$@"
+fi
+if ! git rev-parse --verify -q HEAD > /dev/null; then
+    exec "$hook" "$@"
+fi
+
+git diff-index --cached --name-only --diff-filter=ACMRTUXB HEAD -- \\
+{pathspecs} | \\
+    sed 's|^|/|' | \\
+    grep -q -v -E -e '^$'{excludes} || exit 0
+
+exec "$hook" "$@"
+"""
+"""Shell script installed as the ``pre-commit`` hook with ``--shim``."""
+
+_re_safe_exclude = re.compile(r"^(?:\\[./_-]|[^\\\[\]'{}])*$")
+_re_leading_wildcard = re.compile(r"^(?:\.[*+]|\(\.[*+]?\)[*+])")
+
+
+def _shim_excludes(excludes):
+    """Select the exclude patterns that grep can be trusted with.
+
+    The shim drops a file only if kwalitee would exclude it. The patterns
+    are matched by kwalitee against the path within a temporary directory,
+    so only the ones starting with a wildcard, e.g. ``(.)+/legacy/``, and
+    using the syntax shared by Python and POSIX extended regex are kept.
+    The other ones are left to kwalitee.
+
+    :param excludes: list of regex
+    :return: the patterns for ``grep -E``
+    :rtype: list
+    """
+    patterns = []
+    for exclude in excludes or ():
+        if not exclude or "(?" in exclude or \
+                not _re_safe_exclude.match(exclude) or \
+                not _re_leading_wildcard.match(exclude):
+            continue
+        depth = 0
+        for char in exclude:
+            depth += {"(": 1, ")": -1}.get(char, 0)
+            if char == "|" and depth == 0:
+                break
+        else:
+            patterns.append(re.sub(r"\\([/_-])", r"\1", exclude))
+    return patterns
+
+
+def _write_shim(hook_path, executable, excludes=None):
+    """Write the shell script starting the pre-commit hook when needed.
+
+    :param hook_path: path of the hook
+    :param executable: kwalitee pre-commit hook
+    :param excludes: exclude patterns
+    """
+    pathspecs = " \\\n".join("    '*{0}'".format(ext)
+                             for ext in SUPPORTED_FILES)
+    excludes = "".join(" -e '^{0}'".format(exclude)
+                       for exclude in _shim_excludes(excludes))
+    with open(hook_path, "w") as fh:
+        fh.write(SHIM_TEMPLATE.format(executable=executable,
+                                      pathspecs=pathspecs,
+                                      excludes=excludes))
+    mode = os.stat(hook_path).st_mode
+    os.chmod(hook_path, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
 
 @click.group()
 def githooks():
@@ -48,7 +127,10 @@ def githooks():
 @githooks.command()
 @click.option("-f", "--force", is_flag=True,
               help="Overwrite existing hooks", default=False)
-def install(force=False):
+@click.option("--shim", is_flag=True, default=False,
+              help="Install a shell script as pre-commit hook, starting "
+                   "kwalitee only if a staged file may be checked")
+def install(force=False, shim=False):
     """Install git hooks."""
     ret, git_dir, _ = run("git rev-parse --show-toplevel")
     if ret != 0:
@@ -72,7 +154,12 @@ def install(force=False):
                 os.unlink(hook_path)
 
         source = os.path.join(sys.prefix, "bin", "kwalitee-" + hook)
-        os.symlink(os.path.normpath(source), hook_path)
+        if shim and hook == "pre-commit":
+            options = load_options(git_dir)
+            _write_shim(hook_path, os.path.normpath(source),
+                        options.get("excludes"))
+        else:
+            os.symlink(os.path.normpath(source), hook_path)
     return True
 
 
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Command-line tool starting the language server."""
+
+from __future__ import absolute_import
+
+import click
+
+
+@click.command()
+@click.option('--debounce', type=float, default=0.3, metavar='SECONDS',
+              help='time without modifications before checking')
+@click.pass_context
+def lsp(ctx, debounce=0.3):
+    """Publish the errors of the edited files, for the editors.
+
+    The Language Server Protocol is spoken on the standard streams.
+    """
+    from ..lsp import serve
+    ctx.exit(serve(debounce=debounce))
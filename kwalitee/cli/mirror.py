@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Command-line tools for the cache of bare mirrors."""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import sys
+from tempfile import mkdtemp
+
+import click
+import colorama
+
+from ..mirror import MirrorCache, MirrorError
+from ..options import CONFIGURATION_FILE, Options, get_options, load_yaml
+
+
+@click.group()
+@click.option('-d', '--directory', envvar='KWALITEE_MIRROR_CACHE',
+              default=os.path.join('~', '.cache', 'kwalitee', 'mirrors'),
+              help='where the mirrors are kept')
+@click.option('-b', '--budget', envvar='KWALITEE_MIRROR_BUDGET',
+              default=None, metavar='SIZE',
+              help='disk space of the mirrors, e.g. 2G')
+@click.pass_context
+def mirror(ctx, directory, budget):
+    """Manage the cache of bare mirrors."""
+    try:
+        ctx.obj = MirrorCache(os.path.expanduser(directory), budget=budget)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--budget')
+
+
+pass_cache = click.make_pass_decorator(MirrorCache)
+
+
+@mirror.command()
+@click.argument('url')
+@click.argument('refs', nargs=-1)
+@pass_cache
+def fetch(cache, url, refs=()):
+    """Create or update the mirror of URL."""
+    click.echo(cache.fetch(url, refs=refs))
+
+
+@mirror.command()
+@pass_cache
+def evict(cache):
+    """Remove the least recently used mirrors over the budget."""
+    for path in cache.evict():
+        click.echo(path)
+
+
+@mirror.command()
+@click.argument('url')
+@click.argument('revision', metavar='<sha or range>')
+@click.option('-c', '--config', type=click.File('rb'), default=None)
+@pass_cache
+def files(cache, url, revision, config=None):
+    """Check the files of the commits of URL, without cloning it.
+
+    Only the objects missing from the mirror are fetched.
+    """
+    from ..kwalitee import check_file, filter_files
+
+    try:
+        cache.ensure(url, revision.split('..')[-1] or 'HEAD')
+        commits = cache.list_commits(url, revision)
+    except MirrorError as e:
+        click.echo('ERROR: {0}'.format(e), file=sys.stderr)
+        raise click.Abort
+
+    overrides = load_yaml(config.read()) if config else {}
+    colors = overrides.get('colors', True) is not False
+    if colors:
+        colorama.init(autoreset=True)
+        reset = colorama.Style.RESET_ALL
+        yellow = colorama.Fore.YELLOW
+        green = colorama.Fore.GREEN
+        red = colorama.Fore.RED
+    else:
+        reset = yellow = green = red = ''
+
+    count = 0
+    with cache.use(url):
+        for sha in commits:
+            click.echo('{0}commit {1}{2}'.format(yellow, sha, reset))
+            content = cache.read_blobs(url, sha, [CONFIGURATION_FILE])[
+                CONFIGURATION_FILE]
+            options = Options(get_options()).merge(
+                load_yaml(content) or {} if content else {}).merge(overrides)
+
+            tmpdir = mkdtemp()
+            try:
+                checked, _, _ = filter_files(cache.changed_files(url, sha),
+                                             root=tmpdir, **options)
+                contents = cache.read_blobs(url, sha, checked)
+                errors = {}
+                for filename in checked:
+                    path = os.path.join(tmpdir, filename)
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    with open(path, 'wb') as fh:
+                        fh.write(contents[filename])
+                    errors[filename] = check_file(path, root=tmpdir,
+                                                  **options)
+            finally:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+
+            failed = [filename for filename in sorted(errors)
+                      if errors[filename]]
+            for filename in failed:
+                click.echo('\n{0}{1}\n{2}{3}{0}'.format(
+                    reset, filename, red, '\n'.join(errors[filename])))
+            if not failed:
+                click.echo('\n{0}Everything is OK.{1}'.format(green, reset))
+            click.echo()
+            count += len(failed)
+
+    if count:
+        raise click.Abort
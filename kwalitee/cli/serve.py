@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Command-line tool starting the webhook service."""
+
+from __future__ import absolute_import
+
+import logging
+
+import click
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', help='address to bind')
+@click.option('-p', '--port', type=int, default=8000, help='port to bind')
+@click.option('-c', '--config', 'config_file', metavar='FILE',
+              type=click.Path(exists=True, dir_okay=False),
+              help='python file overriding the configuration, '
+                   '$KWALITEE_CONFIG by default')
+def serve(host='127.0.0.1', port=8000, config_file=None):
+    """Check the pull requests and the pushes posted by Github.
+
+    Requires Python 3.5 or later.
+    """
+    from ..web import serve as run
+    from ..worker import load_config
+    logging.basicConfig(level=logging.INFO)
+    run(host=host, port=port, config=load_config(config_file))
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Command-line tool showing the results of the background checks."""
+
+from __future__ import absolute_import, print_function
+
+import os
+import sys
+
+import click
+
+from .. import status as store_module
+from ..repository import get_commit_tree, resolve_ref
+
+
+def _echo_record(record):
+    """Print the state and the errors of a background check."""
+    click.echo("{0} {1}: {2}".format(record.get("kind", "check"),
+                                     record["key"], record.get("state")))
+    for error in record.get("errors") or ():
+        click.echo("    {0}".format(error))
+
+
+@click.command()
+@click.argument('key', metavar='<sha>', required=False)
+@click.option('-r', '--repository', envvar='KWALITEE_REPO', default='.')
+@click.option('-a', '--all', 'show_all', is_flag=True,
+              help='show the recent checks')
+@click.option('-w', '--wait', is_flag=True,
+              help='wait for the check to be over')
+@click.pass_context
+def status(ctx, key=None, repository='.', show_all=False, wait=False):
+    """Show the results of the checks run in the background."""
+    store = store_module.get_store(repository)
+    if store is None:
+        click.echo("ERROR: Please run from within a GIT repository.",
+                   file=sys.stderr)
+        raise click.Abort
+
+    if show_all:
+        for record in store.list(limit=20):
+            _echo_record(record)
+        return
+
+    key = resolve_ref(key or "HEAD", repository) or key
+    if key and store.get(key) is None:
+        # abbreviated SHA
+        keys = [record["key"] for record in store.list()
+                if record["key"].startswith(key)]
+        if len(keys) == 1:
+            key = keys[0]
+    keys = [key]
+    # the files checked after the pre-commit hook are kept by tree
+    record = store.get(key) or {}
+    if key and record.get("kind") != "files" and \
+            os.path.isdir(store.directory):
+        try:
+            keys.append(get_commit_tree(key, repository))
+        except (IndexError, ValueError):
+            pass
+
+    records = []
+    for key in keys:
+        if wait:
+            record = store_module.wait(store, key)
+        else:
+            record = store.get(key)
+        if record is not None:
+            records.append(record)
+    if not records:
+        click.echo("Nothing checked in the background for {0}.".format(
+            keys[0]))
+        return
+
+    from ..kwalitee import is_warning
+    for record in records:
+        _echo_record(record)
+    if not all(is_warning(error) for record in records
+               for error in record.get("errors") or ()):
+        ctx.exit(1)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Command-line tool checking the working tree while it is edited."""
+
+from __future__ import absolute_import, print_function
+
+import sys
+
+import click
+import colorama
+
+from .. import watch as watching
+from ..options import load_options
+from ..worktree import get_root
+
+
+@click.command()
+@click.option('-r', '--repository', envvar='KWALITEE_REPO', default='.')
+@click.option('--polling', is_flag=True,
+              help='scan the files instead of using inotify')
+@click.option('--interval', type=float, default=1.0, metavar='SECONDS',
+              help='time between two scans of the files')
+@click.option('--debounce', type=float, default=0.2, metavar='SECONDS',
+              help='time without modifications before checking')
+def watch(repository='.', polling=False, interval=1.0, debounce=0.2):
+    """Check the modified files of the working tree, until interrupted."""
+    root = get_root(repository)
+    if root is None:
+        click.echo("ERROR: Please run from within a GIT repository.",
+                   file=sys.stderr)
+        raise click.Abort
+
+    if load_options(root).get('colors') is not False:
+        colorama.init(autoreset=True)
+        reset = colorama.Style.RESET_ALL
+        green = colorama.Fore.GREEN
+        red = colorama.Fore.RED
+    else:
+        reset = green = red = ''
+
+    def _report(changes):
+        for filename, errors in changes:
+            if errors:
+                click.echo('{0}{1}\n{2}{3}{0}'.format(
+                    reset, filename, red, '\n'.join(errors)))
+            else:
+                click.echo('{0}{1}: OK{2}'.format(green, filename, reset))
+
+    watcher = watching.get_watcher(root, polling=polling, interval=interval)
+    click.echo("Watching {0} ({1}), press Ctrl+C to stop.".format(
+        root, type(watcher).__name__), file=sys.stderr)
+    try:
+        watching.watch(root, _report, watcher=watcher, debounce=debounce)
+    except KeyboardInterrupt:
+        pass
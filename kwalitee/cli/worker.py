@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Command-line tools running the jobs of the durable queue."""
+
+from __future__ import absolute_import
+
+import json
+import logging
+import multiprocessing
+import signal
+import threading
+
+import click
+
+from ..worker import get_queue, load_config
+
+
+class Worker(object):
+    """Hold the configuration of the workers."""
+
+    def __init__(self, config_file=None, queue_path=None):
+        """Load the configuration."""
+        self.config = load_config(config_file)
+        if queue_path:
+            self.config["WORKER_QUEUE"] = queue_path
+        if not self.config.get("WORKER_QUEUE"):
+            raise click.UsageError("WORKER_QUEUE is not set, see --queue")
+
+    def queue(self):
+        """Open the queue."""
+        return get_queue(self.config)
+
+
+pass_worker = click.make_pass_decorator(Worker)
+
+
+@click.group()
+@click.option('-c', '--config', 'config_file', metavar='FILE',
+              type=click.Path(exists=True, dir_okay=False),
+              help='python file overriding the configuration, '
+                   '$KWALITEE_CONFIG by default')
+@click.option('-q', '--queue', 'queue_path', envvar='KWALITEE_QUEUE',
+              metavar='FILE', help='database of the queue, WORKER_QUEUE by '
+                                   'default')
+@click.pass_context
+def worker(ctx, config_file=None, queue_path=None):
+    """Run and manage the jobs of the durable queue."""
+    ctx.obj = Worker(config_file, queue_path)
+
+
+def _run(config, burst):
+    from ..worker import get_github, work
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    github = get_github(config)
+    queue = get_queue(config)
+    try:
+        return work(queue, github, config, burst=burst, stop=stop)
+    finally:
+        queue.close()
+        github.close()
+
+
+@worker.command()
+@click.option('-n', '--processes', type=int, default=1,
+              help='number of worker processes')
+@click.option('--burst', is_flag=True, help='exit once the queue is empty')
+@pass_worker
+def run(obj, processes=1, burst=False):
+    """Run the jobs of the queue.
+
+    The jobs of a worker whose lease expires are run again by the others.
+    """
+    logging.basicConfig(level=logging.INFO)
+    if processes <= 1:
+        _run(obj.config, burst)
+        return
+
+    children = [multiprocessing.Process(target=_run,
+                                        args=(obj.config, burst))
+                for _ in range(processes)]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+            child.join()
+
+
+@worker.command()
+@pass_worker
+def stats(obj):
+    """Count the jobs by state and by repository."""
+    queue = obj.queue()
+    try:
+        click.echo(json.dumps(queue.stats(), indent=2, sort_keys=True))
+    finally:
+        queue.close()
+
+
+@worker.command()
+@pass_worker
+def dead(obj):
+    """List the dead letters, the jobs that failed too many times."""
+    queue = obj.queue()
+    try:
+        for job, attempts, error in queue.dead_letters():
+            click.echo('{0} {1} {2} ({3} attempts)'.format(
+                job['id'], job.get('key'), job.get('sha'), attempts))
+            if error:
+                click.echo('    ' + error.strip().splitlines()[-1])
+    finally:
+        queue.close()
+
+
+@worker.command()
+@click.argument('job_ids', nargs=-1, required=True, metavar='ID...')
+@pass_worker
+def retry(obj, job_ids):
+    """Queue dead jobs again."""
+    queue = obj.queue()
+    try:
+        for job_id in job_ids:
+            if not queue.retry(job_id):
+                click.echo('{0} is not a dead job.'.format(job_id), err=True)
+    finally:
+        queue.close()
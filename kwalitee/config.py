@@ -88,6 +88,57 @@ To change it, put a config.py into your instance.
 
     **Default:** ``True``
 
+.. py:data:: CHECK_TIMEOUT
+
+    Time budget in seconds of each file checker, or a dict of budgets by
+    checker name (``pep8``, ``pydocstyle``, ``license`` or ``default``). When
+    it is set, the checkers run in supervised processes and a file exceeding
+    its budget gets a ``K100`` error instead of stalling the run.
+
+    **Default:** ``None``
+
+.. py:data:: CHECK_MEMORY_LIMIT
+
+    Memory budget in megabytes of each file checker, or a dict of budgets by
+    checker name. A file exceeding it gets a ``K101`` error.
+
+    **Default:** ``None``
+
+.. py:data:: MAX_FILE_SIZE
+
+    Size in bytes above which the expensive checkers (PEP8 and PYDOCSTYLE) are
+    skipped with a ``K110`` warning. The warning is reported but does not
+    fail the check.
+
+    **Default:** ``None``
+
+.. py:data:: POST_COMMIT_BACKGROUND
+
+    Check the commit message in a detached process instead of within the
+    ``post-commit`` hook. The results are kept by commit in the ``.git``
+    directory and shown by ``kwalitee status``. Committing again cancels the
+    check of the previous commit if it is still running.
+
+    **Default:** ``False``
+
+.. py:data:: PRE_COMMIT_BUDGET
+
+    Time budget in seconds of the ``pre-commit`` hook. The license checks
+    always run within the hook. The PEP8 and PYDOCSTYLE checks run file by file
+    until the budget is spent, the files left are checked in a detached process
+    and their errors are shown by the ``post-commit`` hook or ``kwalitee
+    status``. An error found within the hook still aborts the commit.
+
+    **Default:** ``None``
+
+.. py:data:: PRE_RECEIVE_BUDGET
+
+    Time budget in seconds of the ``pre-receive`` hook of a bare repository,
+    see :mod:`kwalitee.receive`. The push is refused when the checks are not
+    over within it, unless the hook runs with ``--accept-on-timeout``.
+
+    **Default:** ``None``
+
 .. py:data:: IGNORE
 
     Error codes to ignore.
@@ -100,13 +151,96 @@ To change it, put a config.py into your instance.
 
     **Default:** ``[]``
 
+.. py:data:: GITHUB_API
+
+    Base URL of the Github API used by the webhook service.
+
+    **Default:** ``"https://api.github.com/"``
+
+.. py:data:: GITHUB_CONNECTIONS
+
+    Number of connections to the API kept alive, and of requests publishing
+    the results of a job at the same time.
+
+    **Default:** ``4``
+
+.. py:data:: WEBHOOK_SECRET
+
+    Secret of the webhook, the payloads whose signature does not match are
+    refused.
+
+    **Default:** ``None``
+
+.. py:data:: WORKER_JOBS
+
+    Number of jobs the webhook service runs at the same time.
+
+    **Default:** ``4``
+
+.. py:data:: WORKER_PROCESSES
+
+    Number of processes the checks of the webhook service run in.
+
+    **Default:** the number of CPUs
+
+.. py:data:: MIRROR_CACHE
+
+    Directory of the :mod:`bare mirrors <kwalitee.mirror>` the webhook service
+    reads the files from, instead of downloading each of them from the API.
+
+    **Default:** ``None``
+
+.. py:data:: MIRROR_BUDGET
+
+    Disk space of the mirrors, e.g. ``"2G"``, the least recently used ones
+    are removed beyond it.
+
+    **Default:** ``None``, unlimited
+
+.. py:data:: WORKER_WEIGHTS
+
+    Share of the webhook service by repository, e.g.
+    ``{"inveniosoftware/invenio": 2}``. The queued jobs and the checks of the
+    repositories are served in proportion of their weight, 1 by default.
+
+    **Default:** ``{}``
+
+.. py:data:: WORKER_BATCH_SIZE
+
+    Number of files checked by each task of the pool of processes.
+
+    **Default:** ``20``
+
 .. py:data:: WORKER_TIMEOUT
 
     Background worker job time window.
 
-    Any job taking longer than that will be killed.
+    Any job taking longer than that is abandoned and its status set to
+    ``error``.
+
+    **Default:** ``180``
 
-    RQ default timeout is 180 seconds
+.. py:data:: WORKER_QUEUE
+
+    SQLite database of the :mod:`durable queue <kwalitee.jobqueue>`. The
+    webhook service puts the jobs into it and the processes of
+    ``kwalitee worker run`` run them, on the same node or on others sharing
+    the file.
+
+    **Default:** ``None``, the jobs are run by the service itself
+
+.. py:data:: WORKER_LEASE
+
+    Seconds a worker holds a job without renewing its lease. The job of a
+    worker that stopped renewing it is run again by another one.
+
+    **Default:** ``60``
+
+.. py:data:: WORKER_ATTEMPTS
+
+    Number of times a job is run before it is a dead letter.
+
+    **Default:** ``3``
 
 .. py:data:: MIN_REVIEWERS
 
@@ -175,9 +309,23 @@ GITHUB = "https://github.com/"
 GITHUB_REPO = GITHUB + "{account}/{repository}/"
 """Github repository URL template."""
 
-# Background worker
-# -----------------
-# WORKER_TIMEOUT = 180
+GITHUB_API = "https://api.github.com/"
+"""Github API base URL."""
+# GITHUB_CONNECTIONS = 4
+
+# Webhook service
+# ---------------
+# WEBHOOK_SECRET = None
+# WORKER_JOBS = 4
+# WORKER_PROCESSES = None
+# WORKER_WEIGHTS = {}
+# WORKER_BATCH_SIZE = 20
+WORKER_TIMEOUT = 180
+# WORKER_QUEUE = None
+# WORKER_LEASE = 60
+# WORKER_ATTEMPTS = 3
+# MIRROR_CACHE = None
+# MIRROR_BUDGET = None
 
 # Checks run on the files
 # -----------------------
@@ -190,6 +338,22 @@ GITHUB_REPO = GITHUB + "{account}/{repository}/"
 # CHECK_PYDOCSTYLE = True
 # CHECK_PYFLAKES = True # PyFlakes requires PEP8
 
+# Budgets of the file checks
+# --------------------------
+#
+# Default values, uncomment to change:
+# CHECK_TIMEOUT = None  # e.g. 30 or {'pep8': 30, 'default': 10}
+# CHECK_MEMORY_LIMIT = None  # e.g. 512
+# MAX_FILE_SIZE = None  # e.g. 1024 * 1024
+
+# Hooks running in the background
+# -------------------------------
+#
+# Default value, uncomment to change:
+# POST_COMMIT_BACKGROUND = False
+# PRE_COMMIT_BUDGET = None
+# PRE_RECEIVE_BUDGET = None
+
 # You may ignore some codes from PEP8, PYDOCSTYLE and
 # the license checks as well.
 IGNORE = ['E123', 'E226', 'E24', 'E501', 'E265']
@@ -224,10 +388,10 @@ ALT_SIGNATURES = 'Reported-by',
 # - review, some commit need more reviewers
 # - ready, none of the above
 #
-# Default values, uncomment to change:
-# LABEL_WIP = "in_work"
-# LABEL_REVIEW = "in_review"
-# LABEL_READY = "in_integration"
+# Default values:
+LABEL_WIP = "in_work"
+LABEL_REVIEW = "in_review"
+LABEL_READY = "in_integration"
 
 # Hooks
 # -----
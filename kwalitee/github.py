@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Client of the Github API used by the webhook service.
+
+The URLs given by the webhook payloads are absolute and used as is, the
+others are relative to :data:`kwalitee.config.GITHUB_API`, so that a local
+stand-in of the API can be used instead of Github.
+
+The connections are kept alive and reused by the following requests, at most
+:data:`kwalitee.config.GITHUB_CONNECTIONS` of them by host. The resources
+read are cached with their ``ETag``, and read again only if they changed.
+Once the rate limit is exhausted, the requests wait for it to be reset, see
+`rate limiting`_.
+
+.. _rate limiting: https://developer.github.com/v3/#rate-limiting
+"""
+
+from __future__ import absolute_import
+
+import base64
+import collections
+import json
+import re
+import socket
+import threading
+import time
+
+from .version import __version__
+
+try:
+    from http.client import HTTPConnection, HTTPException, HTTPSConnection
+    from urllib.parse import urljoin, urlsplit
+except ImportError:  # Python 2
+    from httplib import HTTPConnection, HTTPException, HTTPSConnection
+    from urlparse import urljoin, urlsplit
+
+_re_next = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+_redirects = (301, 302, 303, 307, 308)
+
+_idempotent = ("GET", "HEAD", "PUT", "DELETE")
+
+
+class GithubError(Exception):
+    """Error answered by the API."""
+
+    def __init__(self, status, url, message=""):
+        """Initialize the error.
+
+        :param status: HTTP status
+        :param url: URL of the request
+        :param message: message of the API
+        """
+        super(GithubError, self).__init__(
+            "{0} {1}: {2}".format(status, url, message))
+        self.status = status
+        self.url = url
+
+
+class Github(object):
+    """Minimal client of the API."""
+
+    def __init__(self, api_url="https://api.github.com/", token=None,
+                 timeout=30, connections=4, max_wait=300, cache_size=1024):
+        """Initialize the client.
+
+        :param api_url: base URL of the API
+        :param token: access token, see :data:`kwalitee.config.ACCESS_TOKEN`
+        :param timeout: timeout of each request, in seconds
+        :param connections: idle connections kept by host
+        :param max_wait: seconds a request waits for the rate limit at most,
+            it fails beyond
+        :param cache_size: number of resources cached with their ``ETag``
+        """
+        self.api_url = api_url
+        self.token = token
+        self.timeout = timeout
+        self.connections = connections
+        self.max_wait = max_wait
+        self.cache_size = cache_size
+        self.retries = 5
+        self.reset = None
+        self._idle = {}
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def url(self, url):
+        """Get the absolute URL."""
+        return urljoin(self.api_url, url)
+
+    def close(self):
+        """Close the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def _acquire(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        cls = HTTPSConnection if scheme == "https" else HTTPConnection
+        return cls(netloc, timeout=self.timeout), False
+
+    def _release(self, scheme, netloc, connection):
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.connections:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _send(self, method, url, body, headers):
+        """Send a request on a kept alive connection.
+
+        A reused connection may have been closed by the server meanwhile. The
+        request is then sent again on a new one, unless it may have been
+        received already and is not idempotent, e.g. a comment posted.
+
+        :return: status, headers and body
+        :rtype: tuple
+        """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        while True:
+            connection, reused = self._acquire(parts.scheme, parts.netloc)
+            sent = False
+            try:
+                connection.request(method, path, body, headers)
+                sent = True
+                response = connection.getresponse()
+                content = response.read()
+            except (HTTPException, socket.error):
+                connection.close()
+                if reused and (method in _idempotent or not sent):
+                    continue
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self._release(parts.scheme, parts.netloc, connection)
+            return response.status, dict(
+                (k.lower(), v) for k, v in response.getheaders()), content
+
+    def _wait(self, delay, url):
+        if delay > self.max_wait:
+            raise GithubError(403, url, "rate limit exceeded for {0:.0f}s"
+                                        "".format(delay))
+        if delay > 0:
+            time.sleep(delay)
+
+    def _backoff(self, status, headers, attempt):
+        """Get the seconds to wait before sending again, None if not limited.
+
+        The primary limit tells when it is reset, the secondary ones may
+        tell how long to wait, otherwise the delay doubles at each attempt.
+        """
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+        if headers.get("x-ratelimit-remaining") == "0" and \
+                headers.get("x-ratelimit-reset"):
+            return max(float(headers["x-ratelimit-reset"]) - time.time(),
+                       0) + 1
+        if status == 429:
+            return 2 ** attempt
+        return None
+
+    def request(self, method, url, data=None, raw=False):
+        """Send a request.
+
+        :param method: HTTP method
+        :param url: absolute URL or relative to the API
+        :param data: JSON body
+        :param raw: return the body as bytes instead of decoding it
+        :return: status, headers and body
+        :rtype: tuple
+        """
+        url = self.url(url)
+        headers = {"Accept": "application/vnd.github.v3+json",
+                   "User-Agent": "kwalitee/{0}".format(__version__)}
+        if self.token:
+            headers["Authorization"] = "token {0}".format(self.token)
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        cached = None
+        if method == "GET":
+            with self._lock:
+                cached = self._cache.get(url)
+            if cached is not None:
+                headers["If-None-Match"] = cached[0]
+
+        attempt = 0
+        location = url
+        while True:
+            reset = self.reset
+            if reset is not None:
+                self._wait(reset - time.time(), url)
+            status, response_headers, content = self._send(
+                method, location, body, headers)
+            if response_headers.get("x-ratelimit-remaining") == "0":
+                self.reset = float(response_headers.get(
+                    "x-ratelimit-reset") or 0)
+            elif "x-ratelimit-remaining" in response_headers:
+                self.reset = None
+            if status in _redirects and "location" in response_headers:
+                location = urljoin(location, response_headers["location"])
+                if urlsplit(location).netloc != urlsplit(url).netloc:
+                    # the token is for the API only
+                    headers.pop("Authorization", None)
+                    headers.pop("If-None-Match", None)
+                attempt += 1
+                if attempt <= self.retries:
+                    continue
+            if status in (403, 429) and attempt < self.retries:
+                delay = self._backoff(status, response_headers, attempt)
+                if delay is not None:
+                    self._wait(delay, url)
+                    attempt += 1
+                    continue
+            break
+
+        if status == 304 and cached is not None:
+            _, response_headers, content = cached
+            status = 200
+        elif status >= 300:
+            raise GithubError(status, url, content.decode("utf-8", "replace"))
+        elif method == "GET" and response_headers.get("etag"):
+            with self._lock:
+                self._cache.pop(url, None)
+                self._cache[url] = (response_headers["etag"],
+                                    response_headers, content)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        if raw:
+            return status, response_headers, content
+        if not content:
+            return status, response_headers, None
+        return status, response_headers, json.loads(content.decode("utf-8"))
+
+    def get(self, url):
+        """Get a resource."""
+        return self.request("GET", url)[2]
+
+    def get_all(self, url):
+        """Get all the pages of a list."""
+        items = []
+        while url:
+            _, headers, page = self.request("GET", url)
+            items.extend(page or ())
+            match = _re_next.search(headers.get("link", ""))
+            url = match.group(1) if match else None
+        return items
+
+    def get_raw(self, url):
+        """Get the content of a file, e.g. its ``raw_url``."""
+        return self.request("GET", url, raw=True)[2]
+
+    def get_content(self, repository, path, ref):
+        """Get a file of the repository.
+
+        :param repository: full name, e.g. ``inveniosoftware/kwalitee``
+        :param path: path of the file
+        :param ref: commit SHA
+        :return: the content or None if missing
+        :rtype: bytes
+        """
+        try:
+            content = self.get("repos/{0}/contents/{1}?ref={2}".format(
+                repository, path, ref))
+        except GithubError as e:
+            if e.status == 404:
+                return None
+            raise
+        return base64.b64decode(content["content"])
+
+    def post(self, url, data):
+        """Create a resource."""
+        return self.request("POST", url, data)[2]
+
+    def put(self, url, data):
+        """Replace a resource."""
+        return self.request("PUT", url, data)[2]
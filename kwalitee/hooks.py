@@ -29,20 +29,25 @@ import os
 import re
 import shutil
 import sys
+import time
 from codecs import open
 from subprocess import PIPE, Popen
 from tempfile import mkdtemp
 
 import click
-import yaml
 
-from .kwalitee import SUPPORTED_FILES, check_file, check_message, get_options
+from . import profiler, results, status
+from .options import SUPPORTED_FILES, load_options, read_configuration
+from .repository import get_author, get_commit_message, get_commit_tree, \
+    get_staged_files, write_tree
+
+# The checkers are only imported by the hooks running them, preparing the
+# commit message must stay fast.
 
 
 def _get_files_modified():
     """Get the list of modified files that are Python or Jinja2."""
-    cmd = "git diff-index --cached --name-only --diff-filter=ACMRTUXB HEAD"
-    _, files_modified, _ = run(cmd)
+    files_modified = get_staged_files()
 
     extensions = [re.escape(ext) for ext in list(SUPPORTED_FILES) + [".rst"]]
     test = "(?:{0})$".format("|".join(extensions))
@@ -51,10 +56,7 @@ def _get_files_modified():
 
 def _get_git_author():
     """Return the git author from the git variables."""
-    _, stdout, _ = run("git var GIT_AUTHOR_IDENT")
-
-    git_author = stdout[0]
-    return git_author[:git_author.find(">") + 1]
+    return get_author()
 
 
 def _get_component(filename, default="global"):
@@ -118,13 +120,26 @@ def _prepare_commit_msg(tmp_file, author, files_modified=None, template=None):
                                  extra="".join(contents)))
 
 
-def _check_message(message, options):
-    """Checking the message and printing the errors."""
-    options = options or dict()
-    options.update(get_options())
-    options.update(_read_local_kwalitee_configuration())
+def _message_errors(message, options, store=None):
+    """Check the message with the options of the repository.
+
+    :param store: where to look the results up and record them
+    :type store: :class:`kwalitee.results.ResultStore`
+    """
+    from .kwalitee import check_message
+    options = dict(options or ())
+    options.update(load_options())
+
+    if store is None or not message or message.isspace():
+        return check_message(message, **options)
+    key = results.message_key(message, results.fingerprint(
+        options, results.MESSAGE))
+    return store.cached(key, check_message, message, **options)
+
 
-    errors = check_message(message, **options)
+def _check_message(message, options, store=None):
+    """Checking the message and printing the errors."""
+    errors = _message_errors(message, options, store)
 
     if errors:
         for error in errors:
@@ -138,9 +153,7 @@ def _check_message(message, options):
 @click.argument('argv', nargs=-1, type=click.UNPROCESSED)
 def prepare_commit_msg_hook(argv):
     """Hook: prepare a commit message."""
-    options = get_options()
-    # Check if the repo has a configuration repo
-    options.update(_read_local_kwalitee_configuration())
+    options = load_options()
 
     _prepare_commit_msg(argv[1],
                         _get_git_author(),
@@ -166,15 +179,59 @@ def commit_msg_hook(argv):
     return 0
 
 
+def _report_deferred_checks(sha):
+    """Print the results of the files checked after the pre-commit hook.
+
+    :return: False if errors were found
+    """
+    store = status.get_store()
+    if store is None or not os.path.isdir(store.directory):
+        return True
+    tree = get_commit_tree(sha)
+    record = store.get(tree)
+    if record is None or record.get("kind") != "files":
+        return True
+    if record.get("commit") != sha:
+        record = store.update(tree, commit=sha)
+
+    if record.get("state") in (status.PENDING, status.RUNNING):
+        click.echo("The staged files are still being checked in the "
+                   "background (see 'kwalitee status').", file=sys.stderr)
+        return True
+    from .kwalitee import is_warning
+    errors = record.get("errors") or ()
+    for error in errors:
+        click.echo(error, file=sys.stderr)
+    return all(is_warning(error) for error in errors)
+
+
 @click.command()
 @click.argument('argv', nargs=-1, type=click.UNPROCESSED)
 def post_commit_hook(argv):
     """Hook: for checking commit message."""
-    _, stdout, _ = run("git log -1 --format=%B HEAD")
-    message = "\n".join(stdout)
+    sha, message = get_commit_message("HEAD")
     options = {"allow_empty": True}
 
-    if not _check_message(message, options):
+    if not _report_deferred_checks(sha):
+        click.echo(
+            "Kwalitee errors in the committed files (fix with 'git commit "
+            "--amend').", file=sys.stderr)
+
+    store = results.get_store()
+    if store is not None:
+        store.prune()
+
+    if load_options().get("post_commit_background") and status.can_fork():
+        jobs = status.get_store(create=True)
+        if jobs is not None:
+            status.spawn(jobs, sha, _message_errors,
+                         (message, options, store),
+                         slot="post-commit", kind="message")
+            click.echo("Checking the commit message in the background "
+                       "(see 'kwalitee status').", file=sys.stderr)
+            return 0
+
+    if not _check_message(message, options, store):
         click.echo(
             "Commit message errors (fix with 'git commit --amend').",
             file=sys.stderr)
@@ -183,13 +240,11 @@ def post_commit_hook(argv):
 
 
 def _read_local_kwalitee_configuration(directory="."):
-    """Check if the repo has a ``.kwalitee.yaml`` file."""
-    filepath = os.path.abspath(os.path.join(directory, '.kwalitee.yml'))
-    data = {}
-    if os.path.exists(filepath):
-        with open(filepath, 'r') as file_read:
-            data = yaml.load(file_read.read())
-    return data
+    """Check if the repo has a ``.kwalitee.yaml`` file.
+
+    .. seealso:: :func:`kwalitee.options.read_configuration`
+    """
+    return read_configuration(directory)
 
 # =============================================================================
 # _pre_commit, pre_commit_hook() and run() is based on initially on Flake8
@@ -218,67 +273,204 @@ def _read_local_kwalitee_configuration(directory="."):
 # SOFTWARE.
 
 
-def _pre_commit(files, options):
+def _write_staged_files(files, tmpdir):
+    """Write the staged version of the files into the directory.
+
+    :return: ``(file, path in tmpdir, blob id)`` of each file
+    :rtype: list
+    """
+    files_to_check = []
+    for (file_, content) in files:
+        # write staged version of file to temporary directory
+        filename = os.path.join(tmpdir, file_)
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(filename, "wb") as fh:
+            fh.write(content)
+        files_to_check.append((file_, filename, results.blob_id(content)))
+    return files_to_check
+
+
+def _check_staged_files(files_to_check, options, tmpdir, store=None):
+    """Check the files written by :func:`_write_staged_files`.
+
+    :param store: where to look the results up and record them
+    :type store: :class:`kwalitee.results.ResultStore`
+    """
+    from .kwalitee import check_file
+    policy = results.fingerprint(options)
+    errors = []
+    for (file_, filename, blob) in files_to_check:
+        if store is None:
+            file_errors = check_file(filename, root=tmpdir, **options)
+        else:
+            file_errors = store.cached(results.file_key(file_, blob, policy),
+                                       check_file, filename, root=tmpdir,
+                                       **options)
+        errors += list(map(lambda x: "{0}: {1}".format(file_, x),
+                           file_errors or []))
+    return errors
+
+
+def _pre_commit(files, options, tmpdir=None, store=None):
     """Run the check on files of the added version.
 
     They might be different than the one on disk. Equivalent than doing a git
     stash, check, and git stash pop.
+
+    :param tmpdir: directory to write the files into, a temporary one is
+        created and removed when not given
+    :param store: where to look the results up and record them
+    :type store: :class:`kwalitee.results.ResultStore`
     """
-    errors = []
-    tmpdir = mkdtemp()
-    files_to_check = []
+    cleanup = tmpdir is None
+    tmpdir = tmpdir or mkdtemp()
+    try:
+        files_to_check = _write_staged_files(files, tmpdir)
+        return _check_staged_files(files_to_check, options, tmpdir, store)
+    finally:
+        if cleanup:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _deferred_pre_commit(files_to_check, options, tmpdir, store=None):
+    """Check the files left by the pre-commit hook, in the background."""
     try:
-        for (file_, content) in files:
-            # write staged version of file to temporary directory
-            dirname, filename = os.path.split(os.path.abspath(file_))
-            prefix = os.path.commonprefix([dirname, tmpdir])
-            dirname = os.path.relpath(dirname, start=prefix)
-            dirname = os.path.join(tmpdir, dirname)
-            if not os.path.isdir(dirname):
-                os.makedirs(dirname)
-            filename = os.path.join(dirname, filename)
-            with open(filename, "wb") as fh:
-                fh.write(content)
-            files_to_check.append((file_, filename))
-
-        for (file_, filename) in files_to_check:
-            errors += list(map(lambda x: "{0}: {1}".format(file_, x),
-                               check_file(filename, **options) or []))
+        return _check_staged_files(files_to_check, options, tmpdir, store)
     finally:
         shutil.rmtree(tmpdir, ignore_errors=True)
 
-    return errors
+
+def _pre_commit_within_budget(files, options, tmpdir, budget, start,
+                              store=None):
+    """Check the files until the budget is spent.
+
+    The cheap checks, i.e. the license, run on every file. The expensive
+    ones run file by file while there is time left.
+
+    :param budget: time budget in seconds
+    :param start: time the hook started at
+    :return: the errors and the files left unchecked
+    :rtype: tuple
+    """
+    from .kwalitee import _expensive_checkers, _get_checks
+    files_to_check = _write_staged_files(files, tmpdir)
+    errors = _check_staged_files(files_to_check,
+                                 dict(options, pep8=False, pydocstyle=False),
+                                 tmpdir, store)
+
+    # the files without any expensive check, e.g. the templates, are done
+    expensive = dict(options, license=False)
+    files_to_check = [f for f in files_to_check
+                      if any(name in _expensive_checkers
+                             for name, _, _ in _get_checks(f[0], **options))]
+    while files_to_check and time.time() - start < budget:
+        errors += _check_staged_files(files_to_check[:1], expensive, tmpdir,
+                                      store)
+        files_to_check = files_to_check[1:]
+    return errors, files_to_check
 
 
 @click.command()
 @click.argument('argv', nargs=-1, type=click.UNPROCESSED)
 def pre_commit_hook(argv):
     """Hook: checking the staged files."""
-    options = get_options()
-    # Check if the repo has a configuration repo
-    options.update(_read_local_kwalitee_configuration())
-
-    files = []
-    for filename in _get_files_modified():
-        # get the staged version of the file and
-        # write the staged version to temp dir with its full path to
-        # avoid overwriting files with the same name
-        _, stdout, _ = run("git show :{0}".format(filename), raw_output=True)
-        files.append((filename, stdout))
-
-    errors = _pre_commit(files, options)
+    from .kwalitee import filter_files, is_warning
+    start = time.time()
+    options = load_options()
+    budget = options.get("pre_commit_budget")
+    if budget is not None and not status.can_fork():
+        budget = None
+
+    store = results.get_store()
+    tmpdir = mkdtemp()
+    errors, deferred, failed = [], [], False
+    try:
+        # the excluded files and the ones without any check are never read
+        files_modified, _, _ = filter_files(_get_files_modified(),
+                                            root=tmpdir, **options)
+        files = []
+        for filename in files_modified:
+            # get the staged version of the file and
+            # write the staged version to temp dir with its full path to
+            # avoid overwriting files with the same name
+            _, stdout, _ = run("git show :{0}".format(filename),
+                               raw_output=True)
+            files.append((filename, stdout))
+
+        if budget is None:
+            errors = _pre_commit(files, options, tmpdir=tmpdir, store=store)
+        else:
+            errors, deferred = _pre_commit_within_budget(
+                files, options, tmpdir, budget, start, store)
+            failed = not all(is_warning(error) for error in errors)
+            jobs = status.get_store(create=True) if deferred else None
+            tree = write_tree() if jobs is not None else None
+            if deferred and not failed and tree is not None:
+                # the background job owns the files from now on
+                if status.spawn(jobs, tree, _deferred_pre_commit,
+                                (deferred, dict(options, license=False),
+                                 tmpdir, store),
+                                slot="pre-commit", kind="files") is None:
+                    tree = None
+            if deferred and not failed and tree is None:
+                errors += _check_staged_files(
+                    deferred, dict(options, license=False), tmpdir, store)
+                deferred = []
+    finally:
+        if not deferred or failed:
+            shutil.rmtree(tmpdir, ignore_errors=True)
 
     for error in errors:
         if hasattr(error, "decode"):
             error = error.decode()
         click.echo(error, file=sys.stderr)
 
-    if errors:
+    # the warnings, e.g. the files too large to be fully checked, are shown
+    if not all(is_warning(error) for error in errors):
         click.echo(
             "Aborting commit due to kwalitee errors (override with "
             "'git commit --no-verify').",
             file=sys.stderr)
         raise click.Abort
+    if deferred:
+        click.echo(
+            "{0} file(s) left to check in the background, the results come "
+            "after the commit (see 'kwalitee status').".format(len(deferred)),
+            file=sys.stderr)
+    return 0
+
+
+@click.command()
+@click.option('-j', '--processes', type=int, default=None,
+              help='number of processes checking at the same time, all the '
+                   'CPUs by default')
+@click.option('--budget', type=float, default=None, metavar='SECONDS',
+              help='time budget of the checks, PRE_RECEIVE_BUDGET by default')
+@click.option('--accept-on-timeout', is_flag=True,
+              help='accept the push when the budget is spent without error')
+def pre_receive_hook(processes=None, budget=None, accept_on_timeout=False):
+    """Hook: checking the commits pushed to a bare repository."""
+    from .receive import check_push, read_updates
+    git_dir = os.environ.get("GIT_DIR", ".")
+    options = load_options(git_dir)
+    if budget is None:
+        budget = options.get("pre_receive_budget")
+
+    updates = read_updates(click.get_binary_stream("stdin"))
+    report = check_push(updates, options, git_dir=git_dir,
+                        processes=processes, budget=budget,
+                        store=results.get_store(git_dir))
+    for line in report.lines():
+        click.echo(line, file=sys.stderr)
+
+    if report.unchecked and accept_on_timeout and \
+            not any(report.errors.values()):
+        return 0
+    if not report:
+        click.echo("Push refused due to kwalitee errors.", file=sys.stderr)
+        raise click.Abort
     return 0
 
 
@@ -293,8 +485,10 @@ def run(command, raw_output=False):
     :rtype: tuple
 
     """
-    p = Popen(command.split(), stdout=PIPE, stderr=PIPE)
-    (stdout, stderr) = p.communicate()
+    args = command.split()
+    with profiler.measure(" ".join(args[:2])):
+        p = Popen(args, stdout=PIPE, stderr=PIPE)
+        (stdout, stderr) = p.communicate()
     # On python 3, subprocess.Popen returns bytes objects.
     if not raw_output:
         return (
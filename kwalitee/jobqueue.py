@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Durable queue of the check jobs, on SQLite.
+
+The webhook service puts the jobs into the queue, and worker processes on
+one or more nodes take them (``python -m kwalitee.worker``). No server is
+needed, only a database file all of them can lock. Over a network file
+system, the file system must support the POSIX locks.
+
+A worker *leases* a job for a while and renews the lease with heartbeats
+while it runs it. When a worker dies, its lease expires and the job is
+leased again by another worker. A job that failed or whose lease expired
+:data:`~kwalitee.config.WORKER_ATTEMPTS` times is moved to the dead
+letters, where it stays until it is retried by hand.
+
+Like in the service, see :mod:`kwalitee.web`, a new job supersedes the
+queued jobs of the same key and cancels the running one. The repositories
+are served in turn.
+"""
+
+from __future__ import absolute_import
+
+import json
+import sqlite3
+import time
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+SUPERSEDED = "superseded"
+
+_schema = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    key TEXT,
+    tenant TEXT,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    available REAL NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    updated REAL NOT NULL,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available);
+CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, state);
+CREATE TABLE IF NOT EXISTS tenants (
+    tenant TEXT PRIMARY KEY,
+    last_leased REAL NOT NULL
+);
+"""
+
+
+class JobQueue(object):
+    """Lease-based queue of jobs in a SQLite database."""
+
+    def __init__(self, path, lease=60, max_attempts=3, retry_delay=10):
+        """Open the queue, creating the database if needed.
+
+        :param path: database file
+        :param lease: seconds a lease lasts without heartbeat
+        :param max_attempts: attempts before a job is a dead letter
+        :param retry_delay: seconds before a failed job is retried, doubled
+            at each attempt
+        """
+        self.path = path
+        self.lease_time = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.connection = sqlite3.connect(path, timeout=60,
+                                          isolation_level=None)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(_schema)
+
+    def close(self):
+        """Close the database."""
+        self.connection.close()
+
+    def _transaction(self):
+        return _Transaction(self.connection)
+
+    def put(self, job, key=None, tenant=None, merge=None):
+        """Queue a job.
+
+        :param job: JSON serializable job, with an ``id``
+        :param key: the queued and running jobs of the same key are
+            superseded
+        :param tenant: e.g. the repository
+        :param merge: called with a superseded job and the new one, returns
+            the job to queue, see :func:`kwalitee.worker.coalesce`
+        :return: the queued job
+        :rtype: dict
+        """
+        now = time.time()
+        with self._transaction() as db:
+            if key is not None:
+                for row in db.execute(
+                        "SELECT payload FROM jobs WHERE key = ? AND "
+                        "(state = ? OR (state = ? AND cancel = 0)) "
+                        "ORDER BY created", (key, QUEUED, LEASED)):
+                    if merge is not None:
+                        job = merge(json.loads(row["payload"]), job)
+                db.execute("UPDATE jobs SET state = ?, updated = ? "
+                           "WHERE key = ? AND state = ?",
+                           (SUPERSEDED, now, key, QUEUED))
+                db.execute("UPDATE jobs SET cancel = 1, updated = ? "
+                           "WHERE key = ? AND state = ?", (now, key, LEASED))
+            db.execute("INSERT INTO jobs (id, key, tenant, payload, state, "
+                       "created, available, updated) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                       (job["id"], key, tenant, json.dumps(job), QUEUED, now,
+                        now, now))
+        return job
+
+    def lease(self, worker):
+        """Lease the next job.
+
+        The tenant leased the least recently goes first, then the oldest
+        job. The jobs whose lease expired are leased again.
+
+        :param worker: name of the worker, e.g. ``host:pid``
+        :return: the job and its number of attempts, or None
+        :rtype: tuple
+        """
+        now = time.time()
+        with self._transaction() as db:
+            # a superseded job is not started again once its lease expired
+            db.execute("UPDATE jobs SET state = ?, updated = ?, "
+                       "lease_expires = NULL WHERE state = ? AND "
+                       "lease_expires < ? AND cancel = 1",
+                       (SUPERSEDED, now, LEASED, now))
+            db.execute("UPDATE jobs SET state = ?, updated = ?, "
+                       "error = 'lease expired' WHERE state = ? AND "
+                       "lease_expires < ? AND attempts >= ?",
+                       (DEAD, now, LEASED, now, self.max_attempts))
+            row = db.execute(
+                "SELECT jobs.id, jobs.tenant, jobs.payload, jobs.attempts "
+                "FROM jobs LEFT JOIN tenants "
+                "ON tenants.tenant = jobs.tenant WHERE "
+                "(jobs.state = ? AND jobs.available <= ?) OR "
+                "(jobs.state = ? AND jobs.lease_expires < ? AND "
+                "jobs.cancel = 0) "
+                "ORDER BY COALESCE(tenants.last_leased, 0), jobs.created "
+                "LIMIT 1", (QUEUED, now, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE jobs SET state = ?, worker = ?, "
+                       "attempts = attempts + 1, lease_expires = ?, "
+                       "updated = ? WHERE id = ?",
+                       (LEASED, worker, now + self.lease_time, now, row["id"]))
+            if row["tenant"] is not None:
+                db.execute("INSERT OR REPLACE INTO tenants "
+                           "(tenant, last_leased) VALUES (?, ?)",
+                           (row["tenant"], now))
+        return json.loads(row["payload"]), row["attempts"] + 1
+
+    def heartbeat(self, job_id, worker):
+        """Renew the lease of a job.
+
+        :return: False if the lease is lost or the job has been superseded
+        :rtype: bool
+        """
+        now = time.time()
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE jobs SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND state = ? AND cancel = 0",
+                (now + self.lease_time, now, job_id, worker, LEASED)).rowcount
+        return updated == 1
+
+    def complete(self, job_id, worker, result=None):
+        """Mark the job as done.
+
+        :return: False if the lease had been lost meanwhile
+        :rtype: bool
+        """
+        now = time.time()
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE jobs SET state = ?, result = ?, updated = ?, "
+                "lease_expires = NULL WHERE id = ? AND worker = ? AND "
+                "state = ?", (DONE, json.dumps(result), now, job_id, worker,
+                              LEASED)).rowcount
+        return updated == 1
+
+    def fail(self, job_id, worker, error):
+        """Give the job back to be retried later, or bury it.
+
+        :return: the new state of the job, None if the lease had been lost
+        :rtype: str
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT attempts FROM jobs WHERE id = ? AND "
+                             "worker = ? AND state = ?",
+                             (job_id, worker, LEASED)).fetchone()
+            if row is None:
+                return None
+            state = DEAD if row["attempts"] >= self.max_attempts else QUEUED
+            delay = self.retry_delay * 2 ** (row["attempts"] - 1)
+            db.execute("UPDATE jobs SET state = ?, error = ?, available = ?, "
+                       "lease_expires = NULL, updated = ? WHERE id = ?",
+                       (state, error, now + delay, now, job_id))
+        return state
+
+    def dead_letters(self):
+        """List the dead jobs.
+
+        :return: the jobs, their number of attempts and their last error
+        :rtype: list
+        """
+        rows = self.connection.execute(
+            "SELECT payload, attempts, error FROM jobs WHERE state = ? "
+            "ORDER BY updated", (DEAD, )).fetchall()
+        return [(json.loads(row["payload"]), row["attempts"], row["error"])
+                for row in rows]
+
+    def retry(self, job_id):
+        """Queue a dead job again, with its attempts reset.
+
+        :return: True if the job was dead
+        :rtype: bool
+        """
+        now = time.time()
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, available = ?, "
+                "updated = ? WHERE id = ? AND state = ?",
+                (QUEUED, now, now, job_id, DEAD)).rowcount
+        return updated == 1
+
+    def get(self, job_id):
+        """Get the state of a job.
+
+        :return: ``state``, ``attempts``, ``error`` and ``result``, or None
+        :rtype: dict
+        """
+        row = self.connection.execute(
+            "SELECT state, attempts, error, result FROM jobs WHERE id = ?",
+            (job_id, )).fetchone()
+        if row is None:
+            return None
+        return {"state": row["state"], "attempts": row["attempts"],
+                "error": row["error"],
+                "result": json.loads(row["result"]) if row["result"]
+                else None}
+
+    def stats(self):
+        """Count the jobs by state, and the queued jobs by tenant.
+
+        :return: the counts by state, and the depth and the wait of the
+            oldest job by tenant
+        :rtype: dict
+        """
+        now = time.time()
+        states = dict((row[0], row[1]) for row in self.connection.execute(
+            "SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+        tenants = dict((row[0], {"queued": row[1], "wait_max": now - row[2]})
+                       for row in self.connection.execute(
+                           "SELECT tenant, COUNT(*), MIN(created) FROM jobs "
+                           "WHERE state = ? GROUP BY tenant", (QUEUED, )))
+        return {"states": states, "tenants": tenants}
+
+    def prune(self, age=7 * 86400):
+        """Forget the finished jobs older than the age, in seconds.
+
+        :return: the number of jobs removed
+        :rtype: int
+        """
+        with self._transaction() as db:
+            return db.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND updated < ?",
+                (DONE, SUPERSEDED, time.time() - age)).rowcount
+
+
+class _Transaction(object):
+    """Write transaction, taking the lock of the database at once."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute("COMMIT" if exc_type is None else
+                                "ROLLBACK")
@@ -35,9 +35,19 @@ import pydocstyle
 import pyflakes
 import pyflakes.checker
 
+from . import profiler
+from .options import SUPPORTED_FILES, get_options  # noqa
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+try:
+    from sys import intern
+except ImportError:  # Python 2
+    pass
 
-SUPPORTED_FILES = '.py', '.html', '.tpl', '.js', '.jsx', '.css', '.less'
-"""Supported file types."""
 
 _re_copyright_year = re.compile(r"^Copyright\s+(?:\([Cc]\)|\xa9)\s+"
                                 r"(?:\d{4},\s+)*"
@@ -88,6 +98,109 @@ _author_codes = {
     "A102": "{0} missing in AUTHORS file",
 }
 
+_budget_codes = {
+    "K100": "{0} check exceeded its time budget of {1}s",
+    "K101": "{0} check exceeded its memory budget of {1}MB",
+    "K102": "{0} check crashed with exit code {1}",
+    "K110": "file is too large ({0} > {1} bytes), skipped {2}",
+}
+
+_expensive_checkers = ("pep8", "pydocstyle")
+"""Checkers skipped on the files larger than ``max_file_size``."""
+
+_warning_codes = ("K110", )
+"""Codes reported without failing the check, see :func:`is_warning`."""
+
+_re_warning = re.compile(r"(?:^|\s)\d+: (?:{0}) ".format(
+    "|".join(_warning_codes)))
+
+_codes = {}
+for _table in (_messages_codes, _licenses_codes, _author_codes,
+               _budget_codes):
+    _codes.update(_table)
+
+_ERROR = "{0.lineno}: {0.code} {0.message}"
+_PEP8_ERROR = "{0.lineno}:{0.col}: {0.code} {0.message}"
+_AUTHOR_ERROR = "{0.lineno}:{0.code}: {0.message}"
+_TOKEN_ERROR = "{0.lineno}:{0.col} {0.message}"
+_PLAIN_ERROR = "{0.message}"
+
+
+class Error(object):
+    """Error found by a checker.
+
+    The code is interned and the message is only formatted when the error is
+    turned into a string, see :meth:`__str__`.
+    """
+
+    __slots__ = ("lineno", "col", "code", "args", "template")
+
+    def __init__(self, lineno, code, args=(), col=None, template=_ERROR):
+        """Initialize the error.
+
+        :param lineno: line number, if any
+        :type lineno: int
+        :param code: error code, e.g. ``'M110'``
+        :type code: str
+        :param args: arguments of the message of the code, or the message
+            itself for the codes unknown to kwalitee (pep8, pydocstyle)
+        :type args: tuple
+        :param col: column number, if any
+        :type col: int
+        :param template: output format
+        :type template: str
+        """
+        self.lineno = lineno
+        self.col = col
+        self.code = intern(code) if code else code
+        self.args = args
+        self.template = template
+
+    @property
+    def message(self):
+        """Message of the error, without its code."""
+        template = _codes.get(self.code)
+        if template is None:
+            return self.args[0] if self.args else ""
+        return template.format(*self.args)
+
+    def sort_key(self):
+        """Sort the errors by line number."""
+        return self.lineno or 0
+
+    def __str__(self):
+        """Format the error as the checker would print it."""
+        return self.template.format(self)
+
+    def __repr__(self):
+        """Represent the error."""
+        return "<Error {0!r}>".format(str(self))
+
+    def __reduce__(self):
+        """Pickle the error, e.g. to send it from a supervised checker."""
+        return (Error, (self.lineno, self.code, self.args, self.col,
+                        self.template))
+
+
+def _format_errors(errors):
+    """Format the errors as strings."""
+    return [str(error) for error in errors]
+
+
+def is_warning(error):
+    """Tell whether the formatted error is only a warning.
+
+    The warnings, e.g. a file too large to be fully checked, are reported
+    like the errors but must not fail the check.
+
+    :param error: error as returned by :func:`.check_file`, possibly
+        prefixed with the name of the file
+    :type error: str
+    :return: True if the error does not fail the check
+    :rtype: bool
+    """
+    return _re_warning.search(error) is not None
+
 
 def _check_1st_line(line, **kwargs):
     """First line check.
@@ -101,7 +214,7 @@ def _check_1st_line(line, **kwargs):
     :type line: list
     :param max_first_line: maximum length of the first line
     :type max_first_line: int
-    :return: errors as in (code, line number, *args)
+    :return: errors
     :rtype: list
 
     """
@@ -111,17 +224,17 @@ def _check_1st_line(line, **kwargs):
     errors = []
     lineno = 1
     if len(line) > max_first_line:
-        errors.append(("M190", lineno, max_first_line, len(line)))
+        errors.append(Error(lineno, "M190", (max_first_line, len(line))))
 
     if line.endswith("."):
-        errors.append(("M191", lineno))
+        errors.append(Error(lineno, "M191"))
 
     if ':' not in line:
-        errors.append(("M110", lineno))
+        errors.append(Error(lineno, "M110"))
     else:
         component, msg = line.split(':', 1)
         if component not in components:
-            errors.append(("M111", lineno, component))
+            errors.append(Error(lineno, "M111", (component,)))
 
     return errors
 
@@ -137,7 +250,7 @@ def _check_bullets(lines, **kwargs):
     :param lines: all the lines of the message
     :type lines: list
     :param max_lengths: maximum length of any line. (Default 72)
-    :return: errors as in (code, line number, *args)
+    :return: errors
     :rtype: list
 
     """
@@ -155,21 +268,21 @@ def _check_bullets(lines, **kwargs):
         if line.startswith('*'):
             dot_found = False
             if len(missed_lines) > 0:
-                errors.append(("M130", i + 2))
+                errors.append(Error(i + 2, "M130"))
             if lines[i].strip() != '':
-                errors.append(("M120", i + 2))
+                errors.append(Error(i + 2, "M120"))
             if _strip_ticket_directives(line).endswith('.'):
                 dot_found = True
 
             label = _re_bullet_label.search(line)
             if label and label.group('label') not in labels:
-                errors.append(("M122", i + 2, label.group('label')))
+                errors.append(Error(i + 2, "M122", (label.group('label'),)))
 
             for (j, indented) in enumerate(lines[i + 2:]):
                 if indented.strip() == '':
                     break
                 if not re.search(r"^ {2}\S", indented):
-                    errors.append(("M121", i + j + 3))
+                    errors.append(Error(i + j + 3, "M121"))
                 else:
                     skipped.append(i + j + 1)
                     stripped_line = _strip_ticket_directives(indented)
@@ -179,13 +292,13 @@ def _check_bullets(lines, **kwargs):
                         dot_found = False
 
             if not dot_found:
-                errors.append(("M123", i + 2))
+                errors.append(Error(i + 2, "M123"))
 
         elif i not in skipped and line.strip():
             missed_lines.append((i + 2, line))
 
         if len(line) > max_length:
-            errors.append(("M190", i + 2, max_length, len(line)))
+            errors.append(Error(i + 2, "M190", (max_length, len(line))))
 
     return errors, missed_lines
 
@@ -208,7 +321,7 @@ def _check_signatures(lines, **kwargs):
     :type trusted: list
     :param min_reviewers: minimal number of reviewers needed. (Default 3)
     :type min_reviewers: int
-    :return: errors as in (code, line number, *args)
+    :return: errors
     :rtype: list
 
     """
@@ -226,21 +339,21 @@ def _check_signatures(lines, **kwargs):
     for i, line in lines:
         if signatures and test_signatures.search(line):
             if line.endswith("."):
-                errors.append(("M191", i))
+                errors.append(Error(i, "M191"))
             if not alt_signatures or not test_alt_signatures.search(line):
                 matching.append(line)
         else:
-            errors.append(("M102", i))
+            errors.append(Error(i, "M102"))
 
     if not matching:
-        errors.append(("M101", 1))
-        errors.append(("M100", 1))
+        errors.append(Error(1, "M101"))
+        errors.append(Error(1, "M100"))
     elif len(matching) < min_reviewers:
         pattern = re.compile('|'.join(map(lambda x: '<' + re.escape(x) + '>',
                                           trusted)))
         trusted_matching = list(filter(None, map(pattern.search, matching)))
         if len(trusted_matching) == 0:
-            errors.append(("M100", 1))
+            errors.append(Error(1, "M100"))
 
     return errors
 
@@ -269,9 +382,17 @@ def check_message(message, **kwargs):
     :type max_first_line: int
     :param allow_empty: optional way to allow empty message (by default: False)
     :type allow_empty: bool
-    :return: errors sorted by line number
+    :return: errors sorted by code
     :rtype: `list`
     """
+    return _format_errors(_message_errors(message, **kwargs))
+
+
+def _message_errors(message, **kwargs):
+    """Check the message format and return the :class:`.Error` objects.
+
+    .. seealso:: :func:`.check_message`
+    """
     if kwargs.pop("allow_empty", False):
         if not message or message.isspace():
             return []
@@ -282,13 +403,27 @@ def check_message(message, **kwargs):
     errors += err
     errors += _check_signatures(signature_lines, **kwargs)
 
-    def _format(code, lineno, args):
-        return "{0}: {1} {2}".format(lineno,
-                                     code,
-                                     _messages_codes[code].format(*args))
+    return sorted(errors, key=lambda error: error.code)
 
-    return list(map(lambda x: _format(x[0], x[1], x[2:]),
-                    sorted(errors, key=lambda x: x[0])))
+
+def _measured_tree_check(cls, checker):
+    """Subclass the AST check ``cls`` to measure its time.
+
+    .. seealso:: :mod:`kwalitee.profiler`
+    """
+    class _MeasuredCheck(cls):
+        def __init__(self, tree, filename, *args, **kwargs):
+            with profiler.measure(checker):
+                super(_MeasuredCheck, self).__init__(tree, filename, *args,
+                                                     **kwargs)
+
+        def run(self):
+            with profiler.measure(checker):
+                errors = list(super(_MeasuredCheck, self).run())
+            return iter(errors)
+
+    _MeasuredCheck.__name__ = cls.__name__
+    return _MeasuredCheck
 
 
 class _PyFlakesChecker(pyflakes.checker.Checker):
@@ -328,21 +463,41 @@ def _register_pyflakes_check():
         if name[0].isupper() and obj.message:
             obj.tpl = "{0} {1}".format(codes.get(name, "F999"), obj.message)
 
-    pep8.register_check(_PyFlakesChecker, codes=['F'])
+    pep8.register_check(_measured_tree_check(_PyFlakesChecker, "pyflakes"),
+                        codes=['F'])
     # FIXME parser hack
     parser = pep8.get_parser('', '')
     Flake8Isort.add_options(parser)
     options, args = parser.parse_args([])
     # end of hack
-    pep8.register_check(Flake8Isort, codes=['I'])
+    pep8.register_check(_measured_tree_check(Flake8Isort, "isort"),
+                        codes=['I'])
     pep8.register_check(check_blind_except, codes=['B90'])
+    _checker_names[check_blind_except] = "blind-except"
+
+    global _registered_pyflakes_check
+    _registered_pyflakes_check = True
 _registered_pyflakes_check = False
+_checker_names = {}
+
+
+class _MeasuredChecker(pep8.Checker):
+    """PEP8 checker measuring the time spent by each logical check.
+
+    It is only used while profiling, see :mod:`kwalitee.profiler`.
+    """
+
+    def run_check(self, check, argument_names):
+        """Run a check plugin."""
+        with profiler.measure(_checker_names.get(check, "pep8")):
+            return super(_MeasuredChecker, self).run_check(check,
+                                                           argument_names)
 
 
 class _Report(pep8.BaseReport):
     """Custom reporter.
 
-    It keeps a list of errors in a sortable list and never prints.
+    It keeps a list of :class:`.Error` and never prints.
     """
 
     def __init__(self, options):
@@ -354,7 +509,160 @@ class _Report(pep8.BaseReport):
         """Run the checks and collect the errors."""
         code = super(_Report, self).error(line_number, offset, text, check)
         if code:
-            self.errors.append((line_number, offset + 1, code, text, check))
+            self.errors.append(Error(line_number, code,
+                                     (text[len(code) + 1:],),
+                                     col=offset + 1, template=_PEP8_ERROR))
+
+
+class Excludes(object):
+    """Exclude patterns compiled once into a single regex.
+
+    The patterns are matched like :func:`re.match` does, i.e. from the
+    beginning of the path. Patterns using backreferences, which would be
+    renumbered by the combination, are kept apart.
+    """
+
+    _re_backreference = re.compile(r"\\[1-9]|\(\?P=")
+    _re_assertion = re.compile(
+        r"\\([^bBZ])|\\[bBZ]|\(\?[=!]|\(\?[a-zA-Z]*x|\$")
+    _re_any_tail = re.compile(
+        r"(?:(?:\.|\(\.\))[*+]|\(\.[*+]\))\$?$|(?:\.|\(\.\))$")
+
+    def __init__(self, excludes):
+        """Compile the patterns.
+
+        :param excludes: list of regex to match
+        """
+        self.excludes = tuple(exclude for exclude in excludes or () if exclude)
+        combined = [exclude for exclude in self.excludes
+                    if not self._re_backreference.search(exclude)]
+        self.regexes = [re.compile(exclude) for exclude in self.excludes
+                        if exclude not in combined]
+        if combined:
+            try:
+                self.regexes.insert(0, re.compile("|".join(
+                    "(?:{0})".format(exclude) for exclude in combined)))
+            except re.error:
+                # e.g. the same group name or global flags in two patterns.
+                self.regexes = [re.compile(exclude)
+                                for exclude in self.excludes]
+        self._prefixes = [prefix for prefix in map(
+            self._directory_prefix, self.excludes) if prefix is not None]
+        self._directories = {}
+
+    @classmethod
+    def _directory_prefix(cls, exclude):
+        """Compile the part of a pattern matched by the directory of a file.
+
+        A directory is excluded when the part matches its path, followed by
+        ``/``, and the rest of the pattern matches any file name, e.g.
+        ``invenio/legacy/.*``. The patterns looking ahead of what they
+        matched, with ``(?!...)``, ``$`` or a word boundary for instance,
+        cannot tell it and return None.
+        """
+        tail = cls._re_any_tail.search(exclude)
+        prefix = exclude[:tail.start()] if tail else exclude
+        if (len(prefix) - len(prefix.rstrip("\\"))) % 2:
+            # the tail starts with an escaped dot
+            prefix = exclude
+        for match in cls._re_assertion.finditer(prefix):
+            if match.group(1) is None:
+                return None
+        try:
+            return re.compile(prefix)
+        except re.error:
+            return None
+
+    def __bool__(self):
+        """Tell whether there is any pattern."""
+        return bool(self.regexes)
+    __nonzero__ = __bool__
+
+    def match(self, filename):
+        """Check if the file should be excluded.
+
+        :param filename: file name
+        :return: True if the file should be excluded
+        """
+        for regex in self.regexes:
+            if regex.match(filename) is not None:
+                return True
+        return False
+
+    def match_directory(self, dirname):
+        """Check if every file of the directory should be excluded.
+
+        The directory is excluded only when a pattern matches every path
+        inside of it, see :meth:`_directory_prefix`, the files of the other
+        directories are matched one by one. The decision is cached.
+
+        :param dirname: directory name, e.g. ``invenio/legacy``
+        :return: True if the whole directory should be excluded
+        """
+        excluded = self._directories.get(dirname)
+        if excluded is None:
+            excluded = any(prefix.match(dirname + "/") is not None
+                           for prefix in self._prefixes)
+            self._directories[dirname] = excluded
+        return excluded
+
+    def filter(self, filenames):
+        """Remove the excluded files, pruning the excluded directories.
+
+        :param filenames: file names, e.g. the output of ``git diff``
+        :return: file names that should be checked
+        :rtype: `list`
+        """
+        if not self.regexes:
+            return list(filenames)
+
+        def _in_excluded_directory(filename):
+            dirname = os.path.dirname(filename)
+            parents = []
+            while dirname and dirname not in parents:
+                parents.append(dirname)
+                dirname = os.path.dirname(dirname)
+            return any(self.match_directory(parent)
+                       for parent in reversed(parents))
+
+        return [filename for filename in filenames
+                if not _in_excluded_directory(filename) and
+                not self.match(filename)]
+
+    def walk(self, top):
+        """Walk the tree without entering the excluded directories.
+
+        :param top: root of the tree
+        :return: paths of the files that should be checked
+        :rtype: generator
+        """
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames[:] = [name for name in dirnames
+                           if not self.match_directory(
+                               os.path.join(dirpath, name))]
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if not self.match(path):
+                    yield path
+
+
+_compiled_excludes = {}
+
+
+def compile_excludes(excludes):
+    """Compile the exclude patterns, once.
+
+    :param excludes: list of regex to match
+    :return: compiled patterns
+    :rtype: :class:`.Excludes`
+    """
+    if isinstance(excludes, Excludes):
+        return excludes
+    key = tuple(excludes or ())
+    compiled = _compiled_excludes.get(key)
+    if compiled is None:
+        compiled = _compiled_excludes[key] = Excludes(key)
+    return compiled
 
 
 def is_file_excluded(filename, excludes):
@@ -364,9 +672,7 @@ def is_file_excluded(filename, excludes):
     :param excludes: list of regex to match
     :return: True if the file should be excluded
     """
-    # check if you need to exclude this file
-    return any([exclude and re.match(exclude, filename) is not None
-                for exclude in excludes])
+    return compile_excludes(excludes).match(filename)
 
 
 def check_pep8(filename, **kwargs):
@@ -385,6 +691,14 @@ def check_pep8(filename, **kwargs):
 
     .. seealso:: :py:class:`pycodestyle.Checker`
     """
+    return _format_errors(_pep8_errors(filename, **kwargs))
+
+
+def _pep8_errors(filename, **kwargs):
+    """Perform static analysis and return the :class:`.Error` objects.
+
+    .. seealso:: :func:`.check_pep8`
+    """
     options = {
         "ignore": kwargs.get("ignore"),
         "select": kwargs.get("select"),
@@ -393,13 +707,64 @@ def check_pep8(filename, **kwargs):
     if not _registered_pyflakes_check and kwargs.get("pyflakes", True):
         _register_pyflakes_check()
 
-    checker = pep8.Checker(filename, reporter=_Report, **options)
+    checker_class = _MeasuredChecker if profiler.enabled() else pep8.Checker
+    checker = checker_class(filename, reporter=_Report, **options)
     checker.check_all()
 
-    errors = []
-    for error in sorted(checker.report.errors, key=lambda x: x[0]):
-        errors.append("{0}:{1}: {3}".format(*error))
-    return errors
+    return sorted(checker.report.errors, key=Error.sort_key)
+
+
+class _MatchDirTrie(object):
+    """Directories matched by a ``match_dir`` regex.
+
+    The decisions are cached in a trie of the path components, a directory
+    being matched when itself and all its parents are. Sibling files thus
+    reuse the decision of their parent directory.
+    """
+
+    def __init__(self, match_dir):
+        """Compile the regex."""
+        self.re_match_dir = re.compile(match_dir)
+        self.children = {}
+
+    def match(self, dirnames):
+        """Check that every directory of the path is matched.
+
+        :param dirnames: path components, e.g. ``['kwalitee', 'cli']``
+        :type dirnames: list
+        :rtype: bool
+        """
+        children = self.children
+        for dirname in dirnames:
+            node = children.get(dirname)
+            if node is None:
+                node = (self.re_match_dir.match(dirname) is not None, {})
+                children[dirname] = node
+            if not node[0]:
+                return False
+            children = node[1]
+        return True
+
+
+_match_dir_tries = {}
+
+
+def _get_logical_dirnames(filename, root=None):
+    """Get the directories of the filename, relatively to the root.
+
+    :param filename: path of the file
+    :param root: directory the path is relative to, e.g. the temporary
+        directory holding a copy of the repository
+    :return: directories of the logical path, e.g. ``['kwalitee', 'cli']``
+    :rtype: list
+    """
+    path = filename
+    if root:
+        relpath = os.path.relpath(filename, root)
+        if not relpath.startswith(os.pardir):
+            path = relpath
+    dirname = os.path.dirname(os.path.normpath(path))
+    return [name for name in dirname.split(os.sep) if name]
 
 
 def check_pydocstyle(filename, **kwargs):
@@ -413,12 +778,23 @@ def check_pydocstyle(filename, **kwargs):
     :type match: str
     :param match_dir: regex everydir in path should match to be checked
     :type match_dir: str
+    :param root: directory the path is relative to for ``match_dir``,
+        e.g. the temporary directory holding a copy of the repository
+    :type root: str
     :return: errors
     :rtype: `list`
 
     .. seealso::
         `PyCQA/pydocstyle <https://github.com/GreenSteam/pydocstyle/>`_
 
+    """
+    return _format_errors(_pydocstyle_errors(filename, **kwargs))
+
+
+def _pydocstyle_errors(filename, **kwargs):
+    """Check the docstrings and return the :class:`.Error` objects.
+
+    .. seealso:: :func:`.check_pydocstyle`
     """
     ignore = kwargs.get("ignore")
     match = kwargs.get("match", None)
@@ -430,14 +806,12 @@ def check_pydocstyle(filename, **kwargs):
         return errors
 
     if match_dir:
-        # FIXME here the full path is checked, be sure, if match_dir doesn't
-        # match the path (usually temporary) before the actual application path
-        # it may not run the checks when it should have.
-        path = os.path.split(os.path.abspath(filename))[0]
-        while path != "/":
-            path, dirname = os.path.split(path)
-            if not re.match(match_dir, dirname):
-                return errors
+        trie = _match_dir_tries.get(match_dir)
+        if trie is None:
+            trie = _match_dir_tries[match_dir] = _MatchDirTrie(match_dir)
+        dirnames = _get_logical_dirnames(filename, kwargs.get("root"))
+        if not trie.match(dirnames):
+            return errors
 
     checker = pydocstyle.PEP257Checker()
     with open(filename) as fp:
@@ -448,11 +822,15 @@ def check_pydocstyle(filename, **kwargs):
                     message = re.sub("(D[0-9]{3}): ?(.*)",
                                      r"\1 \2",
                                      error.message)
-                    errors.append("{0}: {1}".format(error.line, message))
+                    errors.append(Error(error.line, error.code,
+                                        (message[len(error.code) + 1:],)))
         except tokenize.TokenError as e:
-            errors.append("{1}:{2} {0}".format(e.args[0], *e.args[1]))
+            lineno, col = e.args[1]
+            errors.append(Error(lineno, None, (e.args[0],), col=col,
+                                template=_TOKEN_ERROR))
         except pydocstyle.AllError as e:
-            errors.append(str(e))
+            errors.append(Error(None, None, (str(e),),
+                                template=_PLAIN_ERROR))
 
     return errors
 
@@ -474,11 +852,18 @@ def check_license(filename, **kwargs):
     :return: errors
     :rtype: `list`
 
+    """
+    return _format_errors(_license_errors(filename, **kwargs))
+
+
+def _license_errors(filename, **kwargs):
+    """Check the license and return the :class:`.Error` objects.
+
+    .. seealso:: :func:`.check_license`
     """
     year = kwargs.pop("year", datetime.now().year)
     python_style = kwargs.pop("python_style", True)
     ignores = kwargs.get("ignore")
-    template = "{0}: {1} {2}"
 
     if python_style:
         re_comment = re.compile(r"^#.*|\{#.*|[\r\n]+$")
@@ -505,7 +890,7 @@ def check_license(filename, **kwargs):
             file_is_empty = line == ""
             license = "".join(blocks)
     except UnicodeDecodeError:
-        errors.append((lineno + 1, "L190", "utf-8"))
+        errors.append(Error(lineno + 1, "L190", ("utf-8",)))
         license = ""
 
     if file_is_empty and not license.strip():
@@ -513,7 +898,7 @@ def check_license(filename, **kwargs):
 
     match_year = _re_copyright_year.search(license)
     if match_year is None:
-        errors.append((lineno + 1, "L101"))
+        errors.append(Error(lineno + 1, "L101"))
     elif int(match_year.group("year")) != year:
         theline = match_year.group(0)
         lno = lineno
@@ -521,30 +906,92 @@ def check_license(filename, **kwargs):
             if theline.strip() == l:
                 lno = no
                 break
-        errors.append((lno + 1, "L102", year, match_year.group("year")))
+        errors.append(Error(lno + 1, "L102",
+                            (year, match_year.group("year"))))
     else:
         program_match = _re_program.search(license)
         program_2_match = _re_program_2.search(license)
         program_3_match = _re_program_3.search(license)
         if program_match is None:
-            errors.append((lineno, "L100"))
+            errors.append(Error(lineno, "L100"))
         elif (program_2_match is None or
               program_3_match is None or
               (program_match.group("program").upper() !=
                program_2_match.group("program").upper() !=
                program_3_match.group("program").upper())):
-            errors.append((lineno, "L103"))
+            errors.append(Error(lineno, "L103"))
 
-    def _format_error(lineno, code, *args):
-        return template.format(lineno, code,
-                               _licenses_codes[code].format(*args))
+    if ignores:
+        errors = [error for error in errors if error.code not in ignores]
+    return errors
 
-    def _filter_codes(error):
-        if not ignores or error[1] not in ignores:
-            return error
 
-    return list(map(lambda x: _format_error(*x),
-                    filter(_filter_codes, errors)))
+def _get_budget(budget, checker):
+    """Get the budget of the checker, ``budget`` may be a dict by checker."""
+    if isinstance(budget, Mapping):
+        return budget.get(checker, budget.get("default"))
+    return budget
+
+
+def _budget_worker(connection, check, filename, kwargs, memory_limit):
+    """Run the check in a child process and send back its errors."""
+    if memory_limit:
+        try:
+            import resource
+            limit = int(memory_limit * 1024 * 1024)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError):
+            pass
+
+    try:
+        connection.send(("ok", check(filename, **kwargs)))
+    except MemoryError:
+        connection.send(("memory", None))
+    finally:
+        connection.close()
+
+
+def _run_with_budget(checker, check, filename, kwargs, timeout=None,
+                     memory_limit=None):
+    """Run the check in a supervised process.
+
+    :param checker: name of the checker, e.g. ``pep8``
+    :param check: checker function, e.g. ``_pep8_errors``
+    :param timeout: time budget in seconds
+    :param memory_limit: memory budget in megabytes
+    :return: :class:`.Error` objects
+    :rtype: `list`
+    """
+    import multiprocessing
+    if hasattr(multiprocessing, "get_context"):
+        try:
+            multiprocessing = multiprocessing.get_context("fork")
+        except ValueError:
+            pass
+
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_budget_worker,
+        args=(sender, check, filename, kwargs, memory_limit))
+    process.daemon = True
+    process.start()
+    sender.close()
+
+    try:
+        if not receiver.poll(timeout):
+            process.terminate()
+            return [Error(1, "K100", (checker, timeout))]
+        status, errors = receiver.recv()
+    except EOFError:
+        process.join()
+        return [Error(1, "K102", (checker, process.exitcode))]
+    finally:
+        receiver.close()
+        process.join()
+
+    if status == "memory":
+        return [Error(1, "K101", (checker, memory_limit))]
+    return errors
 
 
 def check_file(filename, **kwargs):
@@ -559,35 +1006,123 @@ def check_file(filename, **kwargs):
 
     :param filename: path of file to check.
     :type filename: str
+    :param root: directory ``filename`` is relative to, e.g. the temporary
+        directory holding a copy of the repository. It is used by
+        :func:`.check_pydocstyle` and while profiling.
+    :type root: str
+    :param timeout: time budget of each checker in seconds, or a dict of
+        budgets by checker name, e.g. ``{'pep8': 10, 'default': 5}``
+    :type timeout: float
+    :param memory_limit: memory budget of each checker in megabytes, or a dict
+        of budgets by checker name
+    :type memory_limit: int
+    :param max_file_size: size in bytes above which the expensive checkers
+        are skipped
+    :type max_file_size: int
     :return: errors sorted by line number or None if file is excluded
     :rtype: `list`
 
     """
-    excludes = kwargs.get("excludes", [])
-    errors = []
+    errors = _file_errors(filename, **kwargs)
+    return None if errors is None else _format_errors(errors)
 
-    if is_file_excluded(filename, excludes):
-        return None
 
+def _get_checks(filename, **kwargs):
+    """Dispatch the checks on the type of the file.
+
+    :return: ``(name, function, extra options)`` of each check
+    :rtype: `list`
+    """
+    checks = []
     if filename.endswith(".py"):
         if kwargs.get("pep8", True):
-            errors += check_pep8(filename, **kwargs)
+            checks.append(("pep8", _pep8_errors, {}))
         if kwargs.get("pydocstyle", True):
-            errors += check_pydocstyle(filename, **kwargs)
+            checks.append(("pydocstyle", _pydocstyle_errors, {}))
         if kwargs.get("license", True):
-            errors += check_license(filename, **kwargs)
+            checks.append(("license", _license_errors, {}))
     elif re.search("\.(tpl|html)$", filename):
-        errors += check_license(filename, **kwargs)
+        checks.append(("license", _license_errors, {}))
     elif re.search("\.(js|jsx|css|less)$", filename):
-        errors += check_license(filename, python_style=False, **kwargs)
+        checks.append(("license", _license_errors, {"python_style": False}))
+    return checks
 
-    def try_to_int(value):
-        try:
-            return int(value.split(':', 1)[0])
-        except ValueError:
-            return 0
 
-    return sorted(errors, key=try_to_int)
+def filter_files(filenames, **kwargs):
+    """Sort the files out before reading any of them.
+
+    Only the paths are looked at, so that the content of the excluded files
+    and of the files :func:`.check_file` has nothing to say about is never
+    fetched nor written.
+
+    :param filenames: file names, e.g. the output of ``git diff``
+    :type filenames: `list`
+    :param root: directory the files will be checked in, the exclude
+        patterns are matched against the paths within it like
+        :func:`.check_file` does
+    :type root: str
+    :param excludes: list of regex to match
+    :type excludes: `list`
+    :return: the files to check, the excluded files and the files without
+        any check
+    :rtype: tuple
+    """
+    root = kwargs.get("root") or ""
+    paths = dict((os.path.join(root, filename), filename)
+                 for filename in filenames)
+    kept = set(compile_excludes(kwargs.get("excludes")).filter(paths))
+
+    checked, excluded, unchecked = [], [], []
+    for path, filename in paths.items():
+        if path not in kept:
+            excluded.append(filename)
+        elif _get_checks(filename, **kwargs):
+            checked.append(filename)
+        else:
+            unchecked.append(filename)
+    return sorted(checked), sorted(excluded), sorted(unchecked)
+
+
+def _file_errors(filename, **kwargs):
+    """Check the file and return the :class:`.Error` objects.
+
+    .. seealso:: :func:`.check_file`
+    """
+    excludes = kwargs.get("excludes", [])
+    errors = []
+
+    if is_file_excluded(filename, excludes):
+        return None
+
+    checks = _get_checks(filename, **kwargs)
+
+    max_file_size = kwargs.get("max_file_size")
+    if max_file_size and checks:
+        size = os.path.getsize(filename)
+        skipped = [c for c, _, _ in checks if c in _expensive_checkers]
+        if size > max_file_size and skipped:
+            checks = [c for c in checks if c[0] not in _expensive_checkers]
+            errors.append(Error(1, "K110", (size, max_file_size,
+                                            ", ".join(skipped))))
+
+    name = filename
+    if kwargs.get("root"):
+        name = os.path.relpath(filename, kwargs["root"])
+
+    with profiler.profile_file(name):
+        for checker, check, extra in checks:
+            options = dict(kwargs, **extra)
+            timeout = _get_budget(kwargs.get("timeout"), checker)
+            memory_limit = _get_budget(kwargs.get("memory_limit"), checker)
+            with profiler.measure(checker):
+                if timeout or memory_limit:
+                    errors += _run_with_budget(checker, check, filename,
+                                               options, timeout=timeout,
+                                               memory_limit=memory_limit)
+                else:
+                    errors += check(filename, **options)
+
+    return sorted(errors, key=Error.sort_key)
 
 
 def check_author(author, **kwargs):
@@ -604,11 +1139,19 @@ def check_author(author, **kwargs):
     :return: errors
     :rtype: `list`
     """
+    return _format_errors(_author_errors(author, **kwargs))
+
+
+def _author_errors(author, **kwargs):
+    """Check the author and return the :class:`.Error` objects.
+
+    .. seealso:: :func:`.check_author`
+    """
     errors = []
 
     authors = kwargs.get("authors")
     if not authors:
-        errors.append('1:A100: ' + _author_codes['A100'])
+        errors.append(Error(1, "A100", template=_AUTHOR_ERROR))
         return errors
 
     exclude_author_names = kwargs.get("exclude_author_names")
@@ -621,7 +1164,7 @@ def check_author(author, **kwargs):
 
     for afile in authors:
         if not os.path.exists(path + os.sep + afile):
-            errors.append('1:A101: ' + _author_codes['A101'].format(afile))
+            errors.append(Error(1, "A101", (afile,), template=_AUTHOR_ERROR))
 
     if errors:
         return errors
@@ -632,40 +1175,6 @@ def check_author(author, **kwargs):
                               stderr=subprocess.PIPE,
                               cwd=path).wait()
     if status:
-        errors.append('1:A102: ' + _author_codes['A102'].format(author))
+        errors.append(Error(1, "A102", (author,), template=_AUTHOR_ERROR))
 
     return errors
-
-
-def get_options(config=None):
-    """Build the options from the config object."""
-    if config is None:
-        from . import config
-        config.get = lambda key, default=None: getattr(config, key, default)
-
-    base = {
-        "components": config.get("COMPONENTS"),
-        "signatures": config.get("SIGNATURES"),
-        "commit_msg_template": config.get("COMMIT_MSG_TEMPLATE"),
-        "commit_msg_labels": config.get("COMMIT_MSG_LABELS"),
-        "alt_signatures": config.get("ALT_SIGNATURES"),
-        "trusted": config.get("TRUSTED_DEVELOPERS"),
-        "pep8": config.get("CHECK_PEP8", True),
-        "pydocstyle": config.get("CHECK_PYDOCSTYLE", True),
-        "license": config.get("CHECK_LICENSE", True),
-        "pyflakes": config.get("CHECK_PYFLAKES", True),
-        "ignore": config.get("IGNORE"),
-        "select": config.get("SELECT"),
-        "match": config.get("PYDOCSTYLE_MATCH"),
-        "match_dir": config.get("PYDOCSTYLE_MATCH_DIR"),
-        "min_reviewers": config.get("MIN_REVIEWERS"),
-        "colors": config.get("COLORS", True),
-        "excludes": config.get("EXCLUDES", []),
-        "authors": config.get("AUTHORS"),
-        "exclude_author_names": config.get("EXCLUDE_AUTHOR_NAMES"),
-    }
-    options = {}
-    for k, v in base.items():
-        if v is not None:
-            options[k] = v
-    return options
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Language server publishing the errors of the edited files.
+
+The editor starts ``kwalitee lsp`` and talks to it on the standard streams
+with the `Language Server Protocol`_. The buffers are checked as they are
+typed, before being saved: a modification is checked once the editor has
+been quiet for a short while, and the results of a version that has been
+modified meanwhile are dropped instead of being published.
+
+The errors are published as diagnostics whose code is the kwalitee code,
+e.g. ``L101`` or ``E225``.
+
+.. _Language Server Protocol:
+    https://microsoft.github.io/language-server-protocol/
+"""
+
+from __future__ import absolute_import
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import traceback
+from tempfile import mkdtemp
+
+from .options import load_options
+
+try:
+    from urllib.parse import unquote, urlparse
+except ImportError:  # Python 2
+    from urllib import unquote
+    from urlparse import urlparse
+
+ERROR = 1
+WARNING = 2
+
+_warning_prefixes = ("W", "D", "K110")
+
+
+def read_message(rfile):
+    """Read a message framed with a ``Content-Length`` header.
+
+    :param rfile: binary stream
+    :return: the decoded message or None at the end of the stream
+    :rtype: dict
+    """
+    length = None
+    while True:
+        line = rfile.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is None:
+                continue
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value.strip())
+    return json.loads(rfile.read(length).decode("utf-8"))
+
+
+def write_message(wfile, message):
+    """Write a message framed with a ``Content-Length`` header.
+
+    :param wfile: binary stream
+    :param message: message to encode
+    """
+    body = json.dumps(message).encode("utf-8")
+    wfile.write("Content-Length: {0}\r\n\r\n".format(len(body)).encode(
+        "ascii"))
+    wfile.write(body)
+    wfile.flush()
+
+
+def uri_to_path(uri):
+    """Get the path of a ``file://`` URI."""
+    return os.path.abspath(unquote(urlparse(uri).path))
+
+
+def to_diagnostic(error):
+    """Convert an error into a diagnostic.
+
+    :param error: error of a checker
+    :type error: :class:`kwalitee.kwalitee.Error`
+    :rtype: dict
+    """
+    line = max((error.lineno or 1) - 1, 0)
+    if error.col:
+        start = {"line": line, "character": error.col - 1}
+        end = {"line": line, "character": error.col}
+    else:
+        start = {"line": line, "character": 0}
+        end = {"line": line + 1, "character": 0}
+    severity = ERROR
+    if error.code and error.code.startswith(_warning_prefixes):
+        severity = WARNING
+    return {"range": {"start": start, "end": end},
+            "severity": severity,
+            "code": error.code,
+            "source": "kwalitee",
+            "message": error.message}
+
+
+class LanguageServer(object):
+    """Check the open documents and publish their errors."""
+
+    def __init__(self, rfile, wfile, debounce=0.3):
+        """Use the given streams.
+
+        :param rfile: binary stream the requests are read from
+        :param wfile: binary stream the responses are written to
+        :param debounce: seconds without modification before checking
+        """
+        self.rfile = rfile
+        self.wfile = wfile
+        self.debounce = debounce
+        self.root = os.getcwd()
+        self.documents = {}
+        self.pending = {}
+        self.running = True
+        self.shutdown = False
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.tmpdir = mkdtemp(prefix="kwalitee-lsp-")
+        self.worker = threading.Thread(target=self._work)
+        self.worker.daemon = True
+
+    def send(self, message):
+        """Send a message to the editor."""
+        message["jsonrpc"] = "2.0"
+        with self.write_lock:
+            write_message(self.wfile, message)
+
+    def serve(self):
+        """Handle the messages until the editor asks to exit.
+
+        :return: exit status
+        :rtype: int
+        """
+        self.worker.start()
+        try:
+            while True:
+                message = read_message(self.rfile)
+                if message is None or message.get("method") == "exit":
+                    break
+                self.handle(message)
+        finally:
+            with self.condition:
+                self.running = False
+                self.condition.notify()
+            self.worker.join()
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+        return 0 if self.shutdown else 1
+
+    def handle(self, message):
+        """Dispatch a message to its handler.
+
+        A failing handler is logged, and answers the request with an error,
+        so that a malformed message does not stop the server.
+        """
+        method = message.get("method", "")
+        handler = getattr(self, "on_" + method.replace("/", "_").replace(
+            "$", "_"), None)
+        try:
+            result = handler(message.get("params") or {}) if handler else None
+        except Exception as e:  # noqa, the server has to keep running
+            self.log(traceback.format_exc())
+            if "id" in message and method:
+                self.send({"id": message["id"], "error": {
+                    "code": -32603, "message": "{0}: {1}".format(
+                        type(e).__name__, e)}})
+            return
+        if "id" in message and method:
+            if handler is None:
+                self.send({"id": message["id"], "error": {
+                    "code": -32601, "message": "unknown method " + method}})
+            else:
+                self.send({"id": message["id"], "result": result})
+
+    def log(self, message):
+        """Show a message in the log of the editor."""
+        self.send({"method": "window/logMessage", "params": {
+            "type": ERROR, "message": "kwalitee: " + message}})
+
+    def on_initialize(self, params):
+        """Get the root of the workspace and tell what is supported."""
+        if params.get("rootUri"):
+            self.root = uri_to_path(params["rootUri"])
+        elif params.get("rootPath"):
+            self.root = os.path.abspath(params["rootPath"])
+        return {"capabilities": {"textDocumentSync": {
+            "openClose": True, "change": 1, "save": False}}}
+
+    def on_shutdown(self, params):
+        """Prepare to exit."""
+        self.shutdown = True
+
+    def on_textDocument_didOpen(self, params):
+        """Check the document at once."""
+        document = params["textDocument"]
+        self._update(document["uri"], document.get("version"),
+                     document["text"], delay=0)
+
+    def on_textDocument_didChange(self, params):
+        """Check the document once the modifications are over."""
+        document = params["textDocument"]
+        changes = params.get("contentChanges") or []
+        if changes:
+            # full synchronization, the last change is the whole text
+            self._update(document["uri"], document.get("version"),
+                         changes[-1]["text"], delay=self.debounce)
+
+    def on_textDocument_didClose(self, params):
+        """Forget the document and its errors."""
+        uri = params["textDocument"]["uri"]
+        with self.condition:
+            self.documents.pop(uri, None)
+            self.pending.pop(uri, None)
+        self.send({"method": "textDocument/publishDiagnostics",
+                   "params": {"uri": uri, "diagnostics": []}})
+
+    def _update(self, uri, version, text, delay):
+        with self.condition:
+            self.documents[uri] = (version, text)
+            self.pending[uri] = time.time() + delay
+            self.condition.notify()
+
+    def _next(self):
+        """Wait for the next document to check, or None when stopping."""
+        with self.condition:
+            while self.running:
+                now = time.time()
+                due = [(when, uri) for uri, when in self.pending.items()]
+                if due:
+                    when, uri = min(due)
+                    if when <= now:
+                        del self.pending[uri]
+                        return uri, self.documents[uri]
+                    self.condition.wait(when - now)
+                else:
+                    self.condition.wait()
+        return None
+
+    def _work(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            uri, (version, text) = item
+            try:
+                diagnostics = self.check(uri, text)
+            except Exception as e:  # noqa, the server has to keep running
+                self.log("{0}: {1}".format(type(e).__name__, e))
+                continue
+            with self.condition:
+                current = self.documents.get(uri)
+                # modified or closed meanwhile, the errors are stale
+                stale = current is None or current[0] != version or \
+                    uri in self.pending
+            if not stale:
+                self.send({"method": "textDocument/publishDiagnostics",
+                           "params": {"uri": uri, "version": version,
+                                      "diagnostics": diagnostics}})
+
+    def check(self, uri, text):
+        """Check the content of the document.
+
+        The content is written next to the copies of the other documents,
+        at the same path relative to the root, so that the excludes apply.
+
+        :return: diagnostics
+        :rtype: list
+        """
+        from .kwalitee import _file_errors
+        path = uri_to_path(uri)
+        relpath = os.path.relpath(path, self.root)
+        if relpath.startswith(os.pardir):
+            relpath = os.path.basename(path)
+        filename = os.path.join(self.tmpdir, relpath)
+        dirname = os.path.dirname(filename)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(filename, "wb") as fh:
+            fh.write(text.encode("utf-8"))
+
+        options = load_options(self.root)
+        errors = _file_errors(filename, root=self.tmpdir, **options)
+        return [to_diagnostic(error) for error in errors or ()]
+
+
+def serve(rfile=None, wfile=None, debounce=0.3):
+    """Run the language server on the standard streams.
+
+    :return: exit status
+    :rtype: int
+    """
+    rfile = rfile or getattr(sys.stdin, "buffer", sys.stdin)
+    wfile = wfile or getattr(sys.stdout, "buffer", sys.stdout)
+    return LanguageServer(rfile, wfile, debounce=debounce).serve()
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Cache of bare mirrors of the upstream repositories.
+
+A checker running on a server or in a CI needs the objects of the commits it
+checks, not a full clone per job. The cache keeps one bare mirror per
+upstream URL: a job fetches only the objects the mirror lacks, then reads the
+files straight from the objects, see :meth:`MirrorCache.read_blobs`, or from
+a short-lived worktree of the mirror, see :meth:`MirrorCache.worktree`.
+
+Once the cache grows over its budget, the least recently used mirrors are
+removed. The mirrors being read by a job are locked and never removed.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import os
+import re
+import shutil
+import time
+from contextlib import contextmanager
+from subprocess import PIPE, Popen
+from tempfile import mkdtemp
+
+from . import profiler
+from .state import flock
+
+_re_size = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$", re.I)
+
+
+class MirrorError(Exception):
+    """Git failed on a mirror."""
+
+
+def parse_size(size):
+    """Parse a size like ``512M`` or ``2G`` into bytes.
+
+    :param size: bytes or string with a unit
+    :rtype: int
+    """
+    if size is None or isinstance(size, int):
+        return size
+    match = _re_size.match(str(size))
+    if not match:
+        raise ValueError("invalid size: {0}".format(size))
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** "bkmgt".index((unit or "b").lower()))
+
+
+def _git(args, git_dir=None, stdin=None):
+    """Run git and return its output, raise :class:`MirrorError` otherwise."""
+    command = ["git"]
+    if git_dir:
+        command += ["--git-dir", git_dir]
+    with profiler.measure("git " + args[0]):
+        p = Popen(command + args, stdin=PIPE if stdin is not None else None,
+                  stdout=PIPE, stderr=PIPE)
+        stdout, stderr = p.communicate(stdin)
+    if p.returncode != 0:
+        raise MirrorError("git {0}: {1}".format(
+            " ".join(args), stderr.decode("utf-8", "replace").strip()))
+    return stdout
+
+
+def _disk_usage(path):
+    """Get the bytes used by the files of a directory."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class MirrorCache(object):
+    """Bare mirrors of the upstream repositories, by URL."""
+
+    def __init__(self, directory, budget=None):
+        """Initialize the cache.
+
+        :param directory: where the mirrors are kept
+        :param budget: bytes the mirrors may use, unlimited by default
+        """
+        self.directory = os.path.abspath(directory)
+        self.budget = parse_size(budget)
+
+    def path(self, url):
+        """Get the directory of the mirror of an URL."""
+        name = url.rstrip("/").rsplit("/", 1)[-1]
+        if name.endswith(".git"):
+            name = name[:-4]
+        name = re.sub(r"[^\w.-]", "_", name) or "mirror"
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.directory,
+                            "{0}-{1}.git".format(name, digest))
+
+    @contextmanager
+    def use(self, url):
+        """Keep the mirror from being evicted meanwhile."""
+        path = self.path(url)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        with flock(path + ".lock"):
+            yield path
+
+    def has(self, url, *revisions):
+        """Tell whether the mirror contains all the commits."""
+        path = self.path(url)
+        if not os.path.isdir(path):
+            return False
+        for revision in revisions:
+            try:
+                _git(["cat-file", "-e", revision + "^{commit}"], path)
+            except MirrorError:
+                return False
+        return True
+
+    def fetch(self, url, refs=()):
+        """Create or update the mirror.
+
+        Only the objects missing from the mirror are transferred.
+
+        :param url: URL of the upstream, e.g. ``file:///srv/git/project``
+        :param refs: other references to fetch, e.g. commits that no
+            branch points to
+        :return: the directory of the mirror
+        :rtype: str
+        """
+        with self.use(url) as path:
+            with flock(path + ".fetch.lock", exclusive=True):
+                if not os.path.isdir(path):
+                    tmpdir = mkdtemp(dir=self.directory, prefix=".clone-")
+                    try:
+                        _git(["clone", "--quiet", "--mirror", url,
+                              os.path.join(tmpdir, "mirror")])
+                        os.rename(os.path.join(tmpdir, "mirror"), path)
+                    finally:
+                        shutil.rmtree(tmpdir, ignore_errors=True)
+                else:
+                    _git(["fetch", "--quiet", "--prune", "origin"], path)
+                if refs:
+                    _git(["fetch", "--quiet", "origin"] + list(refs), path)
+            os.utime(path, None)
+            # the mirror in use is kept even if alone over the budget
+            if self.budget is not None:
+                self.evict()
+        return path
+
+    def ensure(self, url, *revisions):
+        """Fetch the mirror unless it already has the commits.
+
+        :return: the directory of the mirror
+        :rtype: str
+        """
+        if revisions and self.has(url, *revisions):
+            path = self.path(url)
+            os.utime(path, None)
+            return path
+        path = self.fetch(url)
+        missing = [revision for revision in revisions
+                   if not self.has(url, revision)]
+        if missing:
+            # e.g. the head of a pull request from a fork
+            self.fetch(url, refs=missing)
+            if not self.has(url, *missing):
+                raise MirrorError("{0}: missing {1}".format(
+                    url, ", ".join(missing)))
+        return path
+
+    def changed_files(self, url, revision, base=None):
+        """List the files added or modified by the commit.
+
+        :param base: compare to this commit instead of the parent
+        :rtype: list
+        """
+        path = self.path(url)
+        if base:
+            args = ["diff", "--name-only", "-z", "--no-renames",
+                    "--diff-filter=ACMRTUXB", base, revision]
+        else:
+            args = ["diff-tree", "-r", "--root", "--no-commit-id",
+                    "--name-only", "-z", "--no-renames",
+                    "--diff-filter=ACMRTUXB", revision]
+        stdout = _git(args, path)
+        return [name.decode("utf-8") for name in stdout.split(b"\0") if name]
+
+    def list_commits(self, url, revision):
+        """List the commits of a range, e.g. ``a..b``, oldest first."""
+        args = ["rev-list", "--reverse", revision]
+        if ".." not in revision:
+            args.insert(1, "--max-count=1")
+        return _git(args, self.path(url)).decode("ascii").split()
+
+    def read_blobs(self, url, revision, filenames):
+        """Read files of a commit from the objects of the mirror.
+
+        :return: contents by file name, None for the missing files
+        :rtype: dict
+        """
+        if not filenames:
+            return {}
+        requests = "".join("{0}:{1}\n".format(revision, filename)
+                           for filename in filenames)
+        stdout = _git(["cat-file", "--batch"], self.path(url),
+                      stdin=requests.encode("utf-8"))
+        contents = {}
+        offset = 0
+        for filename in filenames:
+            end = stdout.index(b"\n", offset)
+            header = stdout[offset:end].split()
+            offset = end + 1
+            if len(header) != 3 or header[1] != b"blob":
+                contents[filename] = None
+                continue
+            size = int(header[2])
+            contents[filename] = stdout[offset:offset + size]
+            offset += size + 1
+        return contents
+
+    @contextmanager
+    def worktree(self, url, revision):
+        """Check the commit out into a temporary worktree of the mirror.
+
+        :return: the directory of the worktree, removed on exit
+        """
+        with self.use(url) as path:
+            tmpdir = mkdtemp(prefix="kwalitee-worktree-")
+            directory = os.path.join(tmpdir, "worktree")
+            try:
+                _git(["worktree", "add", "--quiet", "--detach", directory,
+                      revision], path)
+                yield directory
+            finally:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+                try:
+                    _git(["worktree", "prune"], path)
+                except MirrorError:
+                    pass
+
+    def mirrors(self):
+        """List the mirrors, the least recently used first.
+
+        :return: ``(last use, directory)``
+        :rtype: list
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        mirrors = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".git") and os.path.isdir(path):
+                mirrors.append((os.stat(path).st_mtime, path))
+        return sorted(mirrors)
+
+    def evict(self, budget=None):
+        """Remove the least recently used mirrors until within the budget.
+
+        :param budget: bytes, :attr:`budget` by default
+        :return: the removed directories
+        :rtype: list
+        """
+        budget = self.budget if budget is None else parse_size(budget)
+        if budget is None:
+            return []
+        mirrors = [(used, path, _disk_usage(path))
+                   for used, path in self.mirrors()]
+        total = sum(size for _, _, size in mirrors)
+        removed = []
+        for _, path, size in mirrors:
+            if total <= budget:
+                break
+            with flock(path + ".lock", exclusive=True,
+                       blocking=False) as locked:
+                if not locked:
+                    continue
+                # renamed first, so that it is never seen half removed
+                trash = "{0}.{1}.trash".format(path, time.time())
+                os.rename(path, trash)
+                shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+            removed.append(path)
+        return removed
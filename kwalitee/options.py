@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2014, 2015, 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Options of the checks.
+
+The options are the defaults of :mod:`kwalitee.config` overridden by the
+``.kwalitee.yml`` file of the repository. :func:`load_options` returns them
+frozen and caches them by modification time of the file, in memory and in
+the state directory of the repository (see :mod:`kwalitee.state`), so that
+a warm hook neither imports nor runs the YAML parser.
+"""
+
+from __future__ import absolute_import
+
+import os
+
+from . import state
+from .version import __version__
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+SUPPORTED_FILES = '.py', '.html', '.tpl', '.js', '.jsx', '.css', '.less'
+"""Supported file types."""
+
+CONFIGURATION_FILE = ".kwalitee.yml"
+"""Configuration file of the repository."""
+
+_options = {}
+
+
+def get_options(config=None):
+    """Build the options from the config object."""
+    if config is None:
+        from . import config as module
+
+        def _get(key, default=None):
+            return getattr(module, key, default)
+    else:
+        _get = config.get
+
+    base = {
+        "components": _get("COMPONENTS"),
+        "signatures": _get("SIGNATURES"),
+        "commit_msg_template": _get("COMMIT_MSG_TEMPLATE"),
+        "commit_msg_labels": _get("COMMIT_MSG_LABELS"),
+        "alt_signatures": _get("ALT_SIGNATURES"),
+        "trusted": _get("TRUSTED_DEVELOPERS"),
+        "pep8": _get("CHECK_PEP8", True),
+        "pydocstyle": _get("CHECK_PYDOCSTYLE", True),
+        "license": _get("CHECK_LICENSE", True),
+        "pyflakes": _get("CHECK_PYFLAKES", True),
+        "ignore": _get("IGNORE"),
+        "select": _get("SELECT"),
+        "match": _get("PYDOCSTYLE_MATCH"),
+        "match_dir": _get("PYDOCSTYLE_MATCH_DIR"),
+        "min_reviewers": _get("MIN_REVIEWERS"),
+        "colors": _get("COLORS", True),
+        "excludes": _get("EXCLUDES", []),
+        "authors": _get("AUTHORS"),
+        "exclude_author_names": _get("EXCLUDE_AUTHOR_NAMES"),
+        "timeout": _get("CHECK_TIMEOUT"),
+        "memory_limit": _get("CHECK_MEMORY_LIMIT"),
+        "max_file_size": _get("MAX_FILE_SIZE"),
+        "post_commit_background": _get("POST_COMMIT_BACKGROUND"),
+        "pre_commit_budget": _get("PRE_COMMIT_BUDGET"),
+        "pre_receive_budget": _get("PRE_RECEIVE_BUDGET"),
+    }
+    options = {}
+    for k, v in base.items():
+        if v is not None:
+            options[k] = v
+    return options
+
+
+class Options(Mapping):
+    """Immutable and hashable options.
+
+    The lists become tuples and the dicts become :class:`.Options`, so that
+    they can be used as a cache key. They are passed to the checks like a
+    dict, e.g. ``check_file(filename, **options)``.
+    """
+
+    __slots__ = ("_data", "_hash")
+
+    def __init__(self, *args, **kwargs):
+        """Freeze the given items, like ``dict()`` would take them."""
+        self._data = dict((key, _freeze(value))
+                          for key, value in dict(*args, **kwargs).items())
+        self._hash = None
+
+    def __getitem__(self, key):
+        """Get the value of an option."""
+        return self._data[key]
+
+    def __iter__(self):
+        """Iterate over the option names."""
+        return iter(self._data)
+
+    def __len__(self):
+        """Count the options."""
+        return len(self._data)
+
+    def __hash__(self):
+        """Hash the options, once."""
+        if self._hash is None:
+            self._hash = hash(frozenset(self._data.items()))
+        return self._hash
+
+    def __eq__(self, other):
+        """Compare the options with another mapping."""
+        if isinstance(other, Options):
+            return self._data == other._data
+        return Mapping.__eq__(self, other)
+
+    def __ne__(self, other):
+        """Compare the options with another mapping."""
+        return not self == other
+
+    def __repr__(self):
+        """Represent the options."""
+        return "Options({0!r})".format(self._data)
+
+    def __reduce__(self):
+        """Pickle the options."""
+        return (Options, (self._data, ))
+
+    def merge(self, *args, **kwargs):
+        """Return new options overridden by the given items."""
+        data = dict(self._data)
+        data.update(*args, **kwargs)
+        return Options(data)
+
+
+def _freeze(value):
+    """Make the value hashable."""
+    if isinstance(value, Options):
+        return value
+    if isinstance(value, Mapping):
+        return Options(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(_freeze(item) for item in value)
+    return value
+
+
+_loader = None
+
+
+def load_yaml(stream):
+    """Parse the YAML document using the C loader when available.
+
+    Only the plain YAML types and the tuples, as written by
+    :func:`yaml.dump`, are accepted.
+
+    :param stream: string or file
+    """
+    global _loader
+    import yaml
+    if _loader is None:
+        class _Loader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+            pass
+
+        _Loader.add_constructor(
+            u"tag:yaml.org,2002:python/tuple",
+            lambda loader, node: tuple(loader.construct_sequence(node)))
+        _loader = _Loader
+    return yaml.load(stream, Loader=_loader)
+
+
+def read_configuration(directory="."):
+    """Read the ``.kwalitee.yml`` file of the repository.
+
+    :param directory: root of the repository
+    :return: the parsed options, empty if there is no file
+    :rtype: dict
+    """
+    filepath = os.path.abspath(os.path.join(directory, CONFIGURATION_FILE))
+    data = {}
+    if os.path.exists(filepath):
+        with open(filepath, "rb") as file_read:
+            data = load_yaml(file_read.read()) or {}
+    return data
+
+
+def _stat_key(filepath):
+    """Key identifying the version of the file, or None if missing."""
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return (getattr(stat, "st_mtime_ns", stat.st_mtime), stat.st_size,
+            getattr(stat, "st_ino", 0))
+
+
+def load_options(directory=".", cache=True):
+    """Get the options of the repository.
+
+    The defaults from :mod:`kwalitee.config` are merged with the
+    ``.kwalitee.yml`` file of the repository and frozen. The result is cached
+    in memory and in the state directory, and reused as long as the file is
+    not modified.
+
+    :param directory: root of the repository
+    :param cache: use the on-disk cache, if in a git repository
+    :return: frozen options
+    :rtype: :class:`.Options`
+    """
+    filepath = os.path.abspath(os.path.join(directory, CONFIGURATION_FILE))
+    key = (filepath, _stat_key(filepath), __version__)
+
+    options = _options.get(filepath)
+    if options is not None and options[0] == key:
+        return options[1]
+
+    cached = None
+    if cache:
+        state_directory = state.get_state_directory(directory)
+        if state_directory:
+            cached = os.path.join(state_directory, "options.pickle")
+
+    options = state.load(cached, key) if cached else None
+    if not isinstance(options, Options):
+        options = get_options()
+        if key[1] is not None:
+            options.update(read_configuration(directory))
+        options = Options(options)
+        if cached:
+            state.dump(cached, key, options)
+
+    _options[filepath] = (key, options)
+    return options
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Timing instrumentation of the checkers.
+
+The instrumentation is disabled by default and then only costs a function
+call per checker. Use :func:`start` to collect the timings and :func:`stop`
+to get the :class:`Profiler` back.
+
+.. code-block:: python
+
+    from kwalitee import profiler
+
+    profiler.start(top=5)
+    check_file("foo.py")
+    for line in profiler.stop().report():
+        print(line)
+"""
+
+from __future__ import absolute_import
+
+import heapq
+import itertools
+import os
+import re
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:  # Python 2
+    _cpu_time = time.clock
+
+try:
+    _wall_time = time.perf_counter
+except AttributeError:  # Python 2
+    _wall_time = time.time
+
+_profiler = None
+
+
+class Profiler(object):
+    """Collect the wall and CPU times spent in the checkers and in git.
+
+    The times are aggregated by ``(checker, filename)`` and are exclusive: a
+    checker running inside another one (e.g. pyflakes inside pep8) is not
+    accounted twice.
+    """
+
+    def __init__(self, top=10, cprofile=False):
+        """Initialize an empty profile.
+
+        :param top: number of the slowest files and checks to report
+        :type top: int
+        :param cprofile: keep the :mod:`cProfile` stats of the slowest files
+        :type cprofile: bool
+        """
+        self.top = top
+        self.cprofile = cprofile
+        self.entries = defaultdict(lambda: [0, 0.0, 0.0])
+        self._filename = None
+        self._stack = []
+        self._stats = []
+        self._counter = itertools.count()
+
+    @contextmanager
+    def measure(self, checker, filename=None):
+        """Measure the time spent by ``checker`` on ``filename``.
+
+        The filename defaults to the one being checked, see
+        :meth:`profile_file`.
+        """
+        filename = filename or self._filename
+        children = [0.0, 0.0]
+        self._stack.append(children)
+        wall, cpu = _wall_time(), _cpu_time()
+        try:
+            yield
+        finally:
+            wall, cpu = _wall_time() - wall, _cpu_time() - cpu
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += wall
+                self._stack[-1][1] += cpu
+            entry = self.entries[(checker, filename)]
+            entry[0] += 1
+            entry[1] += wall - children[0]
+            entry[2] += cpu - children[1]
+
+    @contextmanager
+    def profile_file(self, filename):
+        """Attribute the measures of the block to ``filename``.
+
+        If enabled, :mod:`cProfile` runs on the block and only the stats of
+        the ``top`` slowest files are kept.
+        """
+        previous, self._filename = self._filename, filename
+        profile = None
+        if self.cprofile:
+            import cProfile
+            profile = cProfile.Profile()
+        wall = _wall_time()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            self._filename = previous
+            if profile:
+                profile.disable()
+                item = (_wall_time() - wall, next(self._counter), filename,
+                        profile)
+                if len(self._stats) < self.top:
+                    heapq.heappush(self._stats, item)
+                else:
+                    heapq.heappushpop(self._stats, item)
+
+    def totals(self):
+        """Return the calls, wall and CPU times aggregated by checker.
+
+        :return: ``{checker: (calls, wall, cpu)}``
+        :rtype: dict
+        """
+        totals = {}
+        for (checker, _), (calls, wall, cpu) in self.entries.items():
+            total = totals.get(checker, (0, 0.0, 0.0))
+            totals[checker] = (total[0] + calls, total[1] + wall,
+                               total[2] + cpu)
+        return totals
+
+    def slowest_files(self, top=None):
+        """Return the slowest ``(wall, cpu, filename)``."""
+        files = {}
+        for (_, filename), (_, wall, cpu) in self.entries.items():
+            if filename is not None:
+                total = files.get(filename, (0.0, 0.0))
+                files[filename] = (total[0] + wall, total[1] + cpu)
+        return heapq.nlargest(top or self.top,
+                              ((wall, cpu, filename)
+                               for filename, (wall, cpu) in files.items()))
+
+    def slowest_checks(self, top=None):
+        """Return the slowest ``(wall, cpu, checker, filename)``."""
+        return heapq.nlargest(top or self.top,
+                              ((wall, cpu, checker, filename)
+                               for (checker, filename), (_, wall, cpu)
+                               in self.entries.items()),
+                              key=lambda x: x[0])
+
+    def report(self):
+        """Build the profile report.
+
+        :return: lines of the report
+        :rtype: list
+        """
+        row = "{0:>10.3f} {1:>10.3f}  {2}"
+        lines = ["{0:<14} {1:>7} {2:>10} {3:>10}".format(
+            "checker", "calls", "wall (s)", "cpu (s)")]
+        totals = sorted(self.totals().items(), key=lambda x: -x[1][1])
+        for checker, (calls, wall, cpu) in totals:
+            lines.append("{0:<14} {1:>7} {2:>10.3f} {3:>10.3f}".format(
+                checker, calls, wall, cpu))
+
+        lines += ["", "Slowest files:"]
+        for wall, cpu, filename in self.slowest_files():
+            lines.append(row.format(wall, cpu, filename))
+
+        lines += ["", "Slowest checks:"]
+        for wall, cpu, checker, filename in self.slowest_checks():
+            lines.append(row.format(wall, cpu, "{0} {1}".format(
+                checker, filename or "")))
+        return lines
+
+    def dump_stats(self, directory):
+        """Write the :mod:`cProfile` stats of the slowest files.
+
+        :param directory: where to write the ``.prof`` files
+        :return: written filenames, the slowest first
+        :rtype: list
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        filenames = []
+        stats = sorted(self._stats, key=lambda x: x[:2], reverse=True)
+        for rank, (_, _, filename, profile) in enumerate(stats, 1):
+            name = re.sub(r"[^\w.-]+", "_", filename or "unknown")
+            path = os.path.join(directory,
+                                "{0:02d}-{1}.prof".format(rank, name))
+            profile.dump_stats(path)
+            filenames.append(path)
+        return filenames
+
+
+def start(**kwargs):
+    """Start collecting the timings.
+
+    .. seealso:: :class:`Profiler`
+    """
+    global _profiler
+    _profiler = Profiler(**kwargs)
+    return _profiler
+
+
+def enabled():
+    """Tell whether the timings are being collected."""
+    return _profiler is not None
+
+
+def stop():
+    """Stop collecting the timings and return the :class:`Profiler`."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+@contextmanager
+def measure(checker, filename=None):
+    """Measure the block if the profiling is enabled."""
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.measure(checker, filename):
+            yield
+
+
+@contextmanager
+def profile_file(filename):
+    """Attribute the measures of the block to ``filename`` if enabled."""
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.profile_file(filename):
+            yield
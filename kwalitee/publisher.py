@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Publishing of the results of the jobs on Github.
+
+The comments of a file are batched: those of a pull request are posted as
+one review per file, instead of one request per line. The comments and the
+statuses are posted by :data:`kwalitee.config.GITHUB_CONNECTIONS` threads
+at the same time, over the connections kept alive by
+:class:`kwalitee.github.Github`.
+
+The statuses have the :data:`kwalitee.config.CONTEXT` context and the label
+of the pull request is one of :data:`kwalitee.config.LABEL_WIP`,
+:data:`kwalitee.config.LABEL_REVIEW` or :data:`kwalitee.config.LABEL_READY`.
+"""
+
+from __future__ import absolute_import
+
+import threading
+
+
+def file_comments(comments_url, sha, file_errors, reviews_url=None):
+    """Comment the lines with errors, the others in one comment.
+
+    :param comments_url: URL of the comments of the commit
+    :param sha: SHA of the commit
+    :param file_errors: errors and diff positions by file
+    :param reviews_url: URL of the reviews of the pull request, the comments
+        of each file are posted as one review
+    :return: the requests as ``(url, data)`` and the number of errors
+    :rtype: tuple
+    """
+    requests = []
+    others = []
+    count = 0
+    for filename in sorted(file_errors):
+        errors, positions = file_errors[filename]
+        count += len(errors)
+        by_line = {}
+        for error in errors:
+            by_line.setdefault(error.lineno or 1, []).append(str(error))
+        comments = []
+        for lineno in sorted(by_line):
+            if lineno in positions:
+                comments.append({"body": "\n".join(by_line[lineno]),
+                                 "path": filename,
+                                 "position": positions[lineno]})
+            else:
+                others.extend("{0}: {1}".format(filename, error)
+                              for error in by_line[lineno])
+        if comments and reviews_url:
+            requests.append((reviews_url, {"commit_id": sha,
+                                           "event": "COMMENT",
+                                           "comments": comments}))
+        else:
+            requests.extend((comments_url, dict(comment, commit_id=sha))
+                            for comment in comments)
+    if others:
+        requests.append((comments_url, {"body": "\n".join(others)}))
+    return requests, count
+
+
+class Publisher(object):
+    """Post the results of the jobs."""
+
+    def __init__(self, github, config=None):
+        """Initialize the publisher.
+
+        :param github: client of the API
+        :type github: :class:`kwalitee.github.Github`
+        :param config: configuration of the service, see
+            :func:`kwalitee.worker.get_config`
+        """
+        config = config or {}
+        self.github = github
+        self.context = config.get("CONTEXT") or "kwalitee"
+        self.threads = config.get("GITHUB_CONNECTIONS") or 4
+        self.labels = [config.get(name) for name in (
+            "LABEL_WIP", "LABEL_REVIEW", "LABEL_READY") if config.get(name)]
+
+    def status(self, url, state, description, target_url=None):
+        """Get the request setting a status.
+
+        :param url: URL of the statuses of the commit
+        :return: the request as ``(url, data)``
+        :rtype: tuple
+        """
+        return url, {"state": state, "description": description,
+                     "context": self.context, "target_url": target_url}
+
+    def post(self, requests):
+        """Post the requests at the same time.
+
+        A failed request does not stop the others.
+
+        :param requests: requests as ``(url, data)``
+        :raise: the first error, once all the requests are done
+        """
+        requests = list(requests)
+        errors = []
+        lock = threading.Lock()
+
+        def _post():
+            while True:
+                with lock:
+                    if not requests:
+                        return
+                    url, data = requests.pop(0)
+                try:
+                    self.github.post(url, data)
+                except Exception as e:  # noqa, raised by the caller
+                    with lock:
+                        errors.append(e)
+
+        threads = [threading.Thread(target=_post)
+                   for _ in range(min(self.threads, len(requests)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    def label(self, issue_url, label):
+        """Replace the label of kwalitee of the issue, keep the others.
+
+        :param issue_url: URL of the issue of the pull request
+        :param label: new label, None to remove it
+        """
+        url = issue_url + "/labels"
+        current = [item["name"] for item in self.github.get(url) or ()]
+        labels = [name for name in current if name not in self.labels]
+        if label:
+            labels.append(label)
+        if labels != current:
+            self.github.put(url, labels)
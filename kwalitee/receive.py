@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Checks of the commits pushed to a bare repository.
+
+The ``pre-receive`` hook of the server reads the updated references on its
+standard input and refuses the push if a new commit has errors. It runs
+within the quarantine of git: the pushed objects are read, never written,
+and there is no working tree.
+
+The commits new to the repository, i.e. reachable from the pushed heads but
+from none of the existing references, are listed by one ``git log`` and
+checked once each, even when several references are pushed. Their files
+are read with one ``git cat-file --batch``, and a blob changed by several
+commits is checked once. The messages, the authors and the files are
+checked by a pool of processes within a time budget; the push is refused
+when the budget is spent, unless told otherwise.
+
+The options are read from the ``.kwalitee.yml`` file of the bare
+repository, not from the pushed commits, so that a push cannot relax them.
+The authors files are read from each commit.
+
+``kwalitee check all`` checks the commits of a range the same way, see
+:func:`check_commits`.
+"""
+
+from __future__ import absolute_import
+
+import multiprocessing
+import re
+import time
+
+from . import results
+from .mirror import _git
+from .worker import check_batch, check_commit
+
+_re_null = re.compile(r"^0+$")
+
+
+class Commit(object):
+    """Commit pushed to the repository."""
+
+    __slots__ = ("sha", "parents", "author", "message", "files")
+
+    def __init__(self, sha, parents, author, message):
+        """Initialize the commit.
+
+        :param parents: SHA of the parents
+        :param author: ``Name <email>``
+        """
+        self.sha = sha
+        self.parents = parents
+        self.author = author
+        self.message = message
+        self.files = []
+
+
+class Report(object):
+    """Errors of the pushed commits."""
+
+    def __init__(self, commits):
+        """Initialize an empty report of the commits."""
+        self.commits = commits
+        self.errors = dict((commit.sha, []) for commit in commits)
+        self.unchecked = 0
+
+    def __bool__(self):
+        """Tell whether the push can be accepted."""
+        from .kwalitee import is_warning
+        return not self.unchecked and all(
+            is_warning(error) for errors in self.errors.values()
+            for error in errors)
+
+    __nonzero__ = __bool__
+
+    def lines(self):
+        """Format the errors, commit by commit."""
+        for commit in self.commits:
+            errors = self.errors[commit.sha]
+            if errors:
+                yield "commit {0}".format(commit.sha)
+                for error in errors:
+                    yield "    " + error
+        if self.unchecked:
+            yield "{0} check(s) left when the time budget was spent.".format(
+                self.unchecked)
+
+
+def read_updates(stream):
+    """Read the references updated by the push.
+
+    :param stream: standard input of the hook, ``old new ref`` lines
+    :return: ``(old, new, ref)`` of each reference, the deleted ones are
+        left out
+    :rtype: list
+    """
+    updates = []
+    for line in stream:
+        if hasattr(line, "decode"):
+            line = line.decode("utf-8")
+        fields = line.split()
+        if len(fields) == 3 and not _re_null.match(fields[1]):
+            updates.append(tuple(fields))
+    return updates
+
+
+def list_commits(revisions, git_dir=None):
+    """List the commits with one ``git log``.
+
+    :param revisions: arguments of ``git log``, e.g. ``["a..b"]``
+    :return: the commits, parents first
+    :rtype: list
+    """
+    stdout = _git(["log", "--reverse", "--topo-order", "-z",
+                   "--format=%H%x00%P%x00%an <%ae>%x00%B"] + list(revisions),
+                  git_dir)
+    fields = stdout.decode("utf-8", "replace").split("\0")
+    commits = []
+    for index in range(0, len(fields) - 3, 4):
+        sha, parents, author, message = fields[index:index + 4]
+        commits.append(Commit(sha.strip(), parents.split(), author, message))
+    return commits
+
+
+def new_commits(updates, git_dir=None):
+    """List the commits none of the existing references reach.
+
+    :param updates: see :func:`read_updates`
+    :return: the commits, parents first
+    :rtype: list
+    """
+    heads = sorted(set(new for _, new, _ in updates))
+    if not heads:
+        return []
+    return list_commits(heads + ["--not", "--all"], git_dir)
+
+
+def _read_raw(stdout):
+    """Read the output of ``git diff --raw -z``.
+
+    :return: ``(header, path, blob)`` of the files, the header is the commit
+        given by ``git diff-tree --stdin``
+    """
+    fields = stdout.decode("utf-8", "replace").split("\0")
+    header = None
+    index = 0
+    while index < len(fields):
+        field = fields[index]
+        if field.startswith(":"):
+            mode, blob = field.split()[1], field.split()[3]
+            # the submodules and the symbolic links are not files
+            if mode.startswith("100"):
+                yield header, fields[index + 1], blob
+            index += 2
+            continue
+        if field.strip():
+            header = field.strip()
+        index += 1
+
+
+def list_files(commits, git_dir=None):
+    """Fill in the files added or modified by each commit.
+
+    The merges have no files of their own, their parents are checked.
+
+    :return: the commits
+    """
+    if not commits:
+        return commits
+    by_sha = dict((commit.sha, commit) for commit in commits)
+    stdin = "".join("{0}\n".format(commit.sha) for commit in commits)
+    stdout = _git(["diff-tree", "--stdin", "-r", "--root", "-z",
+                   "--no-renames", "--diff-filter=ACMRTUXB"], git_dir,
+                  stdin=stdin.encode("ascii"))
+    for sha, path, blob in _read_raw(stdout):
+        by_sha[sha].files.append((path, blob))
+    return commits
+
+
+def diff_files(revision, git_dir=None):
+    """List the files of the final state of a range.
+
+    The files added or modified between the merge base of ``a..b`` and ``b``
+    are listed once, at their version of ``b``, whatever the commits in
+    between did. A single commit is compared to its parent, its first one
+    for a merge.
+
+    :param revision: range, e.g. ``master..``, or commit
+    :return: the last commit of the range and the ``(path, blob)`` of its
+        files
+    :rtype: tuple
+    """
+    if ".." in revision:
+        base, head = revision.replace("...", "..").split("..", 1)
+        base, head = base or "HEAD", head or "HEAD"
+        args = ["diff", "--raw", "-z", "--no-renames",
+                "--diff-filter=ACMRTUXB", "{0}...{1}".format(base, head)]
+    else:
+        head = revision
+        args = ["diff-tree", "-r", "--root", "--no-commit-id", "--raw", "-z",
+                "--no-renames", "--diff-filter=ACMRTUXB", revision]
+        parents = _git(["rev-list", "--parents", "-n", "1", revision],
+                       git_dir).split()[1:]
+        if len(parents) > 1:
+            # a merge brings the changes of its other parents
+            args[-1:] = [parents[0].decode("ascii"), revision]
+    stdout = _git(args, git_dir)
+    return head, [(path, blob) for _, path, blob in _read_raw(stdout)]
+
+
+def read_objects(shas, git_dir=None):
+    """Read objects, e.g. blobs, with one ``git cat-file --batch``.
+
+    :param shas: SHA or ``revision:path`` of the objects
+    :return: contents by SHA, None for the missing objects
+    :rtype: dict
+    """
+    shas = list(shas)
+    if not shas:
+        return {}
+    stdout = _git(["cat-file", "--batch"], git_dir,
+                  stdin="".join(sha + "\n" for sha in shas).encode("utf-8"))
+    contents = {}
+    offset = 0
+    for sha in shas:
+        end = stdout.index(b"\n", offset)
+        header = stdout[offset:end].split()
+        offset = end + 1
+        if len(header) != 3:
+            contents[sha] = None
+            continue
+        size = int(header[2])
+        contents[sha] = stdout[offset:offset + size]
+        offset += size + 1
+    return contents
+
+
+def _check_commits(commits, authors_files, options):
+    return [[str(error) for error in message_errors + author_errors]
+            for message_errors, author_errors in (
+                check_commit(message, author, authors_files[sha], options)
+                for sha, message, author in commits)]
+
+
+def _check_files(files, options):
+    return [None if errors is None else [str(error) for error in errors]
+            for errors in check_batch(files, options)]
+
+
+def _chunks(items, size):
+    return [items[index:index + size]
+            for index in range(0, len(items), size)]
+
+
+def _file_tasks(keys, options, git_dir, store, policy, batch_size):
+    """Prepare the checks of the files.
+
+    :param keys: ``(path, blob)`` of the files
+    :return: the errors of the files known by the store, the chunks of the
+        others and the tasks checking them
+    :rtype: tuple
+    """
+    known = {}
+    if store is not None:
+        for path, blob in keys:
+            errors = store.get(results.file_key(path, blob, policy))
+            if errors is not None:
+                known[(path, blob)] = errors
+    missing = sorted(key for key in keys if key not in known)
+    contents = read_objects(sorted(set(blob for _, blob in missing)),
+                            git_dir)
+    chunks = _chunks([key for key in missing if contents[key[1]] is not None],
+                     batch_size)
+    tasks = [(_check_files, [(path, contents[blob]) for path, blob in chunk],
+              options) for chunk in chunks]
+    return known, chunks, tasks
+
+
+def _file_results(chunks, outcomes, file_errors, store, policy):
+    """Record the errors of the files checked by the tasks.
+
+    :return: the number of files left unchecked
+    :rtype: int
+    """
+    unchecked = 0
+    for chunk, outcome in zip(chunks, outcomes):
+        if outcome is None:
+            unchecked += len(chunk)
+            continue
+        for (path, blob), errors in zip(chunk, outcome):
+            file_errors[(path, blob)] = errors
+            if store is not None and errors is not None:
+                store.set(results.file_key(path, blob, policy), errors)
+    return unchecked
+
+
+def check_files(files, options, git_dir=None, processes=None, store=None,
+                batch_size=50):
+    """Check versions of files, e.g. listed by :func:`diff_files`.
+
+    :param files: ``(path, blob)`` of the files
+    :param options: options of the checks
+    :param git_dir: the git directory, ``GIT_DIR`` by default
+    :param processes: see :func:`check_commits`
+    :param store: where to look the results of the files up
+    :type store: :class:`kwalitee.results.ResultStore`
+    :return: errors by path, None if the file is excluded
+    :rtype: dict
+    """
+    from .kwalitee import filter_files
+    policy = results.fingerprint(options)
+    checked, excluded, unchecked = filter_files(
+        [path for path, _ in files], **options)
+    checked = set(checked)
+    keys = [(path, blob) for path, blob in files if path in checked]
+    file_errors, chunks, tasks = _file_tasks(keys, options, git_dir, store,
+                                             policy, batch_size)
+    _file_results(chunks, _run(tasks, processes, None, time.time()),
+                  file_errors, store, policy)
+
+    errors = dict((path, None) for path in excluded)
+    errors.update((path, []) for path in unchecked)
+    errors.update((path, file_errors[(path, blob)]) for path, blob in keys
+                  if (path, blob) in file_errors)
+    return errors
+
+
+def check_push(updates, options, git_dir=None, **kwargs):
+    """Check the commits new to the repository.
+
+    :param updates: see :func:`read_updates`
+    :param options: options of the checks
+    :param git_dir: the bare repository, ``GIT_DIR`` by default
+    :param kwargs: see :func:`check_commits`
+    :rtype: :class:`Report`
+    """
+    start = time.time()
+    return check_commits(new_commits(updates, git_dir), options,
+                         git_dir=git_dir, start=start, **kwargs)
+
+
+def check_commits(commits, options, git_dir=None, processes=None,
+                  budget=None, store=None, batch_size=50, start=None):
+    """Check the messages, the authors and the files of the commits.
+
+    :param commits: commits listed by :func:`list_commits`
+    :param options: options of the checks
+    :param git_dir: the git directory, ``GIT_DIR`` by default
+    :param processes: number of processes checking at the same time, all the
+        CPUs by default, 1 checks within the process
+    :param budget: seconds after which the checks left are abandoned
+    :param store: where to look the results of the files up
+    :type store: :class:`kwalitee.results.ResultStore`
+    :param batch_size: commits or files checked by each task
+    :param start: time the budget started at, now by default
+    :rtype: :class:`Report`
+    """
+    from .kwalitee import filter_files
+    start = start or time.time()
+    commits = list_files(commits, git_dir)
+    report = Report(commits)
+    if not commits:
+        return report
+
+    authors = list(options.get("authors") or ())
+    authors_blobs = read_objects(["{0}:{1}".format(commit.sha, name)
+                                  for commit in commits for name in authors],
+                                 git_dir)
+    commit_tasks = [(commit.sha, commit.message, commit.author)
+                    for commit in commits]
+    authors_files = dict((commit.sha, dict(
+        (name, authors_blobs["{0}:{1}".format(commit.sha, name)])
+        for name in authors)) for commit in commits)
+
+    # each version of a file is checked once, by the first commit having it
+    policy = results.fingerprint(options)
+    owners = {}
+    for commit in commits:
+        checked, _, _ = filter_files([path for path, _ in commit.files],
+                                     **options)
+        checked = set(checked)
+        for path, blob in commit.files:
+            if path in checked and (path, blob) not in owners:
+                owners[(path, blob)] = commit.sha
+    file_errors, file_chunks, file_tasks = _file_tasks(
+        owners, options, git_dir, store, policy, batch_size)
+
+    commit_chunks = _chunks(commit_tasks, batch_size)
+    tasks = [(_check_commits, chunk, dict(
+        (sha, authors_files[sha]) for sha, _, _ in chunk), options)
+        for chunk in commit_chunks]
+    outcomes = _run(tasks + file_tasks, processes, budget, start)
+
+    for chunk, outcome in zip(commit_chunks, outcomes):
+        if outcome is None:
+            report.unchecked += len(chunk)
+            continue
+        for (sha, _, _), errors in zip(chunk, outcome):
+            report.errors[sha].extend(errors)
+    report.unchecked += _file_results(file_chunks, outcomes[len(tasks):],
+                                      file_errors, store, policy)
+
+    for (path, blob), sha in sorted(owners.items()):
+        report.errors[sha].extend("{0}: {1}".format(path, error)
+                                  for error in file_errors.get(
+                                      (path, blob)) or ())
+    return report
+
+
+def _run(tasks, processes, budget, start):
+    """Run the tasks until the budget is spent.
+
+    With a budget, the tasks run in child processes, terminated once it is
+    spent.
+
+    :return: the outcome of each task, None for the ones left
+    :rtype: list
+    """
+    def _left():
+        if budget is None:
+            return None
+        return max(budget - (time.time() - start), 0)
+
+    outcomes = [None] * len(tasks)
+    # a task running in the process could not be stopped once over budget
+    if budget is None and (processes == 1 or len(tasks) <= 1):
+        for index, task in enumerate(tasks):
+            outcomes[index] = task[0](*task[1:])
+        return outcomes
+
+    pool = multiprocessing.Pool(min(processes or multiprocessing.cpu_count(),
+                                    len(tasks)))
+    try:
+        pending = [pool.apply_async(task[0], task[1:]) for task in tasks]
+        for index, result in enumerate(pending):
+            try:
+                outcomes[index] = result.get(_left())
+            except multiprocessing.TimeoutError:
+                # the results already there are still taken
+                continue
+    finally:
+        pool.terminate()
+        pool.join()
+    return outcomes
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Access to the git repository from the hooks.
+
+The hooks run once per commit and should not spend their time starting git
+processes. The information is read in process, using :mod:`pygit2` when it
+is installed or the git configuration files, and ``git`` is only run when
+the answer cannot be found otherwise.
+"""
+
+from __future__ import absolute_import
+
+import os
+import re
+import zlib
+
+from . import profiler, state
+
+_re_section = re.compile(r'^\s*\[\s*([\w.-]+)(?:\s+"(.*)")?\s*\]\s*(.*)$')
+_re_variable = re.compile(r"^\s*([\w-]+)\s*(?:=\s*(.*?))?\s*$")
+
+
+def _get_common_directory(git_dir):
+    """Get the git directory shared by the worktrees."""
+    commondir = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir):
+        with open(commondir) as fh:
+            return os.path.normpath(os.path.join(git_dir, fh.read().strip()))
+    return git_dir
+
+
+def _pygit2_repository(directory):
+    """Open the repository with pygit2, or None if not available."""
+    try:
+        import pygit2
+    except ImportError:
+        return None
+    with profiler.measure("pygit2"):
+        try:
+            return pygit2.Repository(state.get_git_directory(directory) or
+                                     directory)
+        except (KeyError, ValueError, OSError, pygit2.GitError):
+            return None
+
+
+def _parse_value(value):
+    """Unquote a git configuration value and strip its comments."""
+    result = []
+    quoted = False
+    escaped = False
+    for char in value or "":
+        if escaped:
+            result.append({"n": "\n", "t": "\t"}.get(char, char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif char in "#;" and not quoted:
+            break
+        else:
+            result.append(char)
+    return "".join(result).strip()
+
+
+def read_git_config(filename, keys):
+    """Read some variables from a git configuration file.
+
+    :param filename: configuration file
+    :param keys: variables to read, e.g. ``('user.name', )``
+    :return: values by variable, None if the file includes other files
+    :rtype: dict
+    """
+    values = {}
+    section = None
+    try:
+        with open(filename, "rb") as fh:
+            lines = fh.read().decode("utf-8", "replace").splitlines()
+    except (IOError, OSError):
+        return values
+
+    for line in lines:
+        match = _re_section.match(line)
+        if match:
+            name, subsection, line = match.groups()
+            if name.lower() in ("include", "includeif"):
+                return None
+            section = name.lower()
+            if subsection is not None:
+                section += "." + subsection
+        match = _re_variable.match(line)
+        if match and section is not None:
+            key = "{0}.{1}".format(section, match.group(1).lower())
+            if key in keys:
+                values[key] = _parse_value(match.group(2))
+    return values
+
+
+def _get_config_files(directory):
+    """List the git configuration files, by increasing priority."""
+    home = os.path.expanduser("~")
+    files = []
+    if not os.environ.get("GIT_CONFIG_NOSYSTEM"):
+        files.append(os.environ.get("GIT_CONFIG_SYSTEM", "/etc/gitconfig"))
+    if os.environ.get("GIT_CONFIG_GLOBAL"):
+        files.append(os.environ["GIT_CONFIG_GLOBAL"])
+    else:
+        xdg = os.environ.get("XDG_CONFIG_HOME") or \
+            os.path.join(home, ".config")
+        files.append(os.path.join(xdg, "git", "config"))
+        files.append(os.path.join(home, ".gitconfig"))
+    git_dir = state.get_git_directory(directory)
+    if git_dir:
+        files.append(os.path.join(_get_common_directory(git_dir), "config"))
+    return files
+
+
+def get_config(keys, directory="."):
+    """Read some variables of the git configuration without running git.
+
+    :param keys: variables to read, e.g. ``('user.name', )``
+    :param directory: directory within the working tree
+    :return: values by variable or None if the configuration cannot be read
+        reliably, e.g. it uses ``include`` or ``git -c``
+    :rtype: dict
+    """
+    if os.environ.get("GIT_CONFIG_PARAMETERS") or \
+            os.environ.get("GIT_CONFIG_COUNT") or \
+            os.environ.get("GIT_CONFIG"):
+        return None
+
+    values = {}
+    for filename in _get_config_files(directory):
+        file_values = read_git_config(filename, keys)
+        if file_values is None:
+            return None
+        values.update(file_values)
+    return values
+
+
+def get_author(directory="."):
+    """Get the author of the commit being prepared.
+
+    It is the equivalent of ``git var GIT_AUTHOR_IDENT`` without the date.
+
+    :param directory: directory within the working tree
+    :return: author, e.g. ``John Doe <john.doe@example.org>``
+    :rtype: str
+    """
+    name = os.environ.get("GIT_AUTHOR_NAME")
+    email = os.environ.get("GIT_AUTHOR_EMAIL")
+
+    if name is None or email is None:
+        config = get_config(("author.name", "author.email", "user.name",
+                             "user.email"), directory)
+        if config is not None:
+            name = name or config.get("author.name", config.get("user.name"))
+            email = email or config.get("author.email",
+                                        config.get("user.email"))
+
+    if not name or not email:
+        repository = _pygit2_repository(directory)
+        if repository is not None:
+            try:
+                signature = repository.default_signature
+                name, email = name or signature.name, email or signature.email
+            except (KeyError, ValueError):
+                pass
+
+    if not name or not email:
+        from .hooks import run
+        _, stdout, _ = run("git var GIT_AUTHOR_IDENT")
+        git_author = stdout[0]
+        return git_author[:git_author.find(">") + 1]
+
+    return u"{0} <{1}>".format(name, email)
+
+
+def get_staged_files(directory="."):
+    """Get the paths added, copied, modified or renamed in the index.
+
+    It is the equivalent of ``git diff-index --cached --name-only
+    --diff-filter=ACMRTUXB HEAD``.
+
+    :param directory: directory within the working tree
+    :return: paths relative to the root of the working tree
+    :rtype: list
+    """
+    repository = _pygit2_repository(directory)
+    if repository is not None:
+        import pygit2
+        deleted = getattr(pygit2, "GIT_DELTA_DELETED", 2)
+        try:
+            with profiler.measure("pygit2"):
+                tree = repository.revparse_single("HEAD^{tree}")
+                diff = repository.index.diff_to_tree(tree)
+                return [delta.new_file.path for delta in diff.deltas
+                        if delta.status != deleted]
+        except (KeyError, ValueError, pygit2.GitError):
+            pass
+
+    from .hooks import run
+    cmd = "git diff-index --cached --name-only --diff-filter=ACMRTUXB HEAD"
+    _, files_modified, _ = run(cmd)
+    return files_modified
+
+
+def resolve_ref(name="HEAD", directory="."):
+    """Resolve the reference from the files of the git directory.
+
+    The name is looked up like git does, e.g. ``master`` is found in
+    ``refs/heads`` and ``v1.0`` in ``refs/tags``. The other revisions, e.g.
+    ``HEAD~1``, are resolved by ``git rev-parse``.
+
+    :param name: reference, e.g. ``HEAD`` or ``refs/heads/master``
+    :param directory: directory within the working tree
+    :return: the SHA or None if it cannot be resolved, e.g. unborn branch
+    :rtype: str
+    """
+    git_dir = state.get_git_directory(directory)
+    if git_dir is None:
+        return None
+    # worktrees keep their HEAD, the branches are in the common directory
+    common_dir = _get_common_directory(git_dir)
+
+    candidates = [name] + [rule.format(name) for rule in _ref_rules]
+    for _ in range(10):
+        for candidate in candidates:
+            value = _read_ref(git_dir, common_dir, candidate)
+            if value is not None:
+                break
+        else:
+            if len(candidates) == 1:
+                # symbolic reference to an unborn branch
+                return None
+            return _rev_parse(name, directory)
+        if not value.startswith("ref:"):
+            return value
+        candidates = [value[len("ref:"):].strip()]
+    return None
+
+
+_ref_rules = ("refs/{0}", "refs/tags/{0}", "refs/heads/{0}",
+              "refs/remotes/{0}", "refs/remotes/{0}/HEAD")
+"""Where git looks the short names up, after the git directory itself."""
+
+_re_sha = re.compile(r"^[0-9a-f]{40}$")
+
+
+def _read_ref(git_dir, common_dir, name):
+    """Read a reference, loose or packed.
+
+    :return: the SHA, the ``ref:`` line of a symbolic reference or None,
+        also for the files that are not references, e.g. ``config``
+    """
+    for base in (git_dir, common_dir):
+        try:
+            with open(os.path.join(base, name)) as fh:
+                value = fh.read().strip()
+        except (IOError, OSError):
+            continue
+        if value.startswith("ref:"):
+            return value
+        # e.g. FETCH_HEAD gives where the SHA comes from after it
+        fields = value.split()
+        if fields and _re_sha.match(fields[0]):
+            return fields[0]
+    return _read_packed_ref(common_dir, name)
+
+
+def _rev_parse(name, directory):
+    """Resolve a revision with ``git rev-parse``, None if it fails."""
+    from subprocess import PIPE, Popen
+    with profiler.measure("git rev-parse"):
+        process = Popen(["git", "rev-parse", "--verify", "--quiet",
+                         "{0}^{{commit}}".format(name)], stdout=PIPE,
+                        stderr=PIPE, cwd=directory)
+        stdout, _ = process.communicate()
+    if process.returncode != 0:
+        return None
+    return stdout.decode("ascii").strip() or None
+
+
+def _read_packed_ref(git_dir, name):
+    """Look the reference up in the packed-refs file."""
+    try:
+        with open(os.path.join(git_dir, "packed-refs")) as fh:
+            for line in fh:
+                if line.startswith(("#", "^")):
+                    continue
+                parts = line.split()
+                if len(parts) == 2 and parts[1] == name:
+                    return parts[0]
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def read_loose_object(sha, directory="."):
+    """Read an object stored as a loose object.
+
+    The objects written by a commit are loose until git packs them.
+
+    :param sha: SHA of the object
+    :param directory: directory within the working tree
+    :return: ``(type, content)`` or None if not a loose object
+    :rtype: tuple
+    """
+    git_dir = state.get_git_directory(directory)
+    if git_dir is None or not sha or len(sha) != 40:
+        return None
+    objects = os.path.join(_get_common_directory(git_dir), "objects")
+    for objects in (os.environ.get("GIT_OBJECT_DIRECTORY"), objects):
+        if not objects:
+            continue
+        try:
+            with open(os.path.join(objects, sha[:2], sha[2:]), "rb") as fh:
+                data = zlib.decompress(fh.read())
+        except (IOError, OSError, zlib.error):
+            continue
+        header, _, content = data.partition(b"\0")
+        return header.split(b" ")[0].decode("ascii"), content
+    return None
+
+
+def _read_commit(sha, directory):
+    """Get the SHA and the raw content of a commit."""
+    from .hooks import run
+
+    resolved = sha if re.match(r"^[0-9a-f]{40}$", sha) else \
+        resolve_ref(sha, directory)
+    if resolved is None:
+        _, stdout, _ = run("git rev-parse {0}".format(sha))
+        resolved = stdout[0]
+
+    obj = read_loose_object(resolved, directory)
+    if obj is not None and obj[0] == "commit":
+        return resolved, obj[1]
+    _, content, _ = run("git cat-file commit {0}".format(resolved),
+                        raw_output=True)
+    return resolved, content
+
+
+def get_commit_message(sha="HEAD", directory="."):
+    """Get the SHA and the message of a commit.
+
+    The commit is read in process if it is a loose object, e.g. the one
+    just committed, and using ``git cat-file`` otherwise.
+
+    :param sha: commit SHA or reference
+    :param directory: directory within the working tree
+    :return: the SHA and the message
+    :rtype: tuple
+    """
+    resolved, content = _read_commit(sha, directory)
+
+    headers, _, message = content.partition(b"\n\n")
+    encoding = "utf-8"
+    for header in headers.split(b"\n"):
+        if header.startswith(b"encoding "):
+            encoding = header[len(b"encoding "):].decode("ascii")
+    try:
+        return resolved, message.decode(encoding, "replace")
+    except LookupError:
+        return resolved, message.decode("utf-8", "replace")
+
+
+def get_commit_tree(sha="HEAD", directory="."):
+    """Get the SHA of the tree of a commit.
+
+    :param sha: commit SHA or reference
+    :param directory: directory within the working tree
+    :return: the SHA of the tree
+    :rtype: str
+    """
+    _, content = _read_commit(sha, directory)
+    headers = content.partition(b"\n\n")[0].split(b"\n")
+    return headers[0][len(b"tree "):].decode("ascii")
+
+
+def write_tree():
+    """Write the index as a tree, like ``git write-tree``.
+
+    The pre-commit hook gets the tree of the commit being made.
+
+    :return: the SHA of the tree or None if the index cannot be written
+    :rtype: str
+    """
+    from .hooks import run
+    code, stdout, _ = run("git write-tree")
+    if code != 0 or not stdout:
+        return None
+    return stdout[0]
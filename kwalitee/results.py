@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Results of the checks shared by the hooks and the command-line tools.
+
+The same content is checked several times: by the ``pre-commit`` hook, by
+the ``post-commit`` hook and by ``kwalitee check`` run locally before
+pushing. The results are kept in the state directory of the repository and
+reused as long as the checked content and the policy are the same.
+
+A file is known by its path and its git blob id, a message by its hash. The
+policy is the fingerprint of the options the checks run with, of the version
+of kwalitee and, for the files, of the year the license checks expect.
+"""
+
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from tempfile import mkstemp
+
+from . import state
+from .version import __version__
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+FILE = "file"
+MESSAGE = "message"
+
+# options changing how the results are shown or when the checks run
+_not_policy = ("allow_empty", "colors", "root", "post_commit_background",
+               "pre_commit_budget")
+
+
+def _encode(value):
+    if hasattr(value, "encode"):
+        return value.encode("utf-8")
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    return repr(value)
+
+
+def fingerprint(options, kind=FILE):
+    """Get the fingerprint of the policy.
+
+    :param options: options given to the checks
+    :param kind: :data:`FILE` or :data:`MESSAGE`
+    :return: hexadecimal SHA-1
+    :rtype: str
+    """
+    policy = dict((key, value) for key, value in (options or {}).items()
+                  if key not in _not_policy)
+    policy["__kind__"] = kind
+    policy["__version__"] = __version__
+    if kind == FILE:
+        policy["__year__"] = datetime.now().year
+    data = json.dumps(policy, sort_keys=True, default=_json_default)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def blob_id(content):
+    """Get the git blob id of the content, like ``git hash-object``.
+
+    :param content: content of the file
+    :type content: bytes
+    :rtype: str
+    """
+    header = "blob {0}\0".format(len(content)).encode("ascii")
+    return hashlib.sha1(header + content).hexdigest()
+
+
+def file_key(path, blob, policy):
+    """Get the key of the results of a file.
+
+    :param path: path of the file within the repository
+    :param blob: git blob id of its content, see :func:`blob_id`
+    :param policy: fingerprint of the options, see :func:`fingerprint`
+    :rtype: str
+    """
+    data = b"\0".join((_encode(FILE), _encode(path), _encode(blob),
+                       _encode(policy)))
+    return hashlib.sha1(data).hexdigest()
+
+
+def message_key(message, policy):
+    """Get the key of the results of a commit message.
+
+    :param message: commit message
+    :param policy: fingerprint of the options, see :func:`fingerprint`
+    :rtype: str
+    """
+    data = b"\0".join((_encode(MESSAGE), _encode(message), _encode(policy)))
+    return hashlib.sha1(data).hexdigest()
+
+
+class ResultStore(object):
+    """Errors by key, stored like the git loose objects."""
+
+    def __init__(self, directory):
+        """Use the given directory.
+
+        :param directory: where to store the results, created on demand
+        """
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        """Get the errors recorded for the key.
+
+        :return: the errors or None if unknown
+        :rtype: list
+        """
+        try:
+            with open(self._path(key)) as fh:
+                return json.load(fh)["errors"]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, key, errors):
+        """Record the errors of the key."""
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        try:
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            fd, tmp = mkstemp(dir=dirname, prefix=".tmp-")
+            with os.fdopen(fd, "w") as fh:
+                json.dump({"errors": list(errors)}, fh)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            # a read-only repository only loses the reuse
+            pass
+
+    def prune(self, keep=10000, interval=24 * 3600):
+        """Remove the oldest results, at most once per interval.
+
+        :param keep: number of results to keep
+        :param interval: seconds between two prunings
+        """
+        marker = os.path.join(self.directory, ".pruned")
+        try:
+            if time.time() - os.stat(marker).st_mtime < interval:
+                return
+        except OSError:
+            if not os.path.isdir(self.directory):
+                return
+        try:
+            with open(marker, "w"):
+                pass
+        except (IOError, OSError):
+            return
+
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    pass
+        entries.sort(reverse=True)
+        for _, path in entries[keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cached(self, key, check, *args, **kwargs):
+        """Get the errors of the key, running ``check`` if unknown.
+
+        :return: the errors
+        :rtype: list
+        """
+        errors = self.get(key)
+        if errors is None:
+            errors = check(*args, **kwargs)
+            if errors is not None:
+                self.set(key, errors)
+        return errors
+
+
+def get_store(directory=".", create=True):
+    """Get the store of the repository.
+
+    :param directory: directory within the working tree
+    :param create: create the state directory if missing
+    :return: the store or None outside of a git repository
+    :rtype: :class:`.ResultStore`
+    """
+    state_directory = state.get_state_directory(directory, create=create)
+    if state_directory is None:
+        return None
+    return ResultStore(os.path.join(state_directory, "results"))
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Fair share of the webhook service between the repositories.
+
+Each repository, or tenant, has its own queue. The queues are served by
+weighted fair share: the tenant served the least relatively to its weight
+goes first, so that one large push cannot starve the other repositories.
+A tenant idle for a while does not get credit for the time it was idle.
+
+The jobs are queued in a :class:`FairQueue`. Their checks are split into
+batches of files, which go through a :class:`FairScheduler` in front of the
+pool of processes, so that the batches of the small jobs interleave with the
+ones of a large job.
+"""
+
+from __future__ import absolute_import
+
+import threading
+import time
+from collections import deque
+
+
+class FairQueue(object):
+    """Per-tenant queues served by weighted fair share."""
+
+    def __init__(self, weights=None):
+        """Initialize the queue.
+
+        :param weights: weight by tenant, 1 by default, see
+            :data:`kwalitee.config.WORKER_WEIGHTS`
+        """
+        self.weights = dict(weights or {})
+        self.queues = {}
+        self.virtual = {}
+        self.clock = 0.0
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _metrics(self, tenant):
+        if tenant not in self.metrics:
+            self.metrics[tenant] = {"queued": 0, "served": 0,
+                                    "wait_total": 0.0, "wait_max": 0.0}
+        return self.metrics[tenant]
+
+    def put(self, tenant, item):
+        """Queue an item of the tenant."""
+        with self.lock:
+            queue = self.queues.get(tenant)
+            if not queue:
+                queue = self.queues[tenant] = deque()
+                # no credit for the time spent idle
+                self.virtual[tenant] = max(self.virtual.get(tenant, 0.0),
+                                           self.clock)
+            queue.append((time.time(), item))
+            self._metrics(tenant)["queued"] += 1
+
+    def get(self):
+        """Take the next item.
+
+        :return: the tenant and the item
+        :rtype: tuple
+        :raise IndexError: if the queues are empty
+        """
+        with self.lock:
+            if not self.queues:
+                raise IndexError("empty queue")
+            tenant = min(self.queues, key=lambda t: (
+                self.virtual[t], self.queues[t][0][0]))
+            queue = self.queues[tenant]
+            queued, item = queue.popleft()
+            if not queue:
+                del self.queues[tenant]
+            self.clock = self.virtual[tenant]
+            self.virtual[tenant] += 1.0 / self.weights.get(tenant, 1)
+
+            wait = time.time() - queued
+            metrics = self._metrics(tenant)
+            metrics["queued"] -= 1
+            metrics["served"] += 1
+            metrics["wait_total"] += wait
+            metrics["wait_max"] = max(metrics["wait_max"], wait)
+            return tenant, item
+
+    def __len__(self):
+        """Count the queued items."""
+        with self.lock:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def depth(self, tenant):
+        """Count the queued items of a tenant."""
+        with self.lock:
+            return len(self.queues.get(tenant) or ())
+
+    def stats(self):
+        """Get the queue depth and the wait times by tenant.
+
+        :return: ``queued``, ``served``, ``wait_avg`` and ``wait_max`` in
+            seconds, by tenant
+        :rtype: dict
+        """
+        with self.lock:
+            stats = {}
+            for tenant, metrics in self.metrics.items():
+                served = metrics["served"]
+                stats[tenant] = {
+                    "queued": metrics["queued"],
+                    "served": served,
+                    "wait_avg": metrics["wait_total"] / served
+                    if served else 0.0,
+                    "wait_max": metrics["wait_max"]}
+            return stats
+
+
+class _Task(object):
+    """Call waiting for a slot of the executor."""
+
+    def __init__(self, future, fn, args):
+        self.future = future
+        self.fn = fn
+        self.args = args
+
+
+class FairScheduler(object):
+    """Submit the tasks of the tenants to an executor by fair share.
+
+    At most ``slots`` tasks are handed to the executor at once, the others
+    wait in a :class:`FairQueue`.
+    """
+
+    def __init__(self, executor, slots, weights=None):
+        """Initialize the scheduler.
+
+        :param executor: e.g. a :class:`concurrent.futures.ProcessPoolExecutor`
+        :param slots: tasks running at once, e.g. the number of processes
+        :param weights: weight by tenant
+        """
+        self.executor = executor
+        self.slots = slots
+        self.running = 0
+        self.queue = FairQueue(weights)
+        self.lock = threading.Lock()
+
+    def submit(self, tenant, fn, *args):
+        """Queue a call of the tenant.
+
+        :return: the future of the call
+        :rtype: :class:`concurrent.futures.Future`
+        """
+        from concurrent.futures import Future
+        future = Future()
+        self.queue.put(tenant, _Task(future, fn, args))
+        self._pump()
+        return future
+
+    def tenant(self, tenant):
+        """Get an executor submitting the calls as the tenant."""
+        return _TenantExecutor(self, tenant)
+
+    def _pump(self):
+        while True:
+            with self.lock:
+                if self.running >= self.slots:
+                    return
+                try:
+                    _, task = self.queue.get()
+                except IndexError:
+                    return
+                if not task.future.set_running_or_notify_cancel():
+                    # cancelled while waiting
+                    continue
+                self.running += 1
+            try:
+                inner = self.executor.submit(task.fn, *task.args)
+            except Exception as e:  # noqa, e.g. the executor is shut down
+                self._done(task, None, e)
+                continue
+            inner.add_done_callback(
+                lambda inner, task=task: self._done(task, inner))
+
+    def _done(self, task, inner, error=None):
+        with self.lock:
+            self.running -= 1
+        if error is None:
+            error = inner.exception()
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(inner.result())
+        self._pump()
+
+    def stats(self):
+        """Get the metrics by tenant, see :meth:`FairQueue.stats`."""
+        return self.queue.stats()
+
+
+class _TenantExecutor(object):
+    """Executor submitting to a :class:`FairScheduler` as one tenant."""
+
+    def __init__(self, scheduler, tenant):
+        self.scheduler = scheduler
+        self.tenant = tenant
+
+    def submit(self, fn, *args):
+        """Queue a call."""
+        return self.scheduler.submit(self.tenant, fn, *args)
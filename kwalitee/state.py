@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Per-repository state kept by kwalitee between two runs.
+
+It lives in the ``kwalitee`` directory of the git directory, e.g.
+``.git/kwalitee``, so that it is never committed. A linked worktree has its
+own git directory, ``.git/worktrees/<name>``, hence its own state.
+"""
+
+from __future__ import absolute_import
+
+import os
+import pickle
+from contextlib import contextmanager
+from tempfile import mkstemp
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover, Windows
+    fcntl = None
+
+
+def get_git_directory(directory="."):
+    """Find the git directory without running git.
+
+    ``GIT_DIR`` is honoured, as git sets it while running the hooks.
+
+    :param directory: directory within the working tree
+    :return: absolute path of the git directory or None
+    :rtype: str
+    """
+    if os.environ.get("GIT_DIR"):
+        return os.path.abspath(os.environ["GIT_DIR"])
+
+    directory = os.path.abspath(directory)
+    while True:
+        dotgit = os.path.join(directory, ".git")
+        if os.path.isdir(dotgit):
+            return dotgit
+        if os.path.isfile(dotgit):
+            # worktrees and submodules: "gitdir: <path>"
+            with open(dotgit) as fh:
+                content = fh.read().strip()
+            if content.startswith("gitdir:"):
+                return os.path.normpath(os.path.join(
+                    directory, content[len("gitdir:"):].strip()))
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def get_state_directory(directory=".", create=False):
+    """Get the directory holding the state of the repository.
+
+    :param directory: directory within the working tree
+    :param create: create the directory if missing
+    :return: absolute path or None outside of a git repository
+    :rtype: str
+    """
+    git_dir = get_git_directory(directory)
+    if git_dir is None:
+        return None
+    state = os.path.join(git_dir, "kwalitee")
+    if create and not os.path.isdir(state):
+        try:
+            os.makedirs(state)
+        except OSError:
+            if not os.path.isdir(state):
+                raise
+    return state
+
+
+@contextmanager
+def flock(path, exclusive=False, blocking=True):
+    """Lock a file, yield whether the lock is held.
+
+    The lock is advisory and always held where ``fcntl`` is missing.
+
+    :param path: lock file, created if missing
+    :param exclusive: take an exclusive lock instead of a shared one
+    :param blocking: wait for the lock instead of giving up
+    """
+    if fcntl is None:
+        yield True
+        return
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+        except (IOError, OSError):
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)
+
+
+def load(filename, key):
+    """Load the pickled value stored with the given key.
+
+    :param filename: cache file
+    :param key: key the value was stored with, e.g. an mtime
+    :return: the value or None if missing, stale or unreadable
+    """
+    try:
+        with open(filename, "rb") as fh:
+            stored_key, value = pickle.load(fh)
+    except (IOError, OSError, EOFError, ValueError, TypeError,
+            AttributeError, ImportError, pickle.UnpicklingError):
+        # missing, truncated or written by another version
+        return None
+    return value if stored_key == key else None
+
+
+def dump(filename, key, value):
+    """Pickle the value atomically, along with its key.
+
+    Concurrent writers never leave a partially written file behind, the
+    last one wins.
+
+    :param filename: cache file
+    :param key: key to validate the value with when loading it
+    :param value: value to store
+    :return: True if the value was written
+    :rtype: bool
+    """
+    directory = os.path.dirname(filename)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp = mkstemp(dir=directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump((key, value), fh, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, filename)
+    except (IOError, OSError):
+        return False
+    return True
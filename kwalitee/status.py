@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Checks running in the background of the hooks.
+
+A hook hands its checks over to a detached process and returns at once.
+The results are stored by key, e.g. the commit SHA, in the state directory
+of the repository and shown by ``kwalitee status``.
+
+Each job runs in a slot, e.g. ``post-commit``. Starting a job cancels the
+one still running in the same slot: after a series of amends only the last
+commit is checked.
+"""
+
+from __future__ import absolute_import
+
+import errno
+import json
+import os
+import signal
+import sys
+import time
+from tempfile import mkstemp
+
+from . import state
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class StatusStore(object):
+    """Results of the background checks, one JSON file per key."""
+
+    def __init__(self, directory):
+        """Use the given directory.
+
+        :param directory: where to store the results, created on demand
+        """
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, "{0}.json".format(key))
+
+    def _makedirs(self):
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                if not os.path.isdir(self.directory):
+                    raise
+
+    def _write(self, filename, content):
+        self._makedirs()
+        fd, tmp = mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as fh:
+            fh.write(content)
+        os.rename(tmp, filename)
+
+    def get(self, key):
+        """Get the record of the key.
+
+        :return: the record or None
+        :rtype: dict
+        """
+        try:
+            with open(self._path(key)) as fh:
+                return json.load(fh)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, **fields):
+        """Replace the record of the key."""
+        record = dict(fields, key=key)
+        record.setdefault("updated", time.time())
+        self._write(self._path(key), json.dumps(record, sort_keys=True))
+        return record
+
+    def update(self, key, states=None, **fields):
+        """Update some fields of the record of the key.
+
+        The record is read and written back under a lock, so that the hooks
+        and the background jobs do not overwrite each other's updates.
+
+        :param states: update the record only if it is in one of them
+        :return: the record, None if it was left as is
+        """
+        self._makedirs()
+        with state.flock(os.path.join(self.directory, ".lock"),
+                         exclusive=True):
+            record = self.get(key) or {}
+            if states is not None and record.get("state") not in states:
+                return None
+            record.update(fields)
+            record.pop("key", None)
+            record["updated"] = time.time()
+            return self.set(key, **record)
+
+    def list(self, limit=None):
+        """List the records, the most recent first.
+
+        :param limit: maximum number of records
+        :rtype: list
+        """
+        records = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return records
+        for name in names:
+            if name.endswith(".json") and not name.startswith("."):
+                record = self.get(name[:-len(".json")])
+                if record is not None:
+                    records.append(record)
+        records.sort(key=lambda r: r.get("updated", 0), reverse=True)
+        return records[:limit] if limit else records
+
+    def prune(self, keep=50):
+        """Remove the oldest records.
+
+        :param keep: number of records to keep
+        """
+        for record in self.list()[keep:]:
+            try:
+                os.remove(self._path(record["key"]))
+            except OSError:
+                pass
+
+    def _slot_path(self, slot):
+        return os.path.join(self.directory, ".{0}.pid".format(slot))
+
+    def get_slot(self, slot):
+        """Get the ``(pid, key)`` of the job of the slot, or None."""
+        try:
+            with open(self._slot_path(slot)) as fh:
+                pid, key = fh.read().split(None, 1)
+            return int(pid), key.strip()
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set_slot(self, slot, pid, key):
+        """Record the job running in the slot."""
+        self._write(self._slot_path(slot), "{0} {1}\n".format(pid, key))
+
+    def release_slot(self, slot, pid):
+        """Forget the job of the slot, if it is still the given one."""
+        job = self.get_slot(slot)
+        if job is not None and job[0] == pid:
+            try:
+                os.remove(self._slot_path(slot))
+            except OSError:
+                pass
+
+
+def get_store(directory=".", create=False):
+    """Get the store of the repository.
+
+    :param directory: directory within the working tree
+    :param create: create the state directory if missing
+    :return: the store or None outside of a git repository
+    :rtype: :class:`.StatusStore`
+    """
+    state_directory = state.get_state_directory(directory, create=create)
+    if state_directory is None:
+        return None
+    return StatusStore(os.path.join(state_directory, "status"))
+
+
+def is_alive(pid):
+    """Tell whether the process exists."""
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def cancel(store, slot):
+    """Cancel the job running in the slot.
+
+    :return: the key of the cancelled job or None
+    """
+    job = store.get_slot(slot)
+    if job is None:
+        return None
+    pid, key = job
+    record = store.get(key) or {}
+    if record.get("state") in (PENDING, RUNNING) and \
+            record.get("pid") == pid and is_alive(pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+        store.update(key, state=CANCELLED, finished=time.time())
+        store.release_slot(slot, pid)
+        return key
+    store.release_slot(slot, pid)
+    return None
+
+
+def can_fork():
+    """Tell whether the jobs can run in the background."""
+    return hasattr(os, "fork") and hasattr(os, "setsid")
+
+
+def spawn(store, key, target, args=(), kwargs=None, slot="default",
+          **fields):
+    """Run ``target(*args, **kwargs)`` in a detached process.
+
+    The target returns the errors, stored in the record of the key. The
+    job still running in the same slot is cancelled first.
+
+    :param store: where to record the results
+    :type store: :class:`.StatusStore`
+    :param key: key of the record, e.g. the commit SHA
+    :param fields: extra fields of the record, e.g. the kind of check
+    :return: pid of the job, in the calling process
+    :rtype: int
+    """
+    cancel(store, slot)
+    store.set(key, state=PENDING, started=time.time(), slot=slot, **fields)
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid:
+        # the job tells its pid once recorded, the intermediate child exits
+        os.close(write_fd)
+        with os.fdopen(read_fd) as fh:
+            job_pid = fh.read()
+        os.waitpid(pid, 0)
+        if not job_pid:
+            store.update(key, state=FAILED, finished=time.time(),
+                         errors=["the background job could not start"])
+            return None
+        return int(job_pid)
+
+    os.close(read_fd)
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+    except OSError:
+        os._exit(1)
+
+    # the job, reparented to init
+    code = 0
+    try:
+        signal.signal(signal.SIGTERM, _terminate)
+        store.update(key, state=RUNNING, pid=os.getpid())
+        store.set_slot(slot, os.getpid(), key)
+        os.write(write_fd, str(os.getpid()).encode("ascii"))
+        os.close(write_fd)
+        _detach()
+
+        errors = list(target(*args, **(kwargs or {})))
+        store.update(key, states=(RUNNING, ), state=DONE, errors=errors,
+                     finished=time.time())
+    except SystemExit:
+        code = 1
+    except Exception as e:  # noqa, the job has to record any failure
+        code = 1
+        store.update(key, state=FAILED, finished=time.time(),
+                     errors=["{0}: {1}".format(type(e).__name__, e)])
+    finally:
+        store.release_slot(slot, os.getpid())
+        store.prune()
+        os._exit(code)
+
+
+def _detach():
+    """Detach the standard streams of the job from the terminal."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+
+
+def _terminate(signum, frame):
+    """Stop the job, its record is updated by the canceller."""
+    raise SystemExit(1)
+
+
+def wait(store, key, timeout=None, interval=0.05):
+    """Wait until the job of the key is over.
+
+    :return: the record
+    :rtype: dict
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        record = store.get(key)
+        if record is None or record.get("state") not in (PENDING, RUNNING):
+            return record
+        if record.get("pid") and not is_alive(record["pid"]):
+            return store.get(key)
+        if deadline is not None and time.time() > deadline:
+            return record
+        time.sleep(interval)
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Checks of the working tree while it is being edited.
+
+One process keeps the checkers imported and the options parsed, waits for
+the files to be modified and checks them again, see
+:func:`kwalitee.worktree.check_worktree`. Only the changes of the errors
+are printed.
+
+The changes are notified by inotify, using :mod:`inotify_simple` when it is
+installed (``pip install kwalitee[watch]``), and found by scanning the
+working tree otherwise.
+"""
+
+from __future__ import absolute_import
+
+import os
+import time
+
+from . import results
+from .options import CONFIGURATION_FILE, _stat_key, load_options
+from .worktree import check_worktree, list_files
+
+
+class PollingWatcher(object):
+    """Find the modified files by scanning the working tree."""
+
+    def __init__(self, root, interval=1.0):
+        """Take the first snapshot of the working tree.
+
+        :param root: root of the working tree
+        :param interval: seconds between two scans
+        """
+        self.root = root
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if ".git" in dirnames:
+                dirnames.remove(".git")
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                snapshot[os.path.relpath(path, self.root)] = _stat_key(path)
+        return snapshot
+
+    def wait(self, timeout=None):
+        """Wait for files to be modified.
+
+        :param timeout: seconds to wait at most, forever by default
+        :return: paths relative to the root, empty after the timeout
+        :rtype: set
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = set(path for path in set(snapshot) | set(self.snapshot)
+                          if snapshot.get(path) != self.snapshot.get(path))
+            self.snapshot = snapshot
+            if changed:
+                return changed
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, deadline - time.time())
+                if delay <= 0:
+                    return changed
+            time.sleep(delay)
+
+    def close(self):
+        """Stop watching."""
+
+
+class InotifyWatcher(object):
+    """Get the modified files from inotify."""
+
+    def __init__(self, root):
+        """Watch every directory of the working tree.
+
+        :param root: root of the working tree
+        """
+        from inotify_simple import INotify, flags
+        self.root = root
+        self.flags = flags
+        self.mask = (flags.CLOSE_WRITE | flags.CREATE | flags.DELETE |
+                     flags.MOVED_FROM | flags.MOVED_TO | flags.MODIFY)
+        self.inotify = INotify()
+        self.directories = {}
+        self._add_tree(root)
+
+    def _add_tree(self, top):
+        for dirpath, dirnames, _ in os.walk(top):
+            if ".git" in dirnames:
+                dirnames.remove(".git")
+            try:
+                wd = self.inotify.add_watch(dirpath, self.mask)
+            except OSError:
+                continue
+            self.directories[wd] = os.path.relpath(dirpath, self.root)
+
+    def wait(self, timeout=None):
+        """Wait for files to be modified.
+
+        :param timeout: seconds to wait at most, forever by default
+        :return: paths relative to the root, empty after the timeout, None
+            if events were lost
+        :rtype: set
+        """
+        flags = self.flags
+        changed = set()
+        events = self.inotify.read(
+            timeout=None if timeout is None else int(timeout * 1000))
+        for event in events:
+            if event.mask & flags.Q_OVERFLOW:
+                return None
+            if event.wd not in self.directories:
+                continue
+            path = os.path.normpath(os.path.join(
+                self.directories[event.wd], event.name))
+            if event.mask & flags.IGNORED:
+                del self.directories[event.wd]
+            elif event.mask & flags.ISDIR:
+                if event.mask & (flags.CREATE | flags.MOVED_TO):
+                    # the files created before the watch are missed
+                    self._add_tree(os.path.join(self.root, path))
+                    changed.update(_walk(self.root, path))
+            else:
+                changed.add(path)
+        return changed
+
+    def close(self):
+        """Stop watching."""
+        self.inotify.close()
+
+
+def _walk(root, directory):
+    """List the files of the directory, relative to the root."""
+    for dirpath, _, filenames in os.walk(os.path.join(root, directory)):
+        for filename in filenames:
+            yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+
+def get_watcher(root, polling=False, interval=1.0):
+    """Get the best watcher available.
+
+    :param root: root of the working tree
+    :param polling: scan the working tree even if inotify is available
+    :param interval: seconds between two scans
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(root)
+        except (ImportError, OSError):
+            pass
+    return PollingWatcher(root, interval=interval)
+
+
+def diff_errors(previous, current):
+    """Compare two runs.
+
+    :param previous: errors by file
+    :param current: errors by file
+    :return: ``(file, errors)`` of the files whose errors changed, sorted
+    :rtype: list
+    """
+    changes = []
+    for filename in sorted(set(previous) | set(current)):
+        old, new = previous.get(filename) or [], current.get(filename) or []
+        if old != new:
+            changes.append((filename, new))
+    return changes
+
+
+def watch(root, report, watcher=None, debounce=0.2, store=None,
+          iterations=None):
+    """Check the working tree each time it is modified.
+
+    :param root: root of the working tree
+    :param report: called with the changes of :func:`diff_errors`
+    :param watcher: :class:`InotifyWatcher` or :class:`PollingWatcher`
+    :param debounce: seconds without modifications before checking, so that
+        saving several files checks them at once
+    :param store: where to look the results of the modified files up
+    :type store: :class:`kwalitee.results.ResultStore`
+    :param iterations: number of changes to wait for, forever by default
+    """
+    watcher = watcher or get_watcher(root)
+    store = store or results.get_store(root)
+    options = load_options(root)
+    errors = check_worktree(root, options, store=store)
+    report(diff_errors({}, errors))
+
+    try:
+        while iterations is None or iterations > 0:
+            changed = watcher.wait()
+            while changed is not None:
+                more = watcher.wait(timeout=debounce)
+                if more is None:
+                    # events were lost, the whole tree is checked again
+                    changed = None
+                elif not more:
+                    break
+                else:
+                    changed.update(more)
+            if changed == set():
+                continue
+
+            # the options are reloaded when .kwalitee.yml is modified
+            previous_options, options = options, load_options(root)
+            if changed is None or CONFIGURATION_FILE in changed or \
+                    options != previous_options:
+                current = check_worktree(root, options, store=store)
+            else:
+                files = set(list_files(root))
+                current = dict((filename, file_errors)
+                               for filename, file_errors in errors.items()
+                               if filename in files)
+                current.update(check_worktree(
+                    root, options, filenames=sorted(changed & files),
+                    store=store))
+            report(diff_errors(errors, current))
+            errors = current
+            if iterations is not None:
+                iterations -= 1
+    finally:
+        watcher.close()
+    return errors
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Webhook service checking the pull requests and the pushes.
+
+Github posts the events to ``/payload``. The event is answered at once with
+``202 Accepted`` and the id of the job, the job is queued and run by one of
+the :data:`~kwalitee.config.WORKER_JOBS` consumers. The fetching and the
+publishing are I/O bound and run in threads, while the checks are CPU bound
+and run in a pool of :data:`~kwalitee.config.WORKER_PROCESSES` processes, so
+that a large pull request does not stop the events from being received.
+
+The jobs are keyed by pull request or by branch. A job superseded by a newer
+push is dropped if it is still queued and cancelled if it is running, so that
+only the latest head is reported and the workers are not spent on obsolete
+commits, see :func:`kwalitee.worker.coalesce`.
+
+The jobs wait in one queue per repository, served by fair share, and their
+checks run as batches of files that go through a fair scheduler in front of
+the pool of processes, see :mod:`kwalitee.scheduler`.
+
+With :data:`~kwalitee.config.WORKER_QUEUE`, the jobs are put into a
+:mod:`durable queue <kwalitee.jobqueue>` instead, and run by the worker
+processes (``python -m kwalitee.worker run``) on this node or others.
+
+``GET /`` returns the size of the queue, the queue depth and the wait times
+of each repository, and the last reports.
+
+The service requires Python 3.5 or later.
+"""
+
+import asyncio
+import collections
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .scheduler import FairQueue, FairScheduler
+from .version import __version__
+from .worker import coalesce, get_github, get_job, get_queue, load_config, \
+    run_job
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 25 * 1024 * 1024
+"""Largest payload accepted, Github sends at most 25MB."""
+
+_reasons = {200: "OK", 202: "Accepted", 400: "Bad Request",
+            403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large"}
+
+
+def verify_signature(secret, body, signature):
+    """Verify the ``X-Hub-Signature`` header of a payload.
+
+    :param secret: :data:`~kwalitee.config.WEBHOOK_SECRET`
+    :param body: raw body
+    :param signature: value of the header, e.g. ``sha1=...``
+    """
+    if not signature:
+        return False
+    digest = hmac.new(secret.encode("utf-8"), body, hashlib.sha1).hexdigest()
+    return hmac.compare_digest("sha1=" + digest, signature)
+
+
+class Service(object):
+    """Receive the events and run their jobs."""
+
+    def __init__(self, config=None, github=None):
+        """Initialize the service.
+
+        :param config: configuration, see
+            :func:`kwalitee.worker.load_config`
+        :param github: client of the API
+        :type github: :class:`kwalitee.github.Github`
+        """
+        self.config = config or load_config()
+        self.github = github or get_github(self.config)
+        self.jobs = self.config.get("WORKER_JOBS") or 4
+        processes = self.config.get("WORKER_PROCESSES") or os.cpu_count()
+        self.processes = ProcessPoolExecutor(max_workers=processes)
+        weights = self.config.get("WORKER_WEIGHTS")
+        self.scheduler = FairScheduler(self.processes, processes, weights)
+        self.pending = FairQueue(weights)
+        self.available = None
+        self.threads = ThreadPoolExecutor(max_workers=self.jobs)
+        self.reports = collections.deque(maxlen=100)
+        self.running = 0
+        self.queued = {}
+        self.active = {}
+        self.superseded = 0
+        self.cancelled = 0
+        self.store = None
+        self.database = None
+        self.server = None
+        self.consumers = []
+
+    async def start(self, host="127.0.0.1", port=8000):
+        """Listen and start the consumers.
+
+        :return: the address the service listens to
+        :rtype: tuple
+        """
+        if self.config.get("WORKER_QUEUE"):
+            # the workers run the jobs, the database is used by one thread
+            # so that waiting for its lock does not block the loop
+            self.database = ThreadPoolExecutor(max_workers=1)
+            self.store = await self._database(get_queue, self.config)
+        else:
+            self.available = asyncio.Semaphore(0)
+            self.consumers = [asyncio.ensure_future(self.consume())
+                              for _ in range(self.jobs)]
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """Stop listening, wait for the running jobs to finish."""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for consumer in self.consumers:
+            consumer.cancel()
+        await asyncio.gather(*self.consumers, return_exceptions=True)
+        self.threads.shutdown()
+        self.processes.shutdown()
+        self.github.close()
+        if self.store is not None:
+            await self._database(self.store.close)
+            self.database.shutdown()
+
+    def _database(self, function, *args, **kwargs):
+        """Call the durable queue in its thread."""
+        return asyncio.get_event_loop().run_in_executor(
+            self.database, functools.partial(function, *args, **kwargs))
+
+    async def handle(self, reader, writer):
+        """Answer an HTTP request."""
+        try:
+            status, body = await asyncio.wait_for(self._dispatch(reader), 30)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError,
+                AttributeError, KeyError, TypeError, ValueError) as e:
+            status, body = 400, {"message": str(e) or type(e).__name__}
+        content = json.dumps(body).encode("utf-8")
+        writer.write("HTTP/1.1 {0} {1}\r\n"
+                     "Content-Type: application/json\r\n"
+                     "Content-Length: {2}\r\n"
+                     "Connection: close\r\n\r\n".format(
+                         status, _reasons.get(status, ""),
+                         len(content)).encode("latin-1") + content)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _dispatch(self, reader):
+        method, path, _ = (await reader.readline()).decode(
+            "latin-1").split(None, 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            return 413, {"message": "payload too large"}
+        body = await reader.readexactly(length) if length else b""
+
+        path = path.split("?", 1)[0]
+        if path == "/":
+            if method != "GET":
+                return 405, {"message": "method not allowed"}
+            if self.store is not None:
+                return 200, await self._database(self.stats)
+            return 200, self.stats()
+        if path == "/payload":
+            if method != "POST":
+                return 405, {"message": "method not allowed"}
+            return await self.receive(headers, body)
+        return 404, {"message": "not found"}
+
+    async def receive(self, headers, body):
+        """Queue the job of an event.
+
+        :return: HTTP status and body of the answer
+        :rtype: tuple
+        """
+        secret = self.config.get("WEBHOOK_SECRET")
+        if secret and not verify_signature(secret, body,
+                                           headers.get("x-hub-signature")):
+            return 403, {"message": "bad signature"}
+        event = headers.get("x-github-event")
+        if event == "ping":
+            return 200, {"message": "pong"}
+        payload = json.loads(body.decode("utf-8"))
+        if not isinstance(payload, dict):
+            return 400, {"message": "the payload is not an object"}
+        job = get_job(event, payload)
+        if job is None:
+            return 200, {"message": "nothing to check"}
+
+        key = job["key"]
+        if self.store is not None:
+            job = await self._database(self.store.put, job, key=key,
+                                       tenant=job["repository"],
+                                       merge=coalesce)
+            return 202, {"id": job["id"], "key": key}
+
+        if key in self.queued:
+            # left in the queue, skipped once dequeued
+            job = coalesce(self.queued[key], job)
+            self.superseded += 1
+        if key in self.active:
+            running, cancelled = self.active[key]
+            if not cancelled.is_set():
+                job = coalesce(running, job)
+                cancelled.set()
+                self.cancelled += 1
+        self.queued[key] = job
+        self.pending.put(job["repository"], job)
+        self.available.release()
+        return 202, {"id": job["id"], "key": key}
+
+    async def consume(self):
+        """Run the queued jobs, one at a time."""
+        loop = asyncio.get_event_loop()
+        while True:
+            await self.available.acquire()
+            _, job = self.pending.get()
+            key = job["key"]
+            if self.queued.get(key) is not job:
+                self.reports.append({"id": job["id"], "key": key,
+                                     "sha": job["sha"],
+                                     "state": "superseded"})
+                continue
+            del self.queued[key]
+            cancelled = threading.Event()
+            self.active[key] = (job, cancelled)
+            self.running += 1
+            try:
+                report = await loop.run_in_executor(
+                    self.threads, run_job, job, self.github, self.config,
+                    self.scheduler.tenant(job["repository"]),
+                    self.config.get("WORKER_TIMEOUT"), cancelled)
+            except Exception as e:  # noqa, the consumer has to keep running
+                logger.exception("job %s failed", job["id"])
+                report = {"id": job["id"], "key": key, "sha": job["sha"],
+                          "state": "failed", "message": str(e)}
+            finally:
+                self.running -= 1
+                if self.active.get(key, (None, ))[0] is job:
+                    del self.active[key]
+            self.reports.append(report)
+
+    def stats(self):
+        """Get the state of the service."""
+        if self.store is not None:
+            return dict(self.store.stats(), service="kwalitee",
+                        version=__version__)
+        jobs, tasks = self.pending.stats(), self.scheduler.stats()
+        tenants = dict((tenant, {"jobs": jobs.get(tenant),
+                                 "tasks": tasks.get(tenant)})
+                       for tenant in set(jobs) | set(tasks))
+        return {"service": "kwalitee", "version": __version__,
+                "queued": len(self.queued), "running": self.running,
+                "superseded": self.superseded, "cancelled": self.cancelled,
+                "tenants": tenants, "reports": list(self.reports)}
+
+
+def serve(host="127.0.0.1", port=8000, config=None):
+    """Run the service until it is interrupted.
+
+    :param config: configuration, see :func:`kwalitee.worker.load_config`
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    service = Service(config)
+    address = loop.run_until_complete(service.start(host, port))
+    logger.info("listening on %s:%s", *address)
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(service.close())
+        loop.close()
@@ -0,0 +1,613 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Check jobs of the webhook service.
+
+A job is made from a ``pull_request`` or a ``push`` event by
+:func:`get_job`. It is a plain dict, so that it can be queued anywhere.
+:func:`run_job` fetches the commits and the files of the job from the API,
+checks them and publishes the results with a
+:class:`~kwalitee.publisher.Publisher`: the comments of the lines with
+errors, a status with the :data:`kwalitee.config.CONTEXT` context and, for
+the pull requests, a label.
+
+The checks are CPU bound, they are submitted to an executor, e.g. a
+:class:`concurrent.futures.ProcessPoolExecutor`.
+
+With :data:`kwalitee.config.MIRROR_CACHE`, the files are read from a bare
+mirror of the repository, see :mod:`kwalitee.mirror`, and each job fetches
+only the objects pushed since the previous one.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import os
+import re
+import runpy
+import shutil
+import socket
+import threading
+import time
+import traceback
+import uuid
+from tempfile import mkdtemp
+
+from . import config as default_config
+from .options import CONFIGURATION_FILE, SUPPORTED_FILES, Options, \
+    get_options, load_yaml
+from .publisher import Publisher, file_comments
+
+logger = logging.getLogger(__name__)
+
+_re_hunk = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)")
+_re_wip = re.compile(r"\bwip\b", re.IGNORECASE)
+_re_template = re.compile(r"\{(/?)(\w+)\}")
+
+
+def get_config(config=None):
+    """Get the configuration of the service.
+
+    :param config: values overriding :mod:`kwalitee.config`
+    :rtype: dict
+    """
+    values = dict((key, getattr(default_config, key))
+                  for key in dir(default_config) if key.isupper())
+    values.update(config or {})
+    return values
+
+
+def load_config(filename=None):
+    """Load the configuration of the service.
+
+    :param filename: python file overriding :mod:`kwalitee.config`, the
+        ``KWALITEE_CONFIG`` environment variable by default
+    :rtype: dict
+    """
+    filename = filename or os.environ.get("KWALITEE_CONFIG")
+    overrides = {}
+    if filename:
+        overrides = dict((key, value)
+                         for key, value in runpy.run_path(filename).items()
+                         if key.isupper())
+    return get_config(overrides)
+
+
+def expand(template, **values):
+    """Expand an URL template of the API, e.g. ``.../commits{/sha}``."""
+    def _replace(match):
+        value = values.get(match.group(2))
+        if value is None:
+            return ""
+        return match.group(1) + str(value)
+    return _re_template.sub(_replace, template)
+
+
+def get_job(event, payload):
+    """Make the job of a webhook event.
+
+    :param event: value of the ``X-Github-Event`` header
+    :param payload: decoded body of the event
+    :return: the job or None if there is nothing to check
+    :rtype: dict
+    """
+    repository = payload.get("repository") or {}
+    job = {"id": uuid.uuid4().hex,
+           "event": event,
+           "repository": repository.get("full_name"),
+           "repository_url": repository.get("url"),
+           "clone_url": repository.get("clone_url"),
+           "created": time.time()}
+
+    if event == "pull_request":
+        if payload.get("action") not in ("opened", "synchronize",
+                                         "reopened", "edited"):
+            return None
+        pull_request = payload["pull_request"]
+        job.update({
+            "key": "{0}#{1}".format(job["repository"],
+                                    pull_request["number"]),
+            "sha": pull_request["head"]["sha"],
+            "title": pull_request.get("title", ""),
+            "url": pull_request["url"],
+            "html_url": pull_request.get("html_url"),
+            "commits_url": pull_request["commits_url"],
+            "statuses_url": pull_request["statuses_url"],
+            "issue_url": pull_request["issue_url"],
+        })
+        return job
+
+    if event == "push":
+        if payload.get("deleted") or not payload.get("commits"):
+            return None
+        job.update({
+            "key": "{0}:{1}".format(job["repository"], payload["ref"]),
+            "sha": payload["after"],
+            "forced": bool(payload.get("forced")),
+            "commits_url": repository["commits_url"],
+            "statuses_url": repository["statuses_url"],
+            "commits": [{"sha": commit["id"],
+                         "message": commit["message"],
+                         "author": u"{0[name]} <{0[email]}>".format(
+                             commit["author"])}
+                        for commit in payload["commits"]],
+        })
+        return job
+
+    return None
+
+
+def check_commit(message, author, authors_files, options):
+    """Check the message and the author of a commit.
+
+    :param authors_files: content of the files listing the authors, by name
+    :return: errors of the message and of the author
+    :rtype: tuple
+    """
+    from .kwalitee import _author_errors, _message_errors
+    message_errors = _message_errors(message, **options)
+    author_errors = []
+    if options.get("authors"):
+        tmpdir = mkdtemp()
+        try:
+            for name, content in authors_files.items():
+                if content is not None:
+                    with open(os.path.join(tmpdir, name), "wb") as fh:
+                        fh.write(content)
+            author_errors = _author_errors(author, path=tmpdir, **options)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+    return message_errors, author_errors
+
+
+def check_batch(files, options):
+    """Check the content of a batch of files.
+
+    :param files: ``(filename, content)`` of the files
+    :return: errors of each file, None if the file is excluded
+    :rtype: list
+    """
+    from .kwalitee import _file_errors
+    tmpdir = mkdtemp()
+    try:
+        errors = []
+        for filename, content in files:
+            path = os.path.join(tmpdir, filename)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as fh:
+                fh.write(content)
+            errors.append(_file_errors(path, root=tmpdir, **options))
+        return errors
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def diff_positions(patch):
+    """Map the line numbers of the new file to their position in the diff.
+
+    The comments of the API are attached to a position in the diff.
+
+    :param patch: unified diff of the file, without its header
+    :rtype: dict
+    """
+    positions = {}
+    position = 0
+    line = None
+    for text in (patch or "").splitlines():
+        match = _re_hunk.match(text)
+        if match:
+            # the next hunk headers count as lines of the diff
+            if line is not None:
+                position += 1
+            line = int(match.group(1))
+            continue
+        if line is None:
+            continue
+        position += 1
+        if not text.startswith("-"):
+            positions[line] = position
+            line += 1
+    return positions
+
+
+class Deadline(object):
+    """Time left to a job, see :data:`kwalitee.config.WORKER_TIMEOUT`."""
+
+    def __init__(self, timeout=None, cancelled=None):
+        """Start counting.
+
+        :param timeout: seconds, unlimited by default
+        :param cancelled: event set when the job is superseded
+        :type cancelled: :class:`threading.Event`
+        """
+        self.timeout = timeout
+        self.end = None if timeout is None else time.time() + timeout
+        self.cancelled = cancelled
+
+    def left(self):
+        """Get the seconds left, None if unlimited."""
+        if self.end is None:
+            return None
+        return max(self.end - time.time(), 0)
+
+    def check(self):
+        """Stop the job if it is cancelled or out of time."""
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise JobCancelled()
+        if self.left() == 0:
+            raise JobTimeout()
+
+
+class JobTimeout(Exception):
+    """The job took more than :data:`kwalitee.config.WORKER_TIMEOUT`."""
+
+
+class JobCancelled(Exception):
+    """A newer job of the same pull request or branch superseded the job."""
+
+
+_POLL = 0.1
+"""Seconds between two checks of the cancellation of a job."""
+
+
+def _gather(executor, calls, deadline):
+    """Run the calls, using the executor if any."""
+    if executor is None:
+        results = []
+        for call in calls:
+            deadline.check()
+            results.append(call[0](*call[1:]))
+        return results
+
+    futures = [executor.submit(*call) for call in calls]
+    try:
+        results = []
+        for future in futures:
+            while True:
+                deadline.check()
+                left = deadline.left()
+                try:
+                    results.append(future.result(
+                        timeout=_POLL if left is None else min(_POLL, left)))
+                    break
+                except Exception as e:  # noqa
+                    # the TimeoutError class differs by executor
+                    if type(e).__name__ != "TimeoutError":
+                        raise
+        return results
+    except BaseException:  # noqa
+        # the checks already running in the pool cannot be interrupted
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def coalesce(previous, job):
+    """Merge a job superseded before it has been reported into the new one.
+
+    The commits of a push that are not reported yet are kept, unless the
+    branch has been forced over them.
+
+    :param previous: the superseded job
+    :param job: the new job of the same pull request or branch
+    :return: the job to run
+    :rtype: dict
+    """
+    if job["event"] != "push" or previous["event"] != "push" or \
+            job.get("forced"):
+        return job
+    shas = set(commit["sha"] for commit in job["commits"])
+    job = dict(job)
+    job["commits"] = [commit for commit in previous["commits"]
+                      if commit["sha"] not in shas] + job["commits"]
+    return job
+
+
+def _get_options(job, github, config):
+    """Get the options merged with the configuration of the repository."""
+    options = Options(get_options(config))
+    content = github.get_content(job["repository"], CONFIGURATION_FILE,
+                                 job["sha"])
+    if content:
+        options = options.merge(load_yaml(content) or {})
+    return options
+
+
+def _get_commits(job, github):
+    """List the ``(sha, message, author, files)`` of the commits."""
+    if job["event"] == "push":
+        commits = []
+        for commit in job["commits"]:
+            detail = github.get(expand(job["commits_url"], sha=commit["sha"]))
+            commits.append((commit["sha"], commit["message"],
+                            commit["author"], detail.get("files") or []))
+        return commits
+
+    return [(commit["sha"], commit["commit"]["message"],
+             u"{0[name]} <{0[email]}>".format(commit["commit"]["author"]),
+             None)
+            for commit in github.get_all(job["commits_url"])]
+
+
+def _get_reader(job, github, config):
+    """Get the function reading the files of a commit.
+
+    The files are read from the :data:`~kwalitee.config.MIRROR_CACHE` when
+    it is set, fetching only the new objects, from the API otherwise.
+    """
+    directory = config.get("MIRROR_CACHE")
+    if not directory or not job.get("clone_url"):
+        def _read(sha, files):
+            return [github.get_raw(f["raw_url"]) for f in files]
+        return _read
+
+    from .mirror import MirrorCache
+    cache = MirrorCache(directory, budget=config.get("MIRROR_BUDGET"))
+    cache.ensure(job["clone_url"], job["sha"])
+
+    def _read(sha, files):
+        filenames = [f["filename"] for f in files]
+        with cache.use(job["clone_url"]):
+            contents = cache.read_blobs(job["clone_url"], sha, filenames)
+        return [contents[filename] for filename in filenames]
+    return _read
+
+
+def _check_files(files, sha, read, options, executor, deadline,
+                 batch_size=20):
+    """Check the files of a commit or of a pull request.
+
+    The files are checked by batches, so that the batches of the other jobs
+    can run in between.
+
+    :param read: function reading the files, see :func:`_get_reader`
+    :param batch_size: files per task of the executor
+    :return: errors and diff positions by file
+    :rtype: dict
+    """
+    from .kwalitee import filter_files
+    files = dict((f["filename"], f) for f in files
+                 if f.get("status") != "removed" and
+                 f["filename"].endswith(SUPPORTED_FILES))
+    checked, _, _ = filter_files(list(files), root=os.sep, **options)
+    contents = read(sha, [files[filename] for filename in checked])
+    items = list(zip(checked, contents))
+    batches = _gather(executor, [
+        (check_batch, items[start:start + batch_size], options)
+        for start in range(0, len(items), batch_size)], deadline)
+    errors = [file_errors for batch in batches for file_errors in batch]
+    return dict((filename, (file_errors or [],
+                            diff_positions(files[filename].get("patch"))))
+                for filename, file_errors in zip(checked, errors))
+
+
+def run_job(job, github, config=None, executor=None, timeout=None,
+            cancelled=None):
+    """Check the job and publish the results.
+
+    A cancelled job stops at the next step and publishes nothing more, the
+    job superseding it reports on the new head.
+
+    :param job: job made by :func:`get_job`
+    :param github: client of the API
+    :type github: :class:`kwalitee.github.Github`
+    :param config: configuration of the service, see :func:`get_config`
+    :param executor: where the checks run, e.g. a process pool
+    :param timeout: seconds after which the job is abandoned
+    :param cancelled: event set when the job is superseded
+    :type cancelled: :class:`threading.Event`
+    :return: summary of the job
+    :rtype: dict
+    """
+    config = get_config(config)
+    publisher = Publisher(github, config)
+    batch_size = config.get("WORKER_BATCH_SIZE") or 20
+    deadline = Deadline(timeout, cancelled=cancelled)
+    report = {"id": job["id"], "key": job.get("key"), "sha": job["sha"],
+              "errors": 0}
+
+    def _status(sha, state, description):
+        return publisher.status(expand(job["statuses_url"], sha=sha), state,
+                                description, job.get("html_url"))
+
+    publisher.post([_status(job["sha"], "pending", "Checking...")])
+    try:
+        options = _get_options(job, github, config)
+        read = _get_reader(job, github, config)
+        commits = _get_commits(job, github)
+        authors_files = {}
+        if options.get("authors"):
+            authors_files = dict(
+                (name, github.get_content(job["repository"], name,
+                                          job["sha"]))
+                for name in options["authors"])
+        commit_errors = _gather(executor, [
+            (check_commit, message, author, authors_files, options)
+            for _, message, author, _ in commits], deadline)
+
+        needs_review = False
+        comments = []
+        counts = {}
+        for (sha, _, _, files), (message_errors, author_errors) in zip(
+                commits, commit_errors):
+            comments_url = "{0}/commits/{1}/comments".format(
+                job["repository_url"], sha)
+            errors = [str(error) for error in message_errors + author_errors]
+            if errors:
+                comments.append((comments_url, {"body": "\n".join(errors)}))
+            needs_review = needs_review or any(
+                error.code == "M100" for error in message_errors)
+            counts[sha] = len(errors)
+            if files is not None:
+                requests, count = file_comments(
+                    comments_url, sha, _check_files(
+                        files, sha, read, options, executor, deadline,
+                        batch_size))
+                comments.extend(requests)
+                counts[sha] += count
+
+        if job["event"] == "pull_request":
+            # the files are checked once, as they are in the last commit
+            files = github.get_all(job["url"] + "/files")
+            requests, count = file_comments(
+                "{0}/commits/{1}/comments".format(job["repository_url"],
+                                                  job["sha"]),
+                job["sha"], _check_files(files, job["sha"], read, options,
+                                         executor, deadline, batch_size),
+                reviews_url=job["url"] + "/reviews")
+            comments.extend(requests)
+            counts = {job["sha"]: sum(counts.values()) + count}
+
+        # nothing is published once superseded
+        deadline.check()
+
+        # the statuses are set once the comments they count are visible
+        publisher.post(comments)
+        publisher.post([
+            _status(sha, "error" if count else "success",
+                    "{0} errors".format(count) if count else
+                    "Everything is OK.")
+            for sha, count in counts.items()])
+    except JobTimeout:
+        publisher.post([_status(job["sha"], "error",
+                                "Timed out after {0}s.".format(timeout))])
+        report["state"] = "timeout"
+        return report
+    except JobCancelled:
+        report["state"] = "cancelled"
+        return report
+    except Exception:  # noqa, raised again once the status is set
+        # the pending status would never be replaced otherwise
+        try:
+            publisher.post([_status(job["sha"], "error", "Check failed.")])
+        except Exception:  # noqa, the first error is the one raised
+            logger.exception("job %s: the status could not be set",
+                             job["id"])
+        raise
+    report["errors"] = sum(counts.values())
+    report["state"] = "error" if report["errors"] else "success"
+
+    if job["event"] == "pull_request":
+        if config.get("CHECK_WIP") and _re_wip.search(job.get("title", "")):
+            label = config.get("LABEL_WIP")
+        elif needs_review:
+            label = config.get("LABEL_REVIEW")
+        elif not report["errors"]:
+            label = config.get("LABEL_READY")
+        else:
+            label = None
+        publisher.label(job["issue_url"], label)
+        report["label"] = label
+    return report
+
+
+def get_github(config):
+    """Get the client of the API of the configuration.
+
+    :rtype: :class:`kwalitee.github.Github`
+    """
+    from .github import Github
+    return Github(config.get("GITHUB_API") or "https://api.github.com/",
+                  token=config.get("ACCESS_TOKEN"),
+                  connections=config.get("GITHUB_CONNECTIONS") or 4)
+
+
+def get_queue(config):
+    """Open the queue of :data:`kwalitee.config.WORKER_QUEUE`.
+
+    :rtype: :class:`kwalitee.jobqueue.JobQueue`
+    """
+    from .jobqueue import JobQueue
+    return JobQueue(config["WORKER_QUEUE"],
+                    lease=config.get("WORKER_LEASE") or 60,
+                    max_attempts=config.get("WORKER_ATTEMPTS") or 3)
+
+
+def _heartbeat(queue, job_id, worker, cancelled, done):
+    """Renew the lease until the job is done, cancel it if lost."""
+    from .jobqueue import JobQueue
+    # the connections cannot be shared between threads
+    queue = JobQueue(queue.path, lease=queue.lease_time)
+    try:
+        while not done.wait(queue.lease_time / 3.0):
+            if not queue.heartbeat(job_id, worker):
+                cancelled.set()
+                return
+    finally:
+        queue.close()
+
+
+def work(queue, github, config=None, worker=None, executor=None,
+         burst=False, poll=1.0, stop=None):
+    """Run the jobs of the queue.
+
+    :param queue: queue of the jobs
+    :type queue: :class:`kwalitee.jobqueue.JobQueue`
+    :param github: client of the API
+    :type github: :class:`kwalitee.github.Github`
+    :param config: configuration of the service, see :func:`get_config`
+    :param worker: name of the worker, ``host:pid`` by default
+    :param executor: where the checks run, in the process by default
+    :param burst: return once the queue is empty
+    :param poll: seconds between two looks at an empty queue
+    :param stop: event stopping the worker after the current job
+    :type stop: :class:`threading.Event`
+    :return: the number of jobs run
+    :rtype: int
+    """
+    config = get_config(config)
+    worker = worker or "{0}:{1}".format(socket.gethostname(), os.getpid())
+    count = 0
+    while stop is None or not stop.is_set():
+        leased = queue.lease(worker)
+        if leased is None:
+            if burst:
+                break
+            time.sleep(poll)
+            continue
+
+        job, _ = leased
+        cancelled = threading.Event()
+        done = threading.Event()
+        heartbeat = threading.Thread(target=_heartbeat, args=(
+            queue, job["id"], worker, cancelled, done))
+        heartbeat.daemon = True
+        heartbeat.start()
+        try:
+            report = run_job(job, github, config, executor,
+                             config.get("WORKER_TIMEOUT"), cancelled)
+        except Exception:  # noqa, the job is retried or buried
+            queue.fail(job["id"], worker, traceback.format_exc())
+        else:
+            queue.complete(job["id"], worker, report)
+        finally:
+            done.set()
+            heartbeat.join()
+        count += 1
+    return count
+
+
+if __name__ == "__main__":  # pragma: no cover
+    from .cli.worker import worker
+    worker(prog_name="python -m kwalitee.worker")
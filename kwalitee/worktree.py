@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Checks of the files of the working tree.
+
+The files are checked in place. Like the git index, a stat cache remembers
+the modification time, the size and the inode of each checked file along
+with its errors, and only the files whose stat changed since the last run
+are read again. Their content is then looked up in the
+:mod:`shared results <kwalitee.results>` before being checked.
+
+A file modified in the same instant as the cache was written cannot be told
+apart from its cached version by its stat, it is read again on the next run
+(the *racy git* problem).
+"""
+
+from __future__ import absolute_import
+
+import os
+from subprocess import PIPE, Popen
+
+from . import profiler, results, state
+from .options import _stat_key
+
+CACHE_FILE = "worktree.pickle"
+"""Stat cache within the state directory."""
+
+
+def _git(args, directory):
+    """Run git in the directory and return its output."""
+    with profiler.measure("git " + args[0]):
+        p = Popen(["git"] + args, stdout=PIPE, stderr=PIPE, cwd=directory)
+        stdout, _ = p.communicate()
+    if p.returncode != 0:
+        return None
+    return stdout
+
+
+def get_root(directory="."):
+    """Get the root of the working tree.
+
+    :param directory: directory within the working tree
+    :return: absolute path or None outside of a working tree
+    :rtype: str
+    """
+    stdout = _git(["rev-parse", "--show-toplevel"], directory)
+    if not stdout:
+        return None
+    return stdout.decode("utf-8").strip()
+
+
+def list_files(root):
+    """List the tracked and the untracked files that are not ignored.
+
+    :param root: root of the working tree
+    :return: paths relative to the root
+    :rtype: list
+    """
+    stdout = _git(["ls-files", "-z", "--cached", "--others",
+                   "--exclude-standard"], root)
+    if not stdout:
+        return []
+    # the unmerged files appear once per stage
+    return sorted(set(path.decode("utf-8")
+                      for path in stdout.split(b"\0") if path))
+
+
+def check_worktree(root, options, filenames=None, store=None):
+    """Check the files of the working tree, using the stat cache.
+
+    :param root: root of the working tree
+    :param options: options of :func:`kwalitee.kwalitee.check_file`
+    :param filenames: paths relative to the root, :func:`list_files` by
+        default
+    :param store: where to look the results of the modified files up
+    :type store: :class:`kwalitee.results.ResultStore`
+    :return: errors by file, None for the excluded files
+    :rtype: dict
+    """
+    from .kwalitee import check_file, filter_files
+    # the cache keeps the other files when only some of them are checked
+    partial = filenames is not None
+    if filenames is None:
+        filenames = list_files(root)
+    policy = results.fingerprint(options)
+
+    cache_file = None
+    state_directory = state.get_state_directory(root, create=True)
+    if state_directory:
+        cache_file = os.path.join(state_directory, CACHE_FILE)
+    cache = (state.load(cache_file, policy) if cache_file else None) or {}
+    written = _stat_key(cache_file) if cache_file else None
+    written = written[0] if written else None
+
+    checked, excluded, unchecked = filter_files(filenames, root=root,
+                                                **options)
+    errors = dict((filename, None) for filename in excluded)
+    errors.update((filename, []) for filename in unchecked)
+
+    entries = dict(cache) if partial else {}
+    changed = False
+    for filename in checked:
+        path = os.path.join(root, filename)
+        key = _stat_key(path)
+        if key is None:
+            # tracked but deleted
+            changed = changed or filename in cache
+            entries.pop(filename, None)
+            continue
+
+        entry = cache.get(filename)
+        if entry is not None and entry[0] == key and written is not None \
+                and key[0] < written:
+            file_errors = entry[1]
+        else:
+            changed = True
+            if store is not None:
+                with open(path, "rb") as fh:
+                    file_key = results.file_key(
+                        filename, results.blob_id(fh.read()), policy)
+                file_errors = store.cached(file_key, check_file, path,
+                                           root=root, **options)
+            else:
+                file_errors = check_file(path, root=root, **options)
+        entries[filename] = (key, file_errors)
+        errors[filename] = file_errors
+
+    if cache_file and (changed or set(entries) != set(cache)):
+        state.dump(cache_file, policy, entries)
+    return errors
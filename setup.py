@@ -53,6 +53,9 @@ extras_require = {
         'GitPython>=0.3.2.RC1',
     ],
     'tests': tests_require,
+    'watch': [
+        'inotify_simple>=1.1.7',
+    ],
 }
 
 extras_require['all'] = []
@@ -107,6 +110,7 @@ setup(
             'kwalitee-prepare-commit-msg = kwalitee.hooks'
             ':prepare_commit_msg_hook',
             'kwalitee-post-commit = kwalitee.hooks:post_commit_hook',
+            'kwalitee-pre-receive = kwalitee.hooks:pre_receive_hook',
         ],
     },
     extras_require=extras_require,
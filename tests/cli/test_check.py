@@ -21,12 +21,15 @@
 # granted to it by virtue of its status as an Intergovernmental Organization
 # or submit itself to any jurisdiction.
 
+import os
+import subprocess
 import sys
 
 import pytest
 import yaml
 from click.testing import CliRunner
-from hamcrest import assert_that, equal_to, has_item, has_items
+from hamcrest import assert_that, contains_string, equal_to, has_item, \
+    has_items, has_length, is_not
 
 from kwalitee.cli.check import check
 
@@ -92,3 +95,107 @@ def test_check_branch_utf8(capsys, git):
     result = runner.invoke(check, ['-r', git, 'message', 'master..utf8'])
     assert_that(result.exit_code, equal_to(0))
     assert_that(result.output.split("\n"), has_item("Everything is OK."))
+
+
+def test_check_worktree(git):
+    """The files of the working tree are checked in place."""
+    with open(os.path.join(git, '.kwalitee.yml'), 'w') as f:
+        yaml.dump({'colors': False, 'license': False, 'pydocstyle': False},
+                  stream=f)
+    with open(os.path.join(git, 'a.py'), 'w') as f:
+        f.write('import os\n')
+
+    runner = CliRunner()
+    result = runner.invoke(check, ['-r', git, 'worktree'])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output, contains_string("F401"))
+
+    result = runner.invoke(check, ['-r', git, 'worktree', '--blame'])
+    assert_that(result.output.split("\n"), has_item(
+        "0000000 1:1: F401 'os' imported but unused"))
+
+    with open(os.path.join(git, 'a.py'), 'w') as f:
+        f.write('import os\n\nos.getcwd()\n')
+    result = runner.invoke(check, ['-r', git, 'worktree', '--verbose'])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that(result.output.split("\n"),
+                has_items("a.py", "Everything is OK."))
+
+
+def test_check_all(git):
+    """The messages, the authors and the files are reported together."""
+    with open(os.path.join(git, '.kwalitee.yml'), 'w') as f:
+        yaml.dump({'colors': False, 'license': False, 'pydocstyle': False,
+                   'authors': ['AUTHORS.rst'], 'trusted': ['a@b.org'],
+                   'signatures': ['By'], 'components': ['global']},
+                  stream=f)
+    with open(os.path.join(git, 'a.py'), 'w') as f:
+        f.write('A=1\n')
+    for command in (('git', 'checkout', '-q', 'testbranch'),
+                    ('git', 'add', 'a.py'),
+                    ('git', 'commit', '-q', '-m', 'Fixed stuff')):
+        subprocess.check_call(command, cwd=git)
+
+    runner = CliRunner()
+    result = runner.invoke(check, ['-r', git, 'all', 'master..testbranch'])
+    assert_that(result.exit_code, equal_to(1))
+    lines = result.output.split("\n")
+    assert_that(lines, has_items(
+        "1: M110 missing component name",
+        "a.py: 1:2: E225 missing whitespace around operator"))
+    assert_that([line for line in lines if line.startswith("commit ")],
+                has_length(2))
+    assert_that([line for line in lines if "A101" in line], has_length(2))
+
+    result = runner.invoke(check, ['-r', git, 'all', '-s', '-j', '2',
+                                   'master..testbranch~1'])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output, contains_string(
+        "A101: AUTHORS file AUTHORS.rst does not exist"))
+
+
+def test_check_files_final_state(git):
+    """Only the last version of the files changed by the range is checked."""
+    with open(os.path.join(git, '.kwalitee.yml'), 'w') as f:
+        yaml.dump({'colors': False, 'license': False, 'pydocstyle': False},
+                  stream=f)
+    subprocess.check_call(('git', 'checkout', '-q', 'testbranch'), cwd=git)
+    shas = []
+    for name, content in (('a.py', 'A=1\n'), ('a.py', 'A = 1\n'),
+                          ('b.py', 'B = 1\nC=2\n')):
+        with open(os.path.join(git, name), 'w') as f:
+            f.write(content)
+        subprocess.check_call(('git', 'add', name), cwd=git)
+        subprocess.check_call(('git', 'commit', '-q', '-m', name), cwd=git)
+        shas.append(subprocess.check_output(
+            ('git', 'rev-parse', 'HEAD'), cwd=git).decode('ascii').strip())
+
+    runner = CliRunner()
+    result = runner.invoke(check, ['-r', git, 'files', '--final-state',
+                                   'master..testbranch'])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output.split("\n"), has_items(
+        "b.py", "2:2: E225 missing whitespace around operator"))
+    assert_that(result.output, is_not(contains_string("a.py")))
+
+    result = runner.invoke(check, ['-r', git, 'files', '--final-state',
+                                   '--blame', '-j', '0', 'testbranch'])
+    assert_that(result.output.split("\n"), has_item(
+        "{0} 2:2: E225 missing whitespace around operator".format(
+            shas[2][:7])))
+
+    result = runner.invoke(check, ['-r', git, 'files', '--final-state',
+                                   'testbranch~1'])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that(result.output.split("\n"), has_item("Everything is OK."))
+
+    # a merge is compared to its first parent
+    for command in (('git', 'checkout', '-q', 'master'),
+                    ('git', 'merge', '-q', '--no-ff', '--no-edit',
+                     'testbranch')):
+        subprocess.check_call(command, cwd=git)
+    result = runner.invoke(check, ['-r', git, 'files', '--final-state',
+                                   'master'])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output.split("\n"), has_items(
+        "b.py", "2:2: E225 missing whitespace around operator"))
@@ -30,9 +30,10 @@ from io import StringIO
 from unittest import TestCase
 
 from click.testing import CliRunner
-from hamcrest import assert_that, has_length, is_not
+from hamcrest import assert_that, equal_to, has_length, is_not
 
-from kwalitee.cli.githooks import HOOK_PATH, install, uninstall
+from kwalitee.cli.githooks import HOOK_PATH, _shim_excludes, _write_shim, \
+    install, uninstall
 
 
 class GithookCliTest(TestCase):
@@ -115,3 +116,66 @@ class GithookCliTest(TestCase):
         for hook in self.hooks:
             filename = os.path.join(self.path, HOOK_PATH, hook)
             assert_that(not os.path.exists(filename), filename)
+
+    def test_install_shim(self):
+        self.call("git", "init")
+
+        result = self.runner.invoke(install, ['--shim'])
+        assert_that(result.exit_code == 0)
+
+        precommit = os.path.join(self.path, HOOK_PATH, "pre-commit")
+        assert_that(not os.path.islink(precommit))
+        assert_that(os.access(precommit, os.X_OK))
+        for hook in self.hooks:
+            filename = os.path.join(self.path, HOOK_PATH, hook)
+            assert_that(os.path.lexists(filename), filename)
+
+        result = self.runner.invoke(uninstall)
+        assert_that(not os.path.exists(precommit))
+
+    def test_shim_excludes(self):
+        assert_that(_shim_excludes(['(.)+/legacy/(.)+', '.*\\.rst',
+                                    '^docs/', '(?!test_).*', '.*/a|b',
+                                    '.*[\\w]', '.*\\/foo\\/']),
+                    equal_to(['(.)+/legacy/(.)+', '.*\\.rst', '.*/foo/']))
+
+    def test_shim_starts_kwalitee(self):
+        env = dict(os.environ, GIT_AUTHOR_NAME='A', GIT_COMMITTER_NAME='A',
+                   GIT_AUTHOR_EMAIL='a@b.org', GIT_COMMITTER_EMAIL='a@b.org')
+        marker = os.path.join(self.path, 'started')
+        hook = os.path.join(self.path, 'hook')
+        with open(hook, 'w') as fh:
+            fh.write('#!/bin/sh\ntouch {0}\n'.format(marker))
+        os.chmod(hook, 0o755)
+        shim = os.path.join(self.path, 'shim')
+        _write_shim(shim, hook, ['(.)+/legacy/(.)+'])
+
+        def run_shim(*files):
+            for filename in files:
+                dirname = os.path.dirname(filename)
+                if dirname and not os.path.isdir(dirname):
+                    os.makedirs(dirname)
+                with open(filename, 'w') as fh:
+                    fh.write(filename)
+                self.call('git', 'add', filename)
+            if os.path.exists(marker):
+                os.remove(marker)
+            assert_that(subprocess.call([shim], env=env), equal_to(0))
+            subprocess.call(['git', 'commit', '-q', '-m', 'step'], env=env,
+                            cwd=self.path)
+            return os.path.exists(marker)
+
+        self.call('git', 'init')
+        # no HEAD yet
+        assert_that(run_shim('logo.png'))
+
+        assert_that(not run_shim('logo.svg', 'docs/index.rst'))
+        assert_that(not run_shim('invenio/legacy/foo.py'))
+        assert_that(run_shim('legacy/foo.py'))
+        assert_that(run_shim('invenio/foo.js'))
+
+        # the copied excludes may be stale
+        with open('.kwalitee.yml', 'w') as fh:
+            fh.write('excludes: []\n')
+        os.utime(shim, (1, 1))
+        assert_that(run_shim('invenio/legacy/bar.py'))
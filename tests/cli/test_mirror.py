@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the mirror command."""
+
+import os
+import subprocess
+
+from click.testing import CliRunner
+from hamcrest import assert_that, contains_string, equal_to, is_not
+
+from kwalitee.cli.mirror import mirror
+
+
+def _git(repository, *args):
+    return subprocess.check_output(("git",) + args, cwd=repository).decode(
+        "utf-8").strip()
+
+
+def test_mirror_files(tmpdir):
+    """The files of the commits are checked from the mirror."""
+    upstream = str(tmpdir.mkdir("upstream"))
+    _git(upstream, "init", "-q")
+    _git(upstream, "config", "user.name", "Herp Derpson")
+    _git(upstream, "config", "user.email", "herp.derpson@example.org")
+    for name, content in ((".kwalitee.yml", "license: false\n"
+                                            "pydocstyle: false\n"),
+                          ("a.py", "A=1\n"), ("b.py", "B = 2\n")):
+        with open(os.path.join(upstream, name), "w") as fh:
+            fh.write(content)
+        _git(upstream, "add", name)
+        _git(upstream, "commit", "-q", "-m", "base: " + name)
+    cache = str(tmpdir.join("cache"))
+    url = "file://" + upstream
+
+    runner = CliRunner()
+    result = runner.invoke(mirror, ["-d", cache, "files", url, "HEAD~1"])
+    assert_that(result.exit_code, is_not(equal_to(0)))
+    assert_that(result.output, contains_string("E225"))
+
+    result = runner.invoke(mirror, ["-d", cache, "files", url, "HEAD"])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that(result.output, contains_string("Everything is OK."))
+
+    result = runner.invoke(mirror, ["-d", cache, "-b", "0", "evict"])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that([name for name in os.listdir(cache) if name.endswith(".git")],
+                equal_to([]))
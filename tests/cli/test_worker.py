@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the worker command."""
+
+import json
+
+from click.testing import CliRunner
+from hamcrest import assert_that, contains_string, equal_to, has_entries
+
+from kwalitee.cli.worker import worker
+from kwalitee.jobqueue import JobQueue
+
+
+def test_worker_dead_letters(tmpdir):
+    """The dead letters are listed and queued again."""
+    path = str(tmpdir.join("jobs.sqlite"))
+    queue = JobQueue(path, max_attempts=1)
+    queue.put({"id": "a", "key": "acme/project#1", "sha": "abc"})
+    queue.lease("w1")
+    queue.fail("a", "w1", "Traceback\nValueError: boom\n")
+    queue.close()
+
+    runner = CliRunner()
+    result = runner.invoke(worker, ["-q", path, "dead"])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that(result.output, contains_string("a acme/project#1 abc"))
+    assert_that(result.output, contains_string("ValueError: boom"))
+
+    result = runner.invoke(worker, ["-q", path, "retry", "a", "b"])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that(result.output, contains_string("b is not a dead job."))
+
+    result = runner.invoke(worker, ["-q", path, "stats"])
+    assert_that(json.loads(result.output), has_entries({
+        "states": {"queued": 1}}))
+
+
+def test_worker_without_queue():
+    """The queue has to be configured."""
+    result = CliRunner().invoke(worker, ["stats"], env={
+        "KWALITEE_QUEUE": None, "KWALITEE_CONFIG": None})
+    assert_that(result.exit_code, equal_to(2))
+    assert_that(result.output, contains_string("WORKER_QUEUE"))
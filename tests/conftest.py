@@ -25,10 +25,14 @@
 
 import shutil
 import subprocess
+import sys
 import tempfile
 
 import pytest
 
+# the webhook service is written with async/await
+collect_ignore = ["test_web.py"] if sys.version_info < (3, 5) else []
+
 
 @pytest.fixture(scope="function")
 def git(request):
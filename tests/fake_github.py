@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Stand-in of the Github API, serving repositories kept in memory."""
+
+import base64
+import difflib
+import hashlib
+import json
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+def _patch(old, new):
+    """Unified diff without its header, like the ``patch`` of the API."""
+    lines = list(difflib.unified_diff(
+        old.decode("utf-8").splitlines(), new.decode("utf-8").splitlines(),
+        lineterm=""))
+    return "\n".join(lines[2:])
+
+
+def _diff(base, head):
+    """List the files changed between two trees."""
+    files = []
+    for path in sorted(set(base) | set(head)):
+        old, new = base.get(path), head.get(path)
+        if old == new:
+            continue
+        status = "added" if old is None else \
+            "removed" if new is None else "modified"
+        files.append({"filename": path, "status": status,
+                      "patch": _patch(old or b"", new or b"")})
+    return files
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class FakeGithub(object):
+    """Serve the commits and record what is published."""
+
+    def __init__(self):
+        """Start with no repository."""
+        self.commits = {}
+        self.pulls = {}
+        self.statuses = {}
+        self.comments = {}
+        self.labels = {}
+        self.reviews = []
+        self.requests = []
+        self.lock = threading.Lock()
+        self.delay = 0
+        self.latency = 0
+        self.connections = 0
+        self.not_modified = 0
+        self.rate_limit = None
+        self.rate_remaining = None
+        self.rate_reset = None
+        self.server = None
+        self.url = None
+
+    def start(self):
+        """Listen on a free port."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            # the connections are kept alive
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                with fake.lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _answer(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                data = json.loads(body.decode("utf-8")) if body else None
+                if fake.latency:
+                    time.sleep(fake.latency)
+                headers = fake.limit()
+                if headers.get("X-RateLimit-Remaining") == "-1":
+                    headers["X-RateLimit-Remaining"] = "0"
+                    status, content = 403, {
+                        "message": "API rate limit exceeded"}
+                else:
+                    status, content = fake.handle(method, self.path, data)
+                if not isinstance(content, bytes):
+                    content = json.dumps(content).encode("utf-8")
+                if method == "GET" and status == 200:
+                    headers["ETag"] = '"{0}"'.format(
+                        hashlib.sha1(content).hexdigest())
+                    if self.headers.get("If-None-Match") == headers["ETag"]:
+                        with fake.lock:
+                            fake.not_modified += 1
+                        status, content = 304, b""
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                self._answer("GET")
+
+            def do_POST(self):
+                self._answer("POST")
+
+            def do_PUT(self):
+                self._answer("PUT")
+
+        self.server = _Server(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:{0}/".format(self.server.server_port)
+        return self
+
+    def stop(self):
+        """Stop listening."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def limit(self):
+        """Count a request against the rate limit, if any.
+
+        :return: headers of the rate limit, the remaining requests are -1
+            once exceeded
+        :rtype: dict
+        """
+        if self.rate_limit is None:
+            return {}
+        limit, window = self.rate_limit
+        with self.lock:
+            now = time.time()
+            if self.rate_reset is None or now >= self.rate_reset:
+                self.rate_remaining = limit
+                self.rate_reset = now + window
+            self.rate_remaining = max(self.rate_remaining - 1, -1)
+            return {"X-RateLimit-Limit": str(limit),
+                    "X-RateLimit-Remaining": str(self.rate_remaining),
+                    "X-RateLimit-Reset": "{0:.3f}".format(self.rate_reset)}
+
+    def commit(self, repository, message, files, parent=None,
+               author=("Herp Derpson", "herp.derpson@example.org")):
+        """Create a commit.
+
+        :param files: content of the files changed by the commit, None to
+            remove a file
+        :return: SHA of the commit
+        """
+        tree = dict(self.commits[parent]["tree"]) if parent else {}
+        for path, content in files.items():
+            if content is None:
+                tree.pop(path, None)
+            else:
+                tree[path] = content
+        sha = hashlib.sha1(json.dumps(
+            [repository, message, parent, sorted(
+                (path, content.decode("utf-8"))
+                for path, content in tree.items())]).encode(
+                    "utf-8")).hexdigest()
+        self.commits[sha] = {"repository": repository, "message": message,
+                             "parent": parent, "tree": tree,
+                             "author": {"name": author[0],
+                                        "email": author[1]}}
+        return sha
+
+    def pull_request(self, repository, number, base, head, title="Fix",
+                     action="opened"):
+        """Open a pull request and get the payload of its event."""
+        self.pulls[(repository, number)] = (base, head)
+        api = self.url + "repos/" + repository
+        url = "{0}/pulls/{1}".format(api, number)
+        return {"action": action, "number": number,
+                "repository": self._repository(repository),
+                "pull_request": {
+                    "number": number, "title": title, "url": url,
+                    "html_url": "https://github.com/{0}/pull/{1}".format(
+                        repository, number),
+                    "commits_url": url + "/commits",
+                    "statuses_url": "{0}/statuses/{1}".format(api, head),
+                    "issue_url": "{0}/issues/{1}".format(api, number),
+                    "head": {"sha": head}, "base": {"sha": base}}}
+
+    def push(self, repository, ref, before, shas):
+        """Get the payload of the push of the commits."""
+        return {"ref": ref, "before": before, "after": shas[-1],
+                "deleted": False,
+                "repository": self._repository(repository),
+                "commits": [{"id": sha,
+                             "message": self.commits[sha]["message"],
+                             "author": self.commits[sha]["author"]}
+                            for sha in shas]}
+
+    def _repository(self, repository):
+        api = self.url + "repos/" + repository
+        return {"full_name": repository, "url": api,
+                "commits_url": api + "/commits{/sha}",
+                "statuses_url": api + "/statuses/{sha}"}
+
+    def _files(self, repository, base, head):
+        files = _diff(self.commits[base]["tree"] if base else {},
+                      self.commits[head]["tree"])
+        for f in files:
+            f["raw_url"] = "{0}raw/{1}/{2}/{3}".format(
+                self.url, repository, head, f["filename"])
+        return files
+
+    def _commits(self, base, head):
+        commits = []
+        while head and head != base:
+            commits.insert(0, head)
+            head = self.commits[head]["parent"]
+        return commits
+
+    def handle(self, method, path, data):
+        """Answer a request of the API.
+
+        :return: HTTP status and body
+        :rtype: tuple
+        """
+        with self.lock:
+            self.requests.append((method, path))
+        if self.delay and method == "GET":
+            time.sleep(self.delay)
+        path, _, query = path.partition("?")
+        match = re.match(r"^/(raw|repos)/([^/]+/[^/]+)/(.*)$", path)
+        if not match:
+            return 404, {"message": "Not Found"}
+        kind, repository, rest = match.groups()
+
+        if kind == "raw":
+            sha, _, filename = rest.partition("/")
+            content = self.commits.get(sha, {}).get("tree", {}).get(filename)
+            if content is None:
+                return 404, {"message": "Not Found"}
+            return 200, content
+
+        match = re.match(r"^pulls/(\d+)/(commits|files)$", rest)
+        if match and method == "GET":
+            base, head = self.pulls[(repository, int(match.group(1)))]
+            if match.group(2) == "files":
+                return 200, self._files(repository, base, head)
+            return 200, [{"sha": sha, "commit": {
+                "message": self.commits[sha]["message"],
+                "author": self.commits[sha]["author"]}}
+                for sha in self._commits(base, head)]
+
+        match = re.match(r"^commits/(\w+)$", rest)
+        if match and method == "GET":
+            sha = match.group(1)
+            return 200, {"sha": sha, "files": self._files(
+                repository, self.commits[sha]["parent"], sha)}
+
+        match = re.match(r"^contents/(.+)$", rest)
+        if match and method == "GET":
+            ref = re.search(r"ref=(\w+)", query).group(1)
+            content = self.commits[ref]["tree"].get(match.group(1))
+            if content is None:
+                return 404, {"message": "Not Found"}
+            return 200, {"encoding": "base64",
+                         "content": base64.b64encode(content).decode(
+                             "ascii")}
+
+        with self.lock:
+            match = re.match(r"^statuses/(\w+)$", rest)
+            if match and method == "POST":
+                self.statuses.setdefault(match.group(1), []).append(data)
+                return 201, data
+
+            match = re.match(r"^commits/(\w+)/comments$", rest)
+            if match and method == "POST":
+                self.comments.setdefault(match.group(1), []).append(data)
+                return 201, data
+
+            match = re.match(r"^pulls/(\d+)/reviews$", rest)
+            if match and method == "POST":
+                self.reviews.append(data)
+                for comment in data.get("comments") or ():
+                    self.comments.setdefault(data["commit_id"], []).append(
+                        dict(comment, commit_id=data["commit_id"]))
+                return 200, data
+
+            match = re.match(r"^issues/(\d+)/labels$", rest)
+            if match:
+                key = (repository, int(match.group(1)))
+                if method == "PUT":
+                    self.labels[key] = list(data)
+                return 200, [{"name": name}
+                             for name in self.labels.get(key, [])]
+
+        return 404, {"message": "Not Found"}
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the search of the commits introducing the errors."""
+
+import math
+import os
+import subprocess
+
+import pytest
+from hamcrest import assert_that, equal_to, less_than_or_equal_to
+
+from kwalitee.blame import UNCOMMITTED, Blame
+from kwalitee.options import Options, get_options
+from kwalitee.results import ResultStore
+
+
+def _git(repository, *args):
+    return subprocess.check_output(("git",) + args, cwd=repository).decode(
+        "utf-8").strip()
+
+
+def _commit(repository, name, content, message="update"):
+    with open(os.path.join(repository, name), "wb") as fh:
+        fh.write(content)
+    _git(repository, "add", name)
+    _git(repository, "commit", "-q", "-m", message)
+    return _git(repository, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def repository(tmpdir):
+    """Empty repository."""
+    path = str(tmpdir.mkdir("repository"))
+    _git(path, "init", "-q")
+    _git(path, "config", "user.name", "Herp Derpson")
+    _git(path, "config", "user.email", "herp.derpson@example.org")
+    return path
+
+
+def _options():
+    return Options(get_options(), license=False, pydocstyle=False)
+
+
+def test_blame_line(repository):
+    """The commit blamed for the line has the error, its parent not."""
+    _commit(repository, "a.py", b"A = 1\n")
+    first = _commit(repository, "a.py", b"A = 1\nB=2\n")
+    second = _commit(repository, "a.py", b"A = 1\nB=2\nC = 3\nB=2\n")
+    _commit(repository, "a.py", b"X = 0\nA = 1\nB=2\nC = 3\nB=2\n")
+
+    blame = Blame(_options(), git_dir=os.path.join(repository, ".git"))
+    errors = ["3:2: E225 missing whitespace around operator",
+              "5:2: E225 missing whitespace around operator"]
+    assert_that(blame.find("a.py", errors), equal_to([first, second]))
+    # the head, the two blamed commits and their parents
+    assert_that(blame.checks, equal_to(4))
+
+
+def test_blame_bisect(repository, tmpdir):
+    """The history is bisected when the line was not the one changed."""
+    shas = []
+    for index in range(64):
+        # the use of the import is removed by the 40th commit
+        lines = [b"import os"] + [b"X = os.sep"] * (index < 40) + [
+            "V{0} = {0}".format(line).encode("ascii")
+            for line in range(index)]
+        shas.append(_commit(repository, "a.py", b"\n".join(lines) + b"\n"))
+
+    store = ResultStore(str(tmpdir.join("results")))
+    blame = Blame(_options(), git_dir=os.path.join(repository, ".git"),
+                  store=store)
+    error = "1:1: F401 'os' imported but unused"
+    assert_that(blame.find("a.py", [error]), equal_to([shas[40]]))
+    # the head, the blamed commit, its parent and the bisection
+    assert_that(blame.lookups, less_than_or_equal_to(
+        3 + math.ceil(math.log(len(shas), 2))))
+
+    blame = Blame(_options(), git_dir=os.path.join(repository, ".git"),
+                  store=store)
+    assert_that(blame.find("a.py", [error]), equal_to([shas[40]]))
+    assert_that(blame.checks, equal_to(0))
+
+
+def test_blame_worktree(repository):
+    """The errors of the working tree are not committed yet."""
+    sha = _commit(repository, "a.py", b"A=1\n")
+    blame = Blame(_options(), git_dir=os.path.join(repository, ".git"))
+    error = "2:2: E225 missing whitespace around operator"
+    assert_that(blame.find("a.py", ["1:2: E225 missing whitespace around "
+                                    "operator", error],
+                           content=b"A=1\nB=2\n"),
+                equal_to([sha, UNCOMMITTED]))
+    assert_that(blame.find("b.py", [error], content=b"A = 1\nB=2\n"),
+                equal_to([UNCOMMITTED]))
@@ -22,13 +22,17 @@
 # or submit itself to any jurisdiction.
 
 import os
+import pickle
 import tempfile
+import time
 from unittest import TestCase
 
-from hamcrest import assert_that, contains_string, has_item, has_items, \
-    has_length, is_not
+from hamcrest import assert_that, contains_string, equal_to, has_item, \
+    has_items, has_length, is_, is_not
 
-from kwalitee.kwalitee import check_license, check_pep8, check_pydocstyle
+from kwalitee.kwalitee import _PEP8_ERROR, Error, _format_errors, \
+    _get_logical_dirnames, _MatchDirTrie, _run_with_budget, check_file, \
+    check_license, check_pep8, check_pydocstyle, is_warning
 
 
 class TestCheckFile(TestCase):
@@ -136,6 +140,28 @@ class TestCheckPep257(TestCheckFile):
                                   match_dir="[^\.].*")
         assert_that(errors, has_length(0))
 
+    def test_match_dir_root(self):
+        """directories are matched relatively to the root"""
+        errors = check_pydocstyle("/tmp/foo/.hidden/bar.py", root="/tmp/foo",
+                                  match_dir="[^\.].*")
+        assert_that(errors, has_length(0))
+
+    def test_match_dir_trie(self):
+        """the directories decisions are cached"""
+        trie = _MatchDirTrie("[^\.].*")
+        assert_that(trie.match(["foo", "bar"]))
+        assert_that(not trie.match(["foo", ".hidden", "bar"]))
+        assert_that(not trie.match([".hidden"]))
+        assert_that(trie.children["foo"][1], has_length(2))
+
+    def test_logical_dirnames(self):
+        """the temporary directory is not part of the logical path"""
+        assert_that(_get_logical_dirnames("/tmp/.x/foo/bar.py", "/tmp/.x"),
+                    equal_to(["foo"]))
+        assert_that(_get_logical_dirnames("foo/bar.py"), equal_to(["foo"]))
+        assert_that(_get_logical_dirnames("/foo/bar.py", "/tmp"),
+                    equal_to(["foo"]))
+
     def test_match_absolute_dir(self):
         fp, path = tempfile.mkstemp(text=True)
         os.write(fp, "# -*- coding: utf-8 -*-\n".encode("ascii"))
@@ -214,3 +240,86 @@ class TestCheckLicense(TestCheckFile):
         errors = check_license(self.cp1252, year=2014)
         assert_that(errors,
                     has_item("24: L190 file cannot be decoded as utf-8"))
+
+
+def _sleepy_check(filename, **kwargs):
+    time.sleep(10)
+    return []
+
+
+def _greedy_check(filename, **kwargs):
+    return [" " * (512 * 1024 * 1024)]
+
+
+def _crashing_check(filename, **kwargs):
+    os._exit(3)
+
+
+class TestCheckBudgets(TestCheckFile):
+
+    """Unit tests of the time and memory budgets."""
+
+    def test_max_file_size(self):
+        """expensive checkers are skipped on large files"""
+        fp, path = tempfile.mkstemp(suffix=".py")
+        with open(self.valid_license, "rb") as fh:
+            os.write(fp, fh.read())
+        os.close(fp)
+
+        errors = check_file(path, max_file_size=10, year=2014)
+        os.unlink(path)
+        assert_that(errors, has_length(1))
+        assert_that(errors[0], contains_string(
+            "K110 file is too large"))
+        assert_that(errors[0], contains_string("skipped pep8, pydocstyle"))
+        assert_that(is_warning(errors[0]), is_(True))
+
+    def test_budget_license(self):
+        """checkers run in supervised processes within their budget"""
+        errors = check_file(self.license_js, year=2014, timeout=30,
+                            memory_limit={"license": 4096})
+        assert_that(errors, has_length(0))
+
+    def test_timeout(self):
+        """a checker exceeding its time budget is reported"""
+        errors = _run_with_budget("sleepy", _sleepy_check, self.valid, {},
+                                  timeout=0.1)
+        errors = _format_errors(errors)
+        assert_that(errors, has_item(
+            "1: K100 sleepy check exceeded its time budget of 0.1s"))
+
+    def test_memory_limit(self):
+        """a checker exceeding its memory budget is reported"""
+        errors = _run_with_budget("greedy", _greedy_check, self.valid, {},
+                                  timeout=30, memory_limit=256)
+        errors = _format_errors(errors)
+        assert_that(errors, has_item(
+            "1: K101 greedy check exceeded its memory budget of 256MB"))
+
+    def test_crash(self):
+        """a crashing checker is reported"""
+        errors = _run_with_budget("crash", _crashing_check, self.valid, {},
+                                  timeout=30)
+        errors = _format_errors(errors)
+        assert_that(errors, has_item(
+            "1: K102 crash check crashed with exit code 3"))
+
+
+class TestError(TestCase):
+
+    """Unit tests of the error records."""
+
+    def test_format(self):
+        """errors are formatted as the checkers print them"""
+        assert_that(str(Error(13, "L100")),
+                    equal_to("13: L100 license is missing"))
+        assert_that(str(Error(4, "E111", ("indentation",), col=2,
+                              template=_PEP8_ERROR)),
+                    equal_to("4:2: E111 indentation"))
+
+    def test_pickle(self):
+        """errors survive the trip from a supervised checker"""
+        error = pickle.loads(pickle.dumps(Error(1, "M111", ("foo",))))
+        assert_that(error.code, equal_to("M111"))
+        assert_that(error.message,
+                    equal_to("unrecognized component name: foo"))
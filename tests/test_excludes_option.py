@@ -26,7 +26,8 @@
 import os
 from unittest import TestCase
 
-from kwalitee.kwalitee import check_file, get_options, is_file_excluded
+from kwalitee.kwalitee import check_file, compile_excludes, filter_files, \
+    get_options, is_file_excluded
 
 
 class TestExcludesOption(TestCase):
@@ -37,6 +38,7 @@ class TestExcludesOption(TestCase):
         """Setup."""
         base_dir = os.path.join(os.path.dirname(__file__), "fixtures",
                                 "excludes_option")
+        self.base_dir = base_dir
         self.legacy_regex_1 = ['(.)+/legacy/(.)+']
         self.legacy_regex_2 = ['(.)+/legacy/(.)+', '(.)+/foo/(.)+']
         self.file_1 = base_dir + '/fuu/bar/foo.py'
@@ -78,3 +80,72 @@ class TestExcludesOption(TestCase):
         assert check_file(filename=self.file_2, **options_2) is None
         assert check_file(filename=self.file_3, **options_1) is None
         assert check_file(filename=self.file_3, **options_2) is None
+
+    def test_compile_excludes(self):
+        """Check that the patterns are compiled once into one regex."""
+        excludes = compile_excludes(self.legacy_regex_2)
+        assert excludes is compile_excludes(list(self.legacy_regex_2))
+        assert len(excludes.regexes) == 1
+        assert excludes.match(self.file_2)
+        assert not excludes.match(self.file_1)
+
+        # backreferences are not renumbered
+        excludes = compile_excludes(self.legacy_regex_1 + [r'(a)\1'])
+        assert len(excludes.regexes) == 2
+        assert excludes.match('aa')
+        assert not excludes.match('ab')
+
+    def test_directory_pruning(self):
+        """Check that whole directories are excluded."""
+        excludes = compile_excludes(self.legacy_regex_1 + ['.*\\.rst'])
+        assert excludes.match_directory('invenio/legacy')
+        assert not excludes.match_directory('invenio')
+        assert not excludes.match_directory('invenio/modules')
+
+        assert excludes.filter([
+            'invenio/legacy/bibdocfile/api.py',
+            'invenio/modules/foo.py',
+            'docs/index.rst',
+        ]) == ['invenio/modules/foo.py']
+
+        filenames = [filename for filename in excludes.walk(self.base_dir)
+                     if filename.endswith('.py')]
+        assert sorted(filenames) == sorted([self.file_1, self.file_2])
+
+    def test_directory_pruning_lookahead(self):
+        """Check that the patterns looking ahead are matched file by file."""
+        excludes = compile_excludes([r'docs/(?!conf\.py$).*'])
+        assert not excludes.match('docs/conf.py')
+        assert not excludes.match_directory('docs')
+        assert excludes.filter(['docs/conf.py', 'docs/x.py']) == [
+            'docs/conf.py']
+
+        excludes = compile_excludes([r'docs/[^c].*', r'tmp/.*$'])
+        assert not excludes.match_directory('docs')
+        assert excludes.match_directory('tmp')
+        assert excludes.filter(['docs/conf.py', 'docs/x.py',
+                                'tmp/a/b.py']) == ['docs/conf.py']
+
+    def test_filter_files(self):
+        """Check that the paths are sorted out before reading the files."""
+        filenames = ['invenio/legacy/bibdocfile/api.py',
+                     'invenio/modules/foo.py',
+                     'invenio/modules/templates/foo.html',
+                     'docs/index.rst',
+                     'setup.cfg']
+        checked, excluded, unchecked = filter_files(
+            filenames, root='/tmp/kwalitee', excludes=self.legacy_regex_1)
+        assert checked == ['invenio/modules/foo.py',
+                           'invenio/modules/templates/foo.html']
+        assert excluded == ['invenio/legacy/bibdocfile/api.py']
+        assert unchecked == ['docs/index.rst', 'setup.cfg']
+
+        # top level directories are excluded as check_file would do
+        checked, excluded, _ = filter_files(['legacy/foo.py'],
+                                            root='/tmp/kwalitee',
+                                            excludes=self.legacy_regex_1)
+        assert excluded == ['legacy/foo.py']
+
+        checked, _, unchecked = filter_files(
+            filenames, pep8=False, pydocstyle=False, license=False)
+        assert checked == ['invenio/modules/templates/foo.html']
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the client of the Github API."""
+
+import socket
+import time
+
+import pytest
+from fake_github import FakeGithub
+from hamcrest import assert_that, calling, equal_to, greater_than, \
+    has_length, raises
+
+from kwalitee.github import Github, GithubError
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:  # Python 2
+    from urlparse import urlsplit
+
+
+@pytest.fixture
+def github(request):
+    """Fake API with a repository."""
+    fake = FakeGithub().start()
+    request.addfinalizer(fake.stop)
+    fake.base = fake.commit("acme/project", "base: initial", {
+        "AUTHORS.rst": b"- Herp Derpson <herp.derpson@example.org>\n"})
+    return fake
+
+
+@pytest.fixture
+def client(request, github):
+    """Client of the fake API."""
+    client = Github(github.url)
+    request.addfinalizer(client.close)
+    return client
+
+
+def test_keep_alive(github, client):
+    """The requests reuse the connection."""
+    for number in range(10):
+        client.post("repos/acme/project/statuses/" + github.base,
+                    {"state": "success", "number": number})
+    assert_that(github.statuses[github.base], has_length(10))
+    assert_that(github.connections, equal_to(1))
+
+
+def test_stale_connection(github, client):
+    """Only the idempotent requests are sent again on a new connection."""
+    class StaleConnection(object):
+
+        def request(self, method, path, body, headers):
+            pass
+
+        def getresponse(self):
+            raise socket.error("connection reset by peer")
+
+        def close(self):
+            pass
+
+    key = ("http", urlsplit(github.url).netloc)
+    client._idle[key] = [StaleConnection()]
+    url = "repos/acme/project/statuses/" + github.base
+    assert_that(calling(client.post).with_args(url, {"state": "success"}),
+                raises(socket.error))
+    assert_that(github.statuses.get(github.base, []), has_length(0))
+
+    client._idle[key] = [StaleConnection()]
+    assert_that(client.get_content("acme/project", "AUTHORS.rst",
+                                   github.base), has_length(greater_than(0)))
+
+
+def test_etag(github, client):
+    """The unchanged resources are not downloaded again."""
+    first = client.get_content("acme/project", "AUTHORS.rst", github.base)
+    second = client.get_content("acme/project", "AUTHORS.rst", github.base)
+
+    assert_that(second, equal_to(first))
+    assert_that(github.not_modified, equal_to(1))
+    assert_that(client.get_content("acme/project", "README.rst",
+                                   github.base), equal_to(None))
+
+
+def test_rate_limit(github, client):
+    """Once the limit is exceeded, the requests wait for its reset."""
+    github.rate_limit = (3, 0.5)
+    start = time.time()
+    for _ in range(5):
+        client.get("repos/acme/project/commits/" + github.base)
+
+    assert_that(time.time() - start, greater_than(0.4))
+    assert_that(github.requests, has_length(5))
+
+    client.max_wait = 0
+    github.rate_limit = (1, 60)
+    github.rate_reset = None
+    client.get("repos/acme/project/commits/" + github.base)
+    assert_that(calling(client.get).with_args(
+        "repos/acme/project/commits/" + github.base), raises(GithubError))
+
+
+def test_rate_limit_exceeded(github, client):
+    """The requests refused by the limit are sent again after its reset."""
+    github.rate_limit = (1, 0.5)
+    other = Github(github.url)
+    other.get("repos/acme/project/commits/" + github.base)
+    other.close()
+
+    start = time.time()
+    client.get("repos/acme/project/commits/" + github.base)
+    assert_that(time.time() - start, greater_than(0.4))
+    assert_that(github.requests, has_length(2))
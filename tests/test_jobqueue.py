@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the durable queue of the jobs."""
+
+import multiprocessing
+import time
+
+import pytest
+from fake_github import FakeGithub
+from hamcrest import assert_that, contains, equal_to, has_entries, has_length
+
+from kwalitee.github import Github
+from kwalitee.jobqueue import DEAD, DONE, LEASED, QUEUED, SUPERSEDED, JobQueue
+from kwalitee.worker import coalesce, get_job, work
+
+GOOD_MESSAGE = """base: fix of the frobnicator
+
+* FIX Fixes the frobnicator.
+
+Signed-off-by: Herp Derpson <herp.derpson@example.org>
+"""
+
+
+@pytest.fixture
+def queue(request, tmpdir):
+    """Empty queue."""
+    queue = JobQueue(str(tmpdir.join("jobs.sqlite")), lease=60,
+                     max_attempts=2, retry_delay=0)
+    request.addfinalizer(queue.close)
+    return queue
+
+
+def test_lease_complete(queue):
+    """A leased job is not leased again until done."""
+    queue.put({"id": "a"})
+    job, attempts = queue.lease("w1")
+    assert_that(job, equal_to({"id": "a"}))
+    assert_that(attempts, equal_to(1))
+    assert_that(queue.lease("w2"), equal_to(None))
+
+    assert_that(queue.heartbeat("a", "w1"), equal_to(True))
+    assert_that(queue.heartbeat("a", "w2"), equal_to(False))
+    assert_that(queue.complete("a", "w1", {"state": "success"}),
+                equal_to(True))
+    assert_that(queue.get("a"), has_entries({
+        "state": DONE, "result": {"state": "success"}}))
+
+
+def test_lease_expired(queue):
+    """The job of a dead worker is leased again, then buried."""
+    queue.lease_time = -1
+    queue.put({"id": "a"})
+    assert_that(queue.lease("w1")[1], equal_to(1))
+    assert_that(queue.lease("w2")[1], equal_to(2))
+    assert_that(queue.complete("a", "w1"), equal_to(False))
+
+    assert_that(queue.lease("w3"), equal_to(None))
+    assert_that(queue.get("a"), has_entries({
+        "state": DEAD, "error": "lease expired"}))
+    assert_that(queue.dead_letters(), contains(contains(
+        {"id": "a"}, 2, "lease expired")))
+
+    assert_that(queue.retry("a"), equal_to(True))
+    assert_that(queue.get("a"), has_entries({"state": QUEUED,
+                                             "attempts": 0}))
+
+
+def test_fail(queue):
+    """A failed job is retried, then buried."""
+    queue.put({"id": "a"})
+    queue.lease("w1")
+    assert_that(queue.fail("a", "w1", "boom"), equal_to(QUEUED))
+    queue.lease("w1")
+    assert_that(queue.fail("a", "w1", "boom"), equal_to(DEAD))
+    assert_that(queue.fail("a", "w1", "boom"), equal_to(None))
+    assert_that(queue.get("a"), has_entries({"state": DEAD,
+                                             "error": "boom"}))
+
+
+def test_supersede(queue):
+    """The jobs of the same key are superseded, the running one cancelled."""
+    queue.put({"id": "a"}, key="acme/project#1")
+    queue.lease("w1")
+    queue.put({"id": "b"}, key="acme/project#1")
+    queue.put({"id": "c", "merged": True}, key="acme/project#1",
+              merge=lambda previous, job: dict(job, previous=previous["id"]))
+
+    assert_that(queue.heartbeat("a", "w1"), equal_to(False))
+    assert_that(queue.get("b"), has_entries({"state": SUPERSEDED}))
+    assert_that(queue.lease("w2")[0], equal_to(
+        {"id": "c", "merged": True, "previous": "b"}))
+
+
+def test_supersede_expired(queue):
+    """A superseded job is not leased again once its lease expired."""
+    queue.lease_time = -1
+    queue.put({"id": "a"}, key="acme/project#1")
+    queue.lease("w1")
+    queue.put({"id": "b"}, key="acme/project#1")
+
+    assert_that(queue.lease("w2")[0], equal_to({"id": "b"}))
+    assert_that(queue.get("a"), has_entries({"state": SUPERSEDED}))
+    assert_that(queue.lease("w3")[0], equal_to({"id": "b"}))
+
+
+def test_tenants(queue):
+    """The repositories are served in turn."""
+    for number in range(3):
+        queue.put({"id": "big{0}".format(number)}, tenant="big")
+    queue.put({"id": "small"}, tenant="small")
+
+    leased = []
+    while True:
+        item = queue.lease("w1")
+        if item is None:
+            break
+        leased.append(item[0]["id"])
+        time.sleep(0.01)
+    assert_that(leased, equal_to(["big0", "small", "big1", "big2"]))
+    assert_that(queue.stats()["states"], equal_to({LEASED: 4}))
+
+
+def _drain(path, results):
+    queue = JobQueue(path)
+    while True:
+        item = queue.lease(multiprocessing.current_process().name)
+        if item is None:
+            break
+        results.put(item[0]["id"])
+        queue.complete(item[0]["id"],
+                       multiprocessing.current_process().name)
+    queue.close()
+
+
+def test_concurrent_workers(queue):
+    """Each job is run once by the processes sharing the queue."""
+    for number in range(50):
+        queue.put({"id": str(number)})
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_drain,
+                                       args=(queue.path, results))
+               for _ in range(4)]
+    for process in workers:
+        process.start()
+    leased = [results.get(timeout=30) for _ in range(50)]
+    for process in workers:
+        process.join(30)
+
+    assert_that(sorted(leased, key=int),
+                equal_to([str(number) for number in range(50)]))
+    assert_that(queue.stats()["states"], equal_to({DONE: 50}))
+
+
+def test_work(request, queue):
+    """The worker runs the job and publishes the results."""
+    github = FakeGithub().start()
+    request.addfinalizer(github.stop)
+    base = github.commit("acme/project", "base: initial", {
+        ".kwalitee.yml": b"license: false\npydocstyle: false\n",
+        "AUTHORS.rst": b"- Herp Derpson <herp.derpson@example.org>\n"})
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": b"FROBNICATOR=42\n"},
+                         parent=base)
+    job = get_job("pull_request", github.pull_request(
+        "acme/project", 1, base, head))
+    queue.put(job, key=job["key"], tenant=job["repository"], merge=coalesce)
+    queue.put({"id": "broken", "sha": head})
+
+    # the broken job is retried once, then buried
+    assert_that(work(queue, Github(github.url), burst=True), equal_to(3))
+
+    assert_that(queue.get(job["id"]), has_entries({
+        "state": DONE, "result": has_entries({"state": "error",
+                                              "errors": 1})}))
+    assert_that(github.statuses[head], has_length(2))
+    assert_that(queue.get("broken"), has_entries({"state": DEAD,
+                                                  "attempts": 2}))
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Tests of the language server."""
+
+import os
+import threading
+
+import pytest
+from hamcrest import assert_that, contains, contains_string, equal_to, \
+    has_entries
+
+from kwalitee.kwalitee import Error
+from kwalitee.lsp import LanguageServer, read_message, to_diagnostic, \
+    write_message
+
+
+class Editor(object):
+    """Talk to the server running in a thread."""
+
+    def __init__(self, root):
+        requests_r, requests_w = os.pipe()
+        responses_r, responses_w = os.pipe()
+        self.requests = os.fdopen(requests_w, "wb")
+        self.responses = os.fdopen(responses_r, "rb")
+        self.server = LanguageServer(os.fdopen(requests_r, "rb"),
+                                     os.fdopen(responses_w, "wb"),
+                                     debounce=0.1)
+        self.status = []
+        self.thread = threading.Thread(
+            target=lambda: self.status.append(self.server.serve()))
+        self.thread.start()
+        self.uri = "file://{0}".format(os.path.join(root, "a.py"))
+
+    def send(self, method, params=None, request_id=None):
+        message = {"jsonrpc": "2.0", "method": method, "params": params}
+        if request_id is not None:
+            message["id"] = request_id
+        write_message(self.requests, message)
+
+    def receive(self):
+        return read_message(self.responses)
+
+    def change(self, version, text):
+        self.send("textDocument/didChange", {
+            "textDocument": {"uri": self.uri, "version": version},
+            "contentChanges": [{"text": text}]})
+
+
+@pytest.fixture
+def editor(request, tmpdir):
+    """Editor with an initialized server."""
+    root = tmpdir.mkdir("repository")
+    root.join(".kwalitee.yml").write("license: false\npydocstyle: false\n")
+    editor = Editor(str(root))
+    editor.send("initialize", {"rootUri": "file://{0}".format(root)},
+                request_id=1)
+
+    def teardown():
+        if editor.thread.is_alive():
+            editor.send("exit")
+            editor.thread.join(10)
+
+    request.addfinalizer(teardown)
+    return editor
+
+
+def test_to_diagnostic():
+    """The lines and the columns start at 0."""
+    assert_that(to_diagnostic(Error(3, "E225", ("missing whitespace", ),
+                                    col=2)),
+                equal_to({"range": {"start": {"line": 2, "character": 1},
+                                    "end": {"line": 2, "character": 2}},
+                          "severity": 1, "code": "E225", "source": "kwalitee",
+                          "message": "missing whitespace"}))
+    assert_that(to_diagnostic(Error(1, "D100", ("missing docstring", ))),
+                has_entries({"severity": 2, "range": has_entries({
+                    "end": {"line": 1, "character": 0}})}))
+
+
+def test_language_server(editor):
+    """The buffers are checked, the stale versions are not published."""
+    assert_that(editor.receive(), has_entries({
+        "id": 1, "result": has_entries({"capabilities": has_entries({
+            "textDocumentSync": has_entries({"change": 1})})})}))
+
+    editor.send("textDocument/didOpen", {"textDocument": {
+        "uri": editor.uri, "version": 1, "languageId": "python",
+        "text": "import os\n"}})
+    assert_that(editor.receive(), has_entries({
+        "method": "textDocument/publishDiagnostics",
+        "params": has_entries({"uri": editor.uri, "version": 1,
+                               "diagnostics": contains(has_entries({
+                                   "code": "F401", "source": "kwalitee"}))})}))
+
+    editor.change(2, "x=1\n")
+    editor.change(3, "x = 1\n")
+    assert_that(editor.receive(), has_entries({
+        "params": has_entries({"version": 3, "diagnostics": []})}))
+
+    editor.send("unknown", request_id=2)
+    assert_that(editor.receive(), has_entries({
+        "id": 2, "error": has_entries({"code": -32601})}))
+
+    editor.send("shutdown", request_id=3)
+    assert_that(editor.receive(), has_entries({"id": 3, "result": None}))
+    editor.send("exit")
+    editor.thread.join(10)
+    assert_that(editor.status, equal_to([0]))
+
+
+def test_failing_handler(editor):
+    """A failing handler is logged and the server keeps running."""
+    editor.receive()
+    editor.send("textDocument/didOpen", {"textDocument": {
+        "uri": editor.uri, "version": 1}})
+    assert_that(editor.receive(), has_entries({
+        "method": "window/logMessage",
+        "params": has_entries({"message": contains_string("KeyError")})}))
+
+    def _fail(params):
+        raise ValueError("boom")
+
+    editor.server.on_kwalitee_fail = _fail
+    editor.send("kwalitee/fail", request_id=2)
+    assert_that(editor.receive(), has_entries({
+        "method": "window/logMessage"}))
+    assert_that(editor.receive(), has_entries({
+        "id": 2, "error": has_entries({"code": -32603,
+                                       "message": "ValueError: boom"})}))
+
+    editor.send("shutdown", request_id=3)
+    assert_that(editor.receive(), has_entries({"id": 3, "result": None}))
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the cache of bare mirrors."""
+
+import os
+import subprocess
+
+import pytest
+from hamcrest import assert_that, contains, equal_to, has_length
+
+from kwalitee.mirror import MirrorCache, MirrorError, parse_size
+
+
+def _git(repository, *args):
+    return subprocess.check_output(("git",) + args, cwd=repository).decode(
+        "utf-8").strip()
+
+
+def _commit(repository, message, files):
+    for filename, content in files.items():
+        path = os.path.join(repository, filename)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as fh:
+            fh.write(content)
+        _git(repository, "add", filename)
+    _git(repository, "commit", "-q", "-m", message)
+    return _git(repository, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def upstream(tmpdir):
+    """Repository served through a ``file://`` URL."""
+    repository = str(tmpdir.mkdir("upstream"))
+    _git(repository, "init", "-q")
+    _git(repository, "config", "user.name", "Herp Derpson")
+    _git(repository, "config", "user.email", "herp.derpson@example.org")
+    _commit(repository, "base: initial", {"a.py": b"A = 1\n"})
+    return repository
+
+
+def test_parse_size():
+    """The sizes take an optional unit."""
+    assert_that(parse_size("2G"), equal_to(2 * 1024 ** 3))
+    assert_that(parse_size("512m"), equal_to(512 * 1024 ** 2))
+    assert_that(parse_size("100"), equal_to(100))
+    assert_that(parse_size(None), equal_to(None))
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_fetch_incremental(upstream, tmpdir):
+    """The mirror is cloned once then only fetched."""
+    cache = MirrorCache(str(tmpdir.join("cache")))
+    url = "file://" + upstream
+    path = cache.fetch(url)
+    assert_that(os.path.isfile(os.path.join(path, "HEAD")))
+
+    sha = _commit(upstream, "base: second", {"pkg/b.py": b"B = 2\n"})
+    assert_that(cache.has(url, sha), equal_to(False))
+    assert_that(cache.ensure(url, sha), equal_to(path))
+    assert_that(cache.has(url, sha), equal_to(True))
+
+    assert_that(cache.changed_files(url, sha), equal_to(["pkg/b.py"]))
+    assert_that(cache.read_blobs(url, sha, ["a.py", "pkg/b.py", "c.py"]),
+                equal_to({"a.py": b"A = 1\n", "pkg/b.py": b"B = 2\n",
+                          "c.py": None}))
+    assert_that(cache.list_commits(url, "HEAD~1..HEAD"), contains(sha))
+
+    with pytest.raises(MirrorError):
+        cache.ensure(url, "0" * 40)
+
+
+def test_worktree(upstream, tmpdir):
+    """The worktree is removed after the job."""
+    cache = MirrorCache(str(tmpdir.join("cache")))
+    url = "file://" + upstream
+    sha = cache.ensure(url) and _git(upstream, "rev-parse", "HEAD")
+
+    with cache.worktree(url, sha) as directory:
+        with open(os.path.join(directory, "a.py"), "rb") as fh:
+            assert_that(fh.read(), equal_to(b"A = 1\n"))
+    assert_that(os.path.exists(directory), equal_to(False))
+    assert_that(_git(cache.path(url), "worktree", "list").splitlines(),
+                has_length(1))
+
+
+def test_evict(upstream, tmpdir):
+    """The least recently used mirrors go first, unless in use."""
+    cache = MirrorCache(str(tmpdir.join("cache")))
+    urls = ["file://" + upstream, "file://" + upstream + "/."]
+    old, new = [cache.fetch(url) for url in urls]
+    os.utime(old, (1, 1))
+
+    with cache.use(urls[0]):
+        assert_that(cache.evict(budget=0), equal_to([new]))
+    assert_that(cache.mirrors(), contains(has_length(2)))
+    assert_that(cache.evict(budget=0), equal_to([old]))
+    assert_that(cache.evict(budget="1G"), equal_to([]))
+    assert_that(cache.mirrors(), equal_to([]))
+
+
+def test_budget(upstream, tmpdir):
+    """Fetching evicts the other mirrors over the budget."""
+    cache = MirrorCache(str(tmpdir.join("cache")), budget=1)
+    first = cache.fetch("file://" + upstream)
+    os.utime(first, (1, 1))
+    second = cache.fetch("file://" + upstream + "/.")
+    assert_that([path for _, path in cache.mirrors()],
+                equal_to([second]))
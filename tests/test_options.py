@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Tests of the options loading."""
+
+import os
+import pickle
+import shutil
+import tempfile
+from unittest import TestCase
+
+import yaml
+from hamcrest import assert_that, equal_to, instance_of, is_, is_not, none, \
+    not_none
+
+from kwalitee import options as options_module
+from kwalitee import state
+from kwalitee.options import Options, get_options, load_options, load_yaml
+
+
+class TestOptions(TestCase):
+    """Frozen options."""
+
+    def test_frozen(self):
+        """Lists and dicts are frozen, the options are hashable."""
+        options = Options({"excludes": ["a", "b"],
+                           "timeout": {"pep8": 10}})
+
+        assert_that(options["excludes"], equal_to(("a", "b")))
+        assert_that(options["timeout"], instance_of(Options))
+        assert_that(hash(options),
+                    equal_to(hash(Options(excludes=("a", "b"),
+                                          timeout={"pep8": 10}))))
+        assert_that(dict(**options)["timeout"]["pep8"], equal_to(10))
+
+        def _set():
+            options["pep8"] = False
+        self.assertRaises(TypeError, _set)
+
+    def test_merge(self):
+        """Merging returns new options."""
+        options = Options(pep8=True)
+        merged = options.merge({"pep8": False}, colors=False)
+
+        assert_that(options["pep8"], is_(True))
+        assert_that(merged, equal_to({"pep8": False, "colors": False}))
+        assert_that(pickle.loads(pickle.dumps(merged)), equal_to(merged))
+
+    def test_load_yaml_tuples(self):
+        """Configuration written by yaml.dump can be read back."""
+        dumped = yaml.dump({"components": ("global", "docs")})
+
+        assert_that(load_yaml(dumped)["components"],
+                    equal_to(("global", "docs")))
+
+
+class TestLoadOptions(TestCase):
+    """Options of a repository."""
+
+    def setUp(self):
+        """Create an empty repository."""
+        self.path = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.path, ".git"))
+        self.filename = os.path.join(self.path, ".kwalitee.yml")
+        options_module._options.clear()
+
+    def tearDown(self):
+        """Remove the repository."""
+        shutil.rmtree(self.path)
+        options_module._options.clear()
+
+    def _write(self, content, mtime):
+        with open(self.filename, "w") as fh:
+            fh.write(content)
+        os.utime(self.filename, (mtime, mtime))
+
+    def test_defaults(self):
+        """Without configuration file, the defaults are used."""
+        options = load_options(self.path)
+
+        assert_that(options, equal_to(Options(get_options())))
+        assert_that(load_options(self.path), is_(options))
+
+    def test_mtime_invalidation(self):
+        """The options are reloaded once the file is modified."""
+        self._write("pep8: false\n", 1000000000)
+        options = load_options(self.path)
+        assert_that(options["pep8"], is_(False))
+        assert_that(options["excludes"], equal_to(()))
+        assert_that(load_options(self.path), is_(options))
+
+        self._write("pep8: true\n", 1000000010)
+        assert_that(load_options(self.path)["pep8"], is_(True))
+
+    def test_disk_cache(self):
+        """A new process gets the options without parsing the file."""
+        self._write("excludes: ['(.)+/legacy/(.)+']\n", 1000000000)
+        options = load_options(self.path)
+
+        cached = os.path.join(state.get_state_directory(self.path),
+                              "options.pickle")
+        assert_that(os.path.exists(cached))
+
+        options_module._options.clear()
+        original, options_module.read_configuration = \
+            options_module.read_configuration, None
+        try:
+            assert_that(load_options(self.path), equal_to(options))
+        finally:
+            options_module.read_configuration = original
+
+    def test_no_repository(self):
+        """Outside of a git repository there is no disk cache."""
+        shutil.rmtree(os.path.join(self.path, ".git"))
+        directory = os.path.join(self.path, "a", "b")
+        os.makedirs(directory)
+
+        assert_that(state.get_git_directory(directory), is_(none()))
+        assert_that(load_options(directory), is_not(none()))
+
+
+def test_git_directory_file(tmpdir):
+    """Worktrees point to their git directory from a .git file."""
+    gitdir = tmpdir.mkdir("main").mkdir(".git").mkdir("worktrees").mkdir("wt")
+    worktree = tmpdir.mkdir("wt")
+    worktree.join(".git").write("gitdir: {0}\n".format(gitdir))
+
+    assert_that(state.get_git_directory(str(worktree.mkdir("sub"))),
+                equal_to(str(gitdir)))
+    assert_that(state.get_state_directory(str(worktree), create=True),
+                not_none())
+    assert_that(gitdir.join("kwalitee").check(dir=1))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Test of the checkers profiling."""
+
+import os
+import shutil
+import tempfile
+import time
+
+from hamcrest import assert_that, contains_string, equal_to, greater_than, \
+    has_entries, has_item, has_length, less_than
+
+from kwalitee import profiler
+from kwalitee.kwalitee import check_file
+
+
+def test_exclusive_times():
+    """Nested measures are not accounted twice."""
+    stats = profiler.Profiler()
+    with stats.measure("outer", "foo.py"):
+        with stats.measure("inner", "foo.py"):
+            time.sleep(0.05)
+
+    totals = stats.totals()
+    assert_that(totals, has_entries({"outer": has_length(3),
+                                     "inner": has_length(3)}))
+    assert_that(totals["inner"][1], greater_than(0.04))
+    assert_that(totals["outer"][1], less_than(0.04))
+    assert_that(stats.slowest_files(), has_length(1))
+    assert_that(stats.slowest_checks(1)[0][2], equal_to("inner"))
+
+
+def test_check_file_profile():
+    """The license checker is measured and reported by filename."""
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, "foo", "bar.js")
+        os.makedirs(os.path.dirname(filename))
+        with open(filename, "w") as fh:
+            fh.write("var foo = 42;\n")
+
+        profiler.start(top=5, cprofile=True)
+        check_file(filename, root=directory)
+        stats = profiler.stop()
+
+        assert_that(profiler.enabled(), equal_to(False))
+        assert_that(stats.totals(), has_entries({"license": has_length(3)}))
+        assert_that(stats.report(),
+                    has_item(contains_string(os.path.join("foo", "bar.js"))))
+
+        dumped = stats.dump_stats(os.path.join(directory, "stats"))
+        assert_that(dumped, has_length(1))
+        assert_that(os.path.exists(dumped[0]))
+    finally:
+        shutil.rmtree(directory)
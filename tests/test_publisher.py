@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the publishing of the results."""
+
+import time
+
+import pytest
+from fake_github import FakeGithub
+from hamcrest import assert_that, equal_to, has_entries, has_length, \
+    less_than, less_than_or_equal_to
+
+from kwalitee.github import Github
+from kwalitee.publisher import Publisher, file_comments
+from kwalitee.worker import get_config, get_job, run_job
+
+GOOD_MESSAGE = """base: fix of the frobnicator
+
+* FIX Fixes the frobnicator.
+
+Signed-off-by: Herp Derpson <herp.derpson@example.org>
+"""
+
+
+class FakeError(object):
+
+    def __init__(self, lineno, message):
+        self.lineno = lineno
+        self.message = message
+
+    def __str__(self):
+        return "{0}: {1}".format(self.lineno, self.message)
+
+
+@pytest.fixture
+def github(request):
+    """Fake API with a repository."""
+    fake = FakeGithub().start()
+    request.addfinalizer(fake.stop)
+    fake.base = fake.commit("acme/project", "base: initial", {
+        ".kwalitee.yml": b"license: false\npydocstyle: false\n",
+        "AUTHORS.rst": b"- Herp Derpson <herp.derpson@example.org>\n"})
+    return fake
+
+
+def test_file_comments():
+    """The comments of a file are batched in a review."""
+    file_errors = {"a.py": ([FakeError(1, "E1"), FakeError(1, "E2"),
+                             FakeError(3, "E3"), FakeError(9, "E9")],
+                            {1: 1, 3: 3}),
+                   "b.py": ([FakeError(2, "E2")], {2: 5})}
+
+    requests, count = file_comments("comments", "abc", file_errors,
+                                    reviews_url="reviews")
+    assert_that(count, equal_to(5))
+    assert_that(requests, equal_to([
+        ("reviews", {"commit_id": "abc", "event": "COMMENT", "comments": [
+            {"path": "a.py", "position": 1, "body": "1: E1\n1: E2"},
+            {"path": "a.py", "position": 3, "body": "3: E3"}]}),
+        ("reviews", {"commit_id": "abc", "event": "COMMENT", "comments": [
+            {"path": "b.py", "position": 5, "body": "2: E2"}]}),
+        ("comments", {"body": "a.py: 9: E9"})]))
+
+    requests, _ = file_comments("comments", "abc", file_errors)
+    assert_that(requests, has_length(4))
+    assert_that(requests[0], equal_to(("comments", {
+        "commit_id": "abc", "path": "a.py", "position": 1,
+        "body": "1: E1\n1: E2"})))
+
+
+def test_post_throughput(github):
+    """The requests are posted at the same time over few connections."""
+    github.latency = 0.05
+    client = Github(github.url, connections=4)
+    publisher = Publisher(client, {"GITHUB_CONNECTIONS": 4})
+    url = "repos/acme/project/statuses/" + github.base
+    start = time.time()
+    publisher.post([publisher.status(url, "success", str(number))
+                    for number in range(40)])
+    elapsed = time.time() - start
+    client.close()
+
+    assert_that(github.statuses[github.base], has_length(40))
+    assert_that(github.connections, less_than_or_equal_to(4))
+    # one at a time would take 2 seconds
+    assert_that(elapsed, less_than(1.5))
+
+
+def test_post_errors():
+    """The requests left are posted before the first error is raised."""
+    class FailingGithub(object):
+
+        def __init__(self):
+            self.posted = []
+
+        def post(self, url, data):
+            if url.startswith("bad"):
+                raise IOError(url)
+            self.posted.append(url)
+
+    client = FailingGithub()
+    publisher = Publisher(client, {"GITHUB_CONNECTIONS": 2})
+    requests = [("bad", {})]
+    requests += [("good{0}".format(number), {}) for number in range(10)]
+    with pytest.raises(IOError) as excinfo:
+        publisher.post(requests)
+
+    assert_that(str(excinfo.value), equal_to("bad"))
+    assert_that(client.posted, has_length(10))
+
+
+def test_label(github):
+    """The label is replaced only if it changed."""
+    publisher = Publisher(Github(github.url), get_config())
+    github.labels[("acme/project", 1)] = ["bug", "in_work"]
+    issue = github.url + "repos/acme/project/issues/1"
+
+    publisher.label(issue, "in_review")
+    assert_that(github.labels[("acme/project", 1)],
+                equal_to(["bug", "in_review"]))
+    publisher.label(issue, "in_review")
+    assert_that([method for method, _ in github.requests],
+                equal_to(["GET", "PUT", "GET"]))
+
+
+def test_run_job_many_files(github):
+    """Each file of a large pull request is reviewed by one request."""
+    head = github.commit("acme/project", GOOD_MESSAGE, dict(
+        ("frobnicator{0}.py".format(number), b"A=1\nB=2\nC=3\n")
+        for number in range(30)), parent=github.base)
+    job = get_job("pull_request", github.pull_request(
+        "acme/project", 1, github.base, head))
+    client = Github(github.url)
+
+    report = run_job(job, client, {"WORKER_BATCH_SIZE": 10})
+    client.close()
+
+    assert_that(report, has_entries({"state": "error", "errors": 90}))
+    assert_that(github.reviews, has_length(30))
+    assert_that(github.comments[head], has_length(90))
+    assert_that(github.connections, less_than_or_equal_to(4))
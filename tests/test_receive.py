@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the checks of the pushed commits."""
+
+import io
+import os
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+from hamcrest import assert_that, contains, contains_string, equal_to, \
+    greater_than, has_item, has_length, is_not, less_than
+
+import kwalitee
+from kwalitee.options import Options, get_options
+from kwalitee.receive import _run, check_push, read_updates
+
+GOOD_MESSAGE = """base: fix of the frobnicator {0}
+
+* FIX Fixes the frobnicator.
+
+Signed-off-by: Herp Derpson <herp.derpson@example.org>
+"""
+
+ZERO = "0" * 40
+
+
+def _git(repository, *args, **kwargs):
+    return subprocess.check_output(("git",) + args, cwd=repository,
+                                   **kwargs).decode("utf-8").strip()
+
+
+def _commit(repository, message, files):
+    for name, content in files.items():
+        path = os.path.join(repository, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as fh:
+            fh.write(content)
+        _git(repository, "add", name)
+    _git(repository, "commit", "-q", "-m", message)
+    return _git(repository, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def repositories(tmpdir):
+    """Client with a commit and its bare server."""
+    client = str(tmpdir.mkdir("client"))
+    server = str(tmpdir.join("server.git"))
+    _git(str(tmpdir), "init", "-q", "--bare", server)
+    _git(client, "init", "-q")
+    _git(client, "config", "user.name", "Herp Derpson")
+    _git(client, "config", "user.email", "herp.derpson@example.org")
+    _commit(client, GOOD_MESSAGE.format(0), {
+        "AUTHORS.rst": b"- Herp Derpson <herp.derpson@example.org>\n"})
+    _git(client, "push", "-q", server, "HEAD:refs/heads/master")
+    with open(os.path.join(server, ".kwalitee.yml"), "w") as fh:
+        fh.write("license: false\npydocstyle: false\n")
+    return client, server
+
+
+def _fetch(client, server, revision):
+    """Get the objects of the commits without any reference to them."""
+    _git(server, "fetch", "-q", client, revision + ":refs/heads/tmp")
+    _git(server, "update-ref", "-d", "refs/heads/tmp")
+
+
+def _options(**kwargs):
+    return Options(get_options(), license=False, pydocstyle=False, **kwargs)
+
+
+def test_read_updates():
+    """The deleted references are left out."""
+    stream = io.BytesIO("{0} {1} refs/heads/a\n{1} {0} refs/heads/b\n"
+                        "\n".format(ZERO, "a" * 40).encode("ascii"))
+    assert_that(read_updates(stream),
+                equal_to([(ZERO, "a" * 40, "refs/heads/a")]))
+
+
+def test_check_push(repositories):
+    """The new commits are checked once, each version of a file once."""
+    client, server = repositories
+    base = _git(client, "rev-parse", "HEAD")
+    first = _commit(client, "Fixed stuff", {"a.py": b"A=1\n"})
+    second = _commit(client, GOOD_MESSAGE.format(2), {"b.py": b"B = 2\n"})
+    third = _commit(client, GOOD_MESSAGE.format(3), {"a.py": b"A = 1\n"})
+    _fetch(client, server, third)
+
+    report = check_push([(base, third, "refs/heads/master"),
+                         (ZERO, third, "refs/heads/copy"),
+                         (ZERO, second, "refs/tags/v1")],
+                        _options(), git_dir=server, processes=1,
+                        batch_size=1)
+
+    assert_that(bool(report), equal_to(False))
+    assert_that([commit.sha for commit in report.commits],
+                contains(first, second, third))
+    assert_that(report.errors[first], has_item(contains_string("M110")))
+    assert_that(report.errors[first][-1],
+                contains_string("a.py: 1:2: E225"))
+    assert_that(report.errors[second], equal_to([]))
+    assert_that(report.errors[third], equal_to([]))
+
+    _git(server, "update-ref", "refs/heads/master", third)
+    assert_that(check_push([(base, third, "refs/heads/master")],
+                           _options(), git_dir=server).commits,
+                equal_to([]))
+
+
+def test_check_push_authors(repositories):
+    """The authors are looked up in the files of each commit."""
+    client, server = repositories
+    base = _git(client, "rev-parse", "HEAD")
+    _git(client, "config", "user.name", "Derp Herpson")
+    _git(client, "config", "user.email", "derp.herpson@example.org")
+    first = _commit(client, GOOD_MESSAGE.format(1), {"a.txt": b"a\n"})
+    second = _commit(client, GOOD_MESSAGE.format(2), {
+        "AUTHORS.rst": b"- Herp Derpson <herp.derpson@example.org>\n"
+                       b"- Derp Herpson <derp.herpson@example.org>\n"})
+    _fetch(client, server, second)
+
+    report = check_push([(base, second, "refs/heads/master")],
+                        _options(authors=["AUTHORS.rst"]), git_dir=server)
+
+    assert_that(report.errors[first], has_length(1))
+    assert_that(report.errors[first][0], contains_string("A102"))
+    assert_that(report.errors[second], equal_to([]))
+
+
+def test_run_budget():
+    """A single task over budget is stopped, even with one process."""
+    start = time.time()
+    outcomes = _run([(time.sleep, 30)], 1, 0.5, start)
+
+    assert_that(outcomes, equal_to([None]))
+    assert_that(time.time() - start, less_than(10))
+    assert_that(_run([(abs, -1)], 1, None, time.time()), equal_to([1]))
+
+
+def test_check_push_budget(repositories):
+    """The checks left when the budget is spent refuse the push."""
+    client, server = repositories
+    base = _git(client, "rev-parse", "HEAD")
+    head = _commit(client, GOOD_MESSAGE.format(1), {"a.py": b"A = 1\n"})
+    _fetch(client, server, head)
+
+    report = check_push([(base, head, "refs/heads/master")], _options(),
+                        git_dir=server, processes=2, budget=0)
+
+    assert_that(report.unchecked, greater_than(0))
+    assert_that(bool(report), equal_to(False))
+    assert_that(list(report.lines())[-1], contains_string("time budget"))
+
+
+def _install_hook(server, *args):
+    hook = os.path.join(server, "hooks", "pre-receive")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(
+        kwalitee.__file__)))
+    with open(hook, "w") as fh:
+        fh.write("#!/bin/sh\nPYTHONPATH={0} exec {1} -c 'from kwalitee.hooks "
+                 "import pre_receive_hook; pre_receive_hook()' {2}\n".format(
+                     root, sys.executable, " ".join(args)))
+    os.chmod(hook, os.stat(hook).st_mode | stat.S_IEXEC)
+
+
+def _push(client, server, *args):
+    p = subprocess.Popen(("git", "push", server) + args, cwd=client,
+                         stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output, _ = p.communicate()
+    return p.returncode, output.decode("utf-8")
+
+
+def test_pre_receive_hook(repositories):
+    """The pushes of commits with errors are refused."""
+    client, server = repositories
+    _install_hook(server)
+    _commit(client, GOOD_MESSAGE.format(1), {"a.py": b"A=1\n"})
+
+    status, output = _push(client, server, "HEAD:refs/heads/master")
+    assert_that(status, is_not(equal_to(0)))
+    assert_that(output, contains_string("a.py: 1:2: E225"))
+    assert_that(output, contains_string("pre-receive hook declined"))
+
+    _git(client, "reset", "-q", "--hard", "HEAD~1")
+    _commit(client, GOOD_MESSAGE.format(2), {"a.py": b"A = 1\n"})
+    status, output = _push(client, server, "HEAD:refs/heads/master",
+                           "HEAD:refs/heads/copy")
+    assert_that(status, equal_to(0), output)
+
+
+def test_pre_receive_hook_many_commits(repositories):
+    """A branch of a thousand commits is checked in seconds."""
+    client, server = repositories
+    _install_hook(server)
+    parent = _git(client, "rev-parse", "HEAD")
+    stream = []
+    for number in range(1000):
+        message = GOOD_MESSAGE.format(number).encode("utf-8")
+        content = "\"\"\"Frobnicator.\"\"\"\n\nFROBNICATOR = {0}\n".format(
+            number).encode("ascii")
+        stream.append(
+            "commit refs/heads/master\nmark :{0}\ncommitter Herp Derpson "
+            "<herp.derpson@example.org> {1} +0000\ndata {2}\n".format(
+                number + 1, 1500000000 + number,
+                len(message)).encode("ascii") + message)
+        stream.append("from {0}\n".format(
+            ":{0}".format(number) if number else parent).encode("ascii"))
+        stream.append("M 100644 inline frobnicator{0}/__init__.py\n"
+                      "data {1}\n".format(number % 50,
+                                          len(content)).encode("ascii") +
+                      content + b"\n")
+    p = subprocess.Popen(("git", "fast-import", "--quiet", "--force"),
+                         cwd=client, stdin=subprocess.PIPE)
+    p.communicate(b"".join(stream))
+    assert_that(_git(client, "rev-list", "--count", "master"),
+                equal_to("1001"))
+
+    start = time.time()
+    status, output = _push(client, server, "master:refs/heads/master")
+    assert_that(status, equal_to(0), output)
+    assert_that(time.time() - start, less_than(30))
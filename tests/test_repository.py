@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Tests of the in process access to the repository."""
+
+import subprocess
+
+import pytest
+from hamcrest import assert_that, contains_inanyorder, equal_to, is_, none
+
+from kwalitee import profiler
+from kwalitee.repository import get_author, get_commit_message, get_config, \
+    get_staged_files, read_git_config, resolve_ref
+
+
+@pytest.fixture
+def repository(tmpdir, monkeypatch):
+    """Empty repository, isolated from the user configuration."""
+    for name in ("GIT_DIR", "GIT_AUTHOR_NAME", "GIT_AUTHOR_EMAIL",
+                 "GIT_CONFIG_PARAMETERS", "GIT_CONFIG_COUNT",
+                 "GIT_CONFIG_GLOBAL", "XDG_CONFIG_HOME"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HOME", str(tmpdir))
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+
+    path = tmpdir.mkdir("repository")
+    subprocess.check_call(["git", "init", "-q", str(path)])
+    monkeypatch.chdir(path)
+    return path
+
+
+def test_read_git_config(tmpdir):
+    """Sections, quotes and comments are understood."""
+    config = tmpdir.join("config")
+    config.write('[core]\n\tbare = false\n'
+                 '[user]\n\tname = "John \\"Jo\\" Doe" ; nickname\n'
+                 '\temail = john@example.org # work\n'
+                 '[remote "origin"]\n\turl = file:///tmp\n')
+
+    assert_that(read_git_config(str(config), ("user.name", "user.email",
+                                              "remote.origin.url")),
+                equal_to({"user.name": 'John "Jo" Doe',
+                          "user.email": "john@example.org",
+                          "remote.origin.url": "file:///tmp"}))
+
+    config.write('[include]\n\tpath = other\n')
+    assert_that(read_git_config(str(config), ("user.name", )), is_(none()))
+
+
+def test_get_author_from_config(repository, tmpdir):
+    """The repository configuration overrides the global one."""
+    tmpdir.join(".gitconfig").write("[user]\n\tname = Global\n"
+                                    "\temail = global@example.org\n")
+    repository.join(".git", "config").write("[user]\n\tname = Local\n",
+                                            mode="a")
+
+    profiler.start()
+    author = get_author()
+    stats = profiler.stop()
+
+    assert_that(author, equal_to("Local <global@example.org>"))
+    assert_that(stats.entries, equal_to({}))
+
+
+def test_get_author_from_environment(repository, monkeypatch):
+    """Git environment variables have the priority."""
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "Env")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "env@example.org")
+
+    assert_that(get_author(), equal_to("Env <env@example.org>"))
+
+
+def test_get_author_fallback(repository, monkeypatch):
+    """Configuration given on the command line is left to git."""
+    monkeypatch.setenv("GIT_CONFIG_PARAMETERS",
+                       "'user.name'='Cli' 'user.email'='cli@example.org'")
+
+    assert_that(get_config(("user.name", )), is_(none()))
+    assert_that(get_author(), equal_to("Cli <cli@example.org>"))
+
+
+def test_get_staged_files(repository, monkeypatch):
+    """Deleted files are not listed."""
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "A")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "a@example.org")
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "A")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "a@example.org")
+    repository.join("old.py").write("")
+    repository.join("kept.py").write("")
+    subprocess.check_call(["git", "add", "."])
+    subprocess.check_call(["git", "commit", "-q", "-m", "init"])
+
+    repository.join("kept.py").write("x = 1\n")
+    repository.mkdir("docs").join("index.rst").write("")
+    subprocess.check_call(["git", "rm", "-q", "old.py"])
+    subprocess.check_call(["git", "add", "."])
+
+    assert_that(get_staged_files(),
+                contains_inanyorder("kept.py", "docs/index.rst"))
+
+
+def test_resolve_ref(repository, monkeypatch):
+    """Short names are looked up like git does, the rest by rev-parse."""
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "A")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "a@example.org")
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "A")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "a@example.org")
+    shas = []
+    for message in ("first", "second"):
+        subprocess.check_call(["git", "commit", "-q", "--allow-empty",
+                               "-m", message])
+        shas.append(subprocess.check_output(
+            ["git", "rev-parse", "HEAD"]).decode("ascii").strip())
+    subprocess.check_call(["git", "tag", "v1.0", shas[0]])
+    subprocess.check_call(["git", "branch", "-q", "stable", shas[0]])
+    subprocess.check_call(["git", "pack-refs", "--all"])
+    subprocess.check_call(["git", "branch", "-q", "config", shas[0]])
+    branch = subprocess.check_output(
+        ["git", "rev-parse", "--abbrev-ref", "HEAD"]).decode("ascii").strip()
+
+    profiler.start()
+    assert_that(resolve_ref(branch), equal_to(shas[1]))
+    assert_that(resolve_ref("v1.0"), equal_to(shas[0]))
+    assert_that(resolve_ref("stable"), equal_to(shas[0]))
+    assert_that(resolve_ref("config"), equal_to(shas[0]))
+    assert_that(profiler.stop().entries, equal_to({}))
+
+    assert_that(resolve_ref("HEAD~1"), equal_to(shas[0]))
+    assert_that(resolve_ref("description"), is_(none()))
+
+
+def test_get_commit_message(repository, monkeypatch):
+    """The last commit is read in process, packed ones with git."""
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "A")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "a@example.org")
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "A")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "a@example.org")
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m",
+                           u"global: ünicode\n\nSigned-off-by: A"])
+    sha = subprocess.check_output(["git", "rev-parse", "HEAD"])
+    sha = sha.decode("ascii").strip()
+
+    profiler.start()
+    assert_that(resolve_ref("HEAD"), equal_to(sha))
+    assert_that(get_commit_message("HEAD"),
+                equal_to((sha, u"global: ünicode\n\nSigned-off-by: A\n")))
+    assert_that(profiler.stop().entries, equal_to({}))
+
+    subprocess.check_call(["git", "gc", "-q"])
+    assert_that(resolve_ref("HEAD"), equal_to(sha))
+    assert_that(get_commit_message(sha),
+                equal_to((sha, u"global: ünicode\n\nSigned-off-by: A\n")))
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Tests of the results shared by the hooks and the command-line tools."""
+
+import os
+import subprocess
+
+import pytest
+from click.testing import CliRunner
+from hamcrest import assert_that, contains_string, equal_to, has_item, \
+    has_length, is_, none, not_
+
+from kwalitee import results
+from kwalitee.hooks import post_commit_hook, pre_commit_hook
+from kwalitee.options import Options, load_options
+
+
+@pytest.fixture
+def repository(tmpdir, monkeypatch):
+    """Repository with a first commit."""
+    for name in ("GIT_DIR", "GIT_INDEX_FILE", "GIT_CONFIG_PARAMETERS"):
+        monkeypatch.delenv(name, raising=False)
+    for name in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(name + "_NAME", "A")
+        monkeypatch.setenv(name + "_EMAIL", "a@example.org")
+    path = tmpdir.mkdir("repository")
+    monkeypatch.chdir(path)
+    subprocess.check_call(["git", "init", "-q"])
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m",
+                           "global: initial commit"])
+    return path
+
+
+def test_fingerprint():
+    """Only the options changing the results change the fingerprint."""
+    policy = results.fingerprint(Options(ignore=("E123", ), colors=True))
+
+    assert_that(results.fingerprint({"ignore": ["E123"], "colors": False}),
+                equal_to(policy))
+    assert_that(results.fingerprint({"ignore": ["E123"], "root": "/tmp"}),
+                equal_to(policy))
+    assert_that(results.fingerprint({"ignore": ["E124"]}),
+                is_(not_(equal_to(policy))))
+    assert_that(results.fingerprint({"ignore": ["E123"]}, results.MESSAGE),
+                is_(not_(equal_to(policy))))
+
+
+def test_blob_id(tmpdir):
+    """The content is known by its git blob id."""
+    filename = tmpdir.join("a.py")
+    filename.write_binary(b"import os\n")
+    sha = subprocess.check_output(["git", "hash-object", str(filename)])
+
+    assert_that(results.blob_id(b"import os\n"),
+                equal_to(sha.decode("ascii").strip()))
+
+
+def test_store(tmpdir):
+    """The errors are checked once per key."""
+    store = results.ResultStore(str(tmpdir.join("results")))
+    calls = []
+
+    def check(value):
+        calls.append(value)
+        return ["1: E000 {0}".format(value)]
+
+    key = results.message_key(u"global: ünicode", "policy")
+    assert_that(store.get(key), is_(none()))
+    assert_that(store.cached(key, check, "a"), equal_to(["1: E000 a"]))
+    assert_that(store.cached(key, check, "b"), equal_to(["1: E000 a"]))
+    assert_that(calls, has_length(1))
+
+    store.set(results.file_key("a.py", "0" * 40, "policy"), [])
+    store.prune(keep=1)
+    assert_that(store.get(key), is_(none()))
+    assert_that(store.get(results.file_key("a.py", "0" * 40, "policy")),
+                equal_to([]))
+
+
+def test_hooks_handoff(repository):
+    """The results of the hooks are recorded for the next stages."""
+    repository.join(".kwalitee.yml").write("license: false\n"
+                                           "pydocstyle: false\n")
+    repository.join("a.py").write("import os\n")
+    subprocess.check_call(["git", "add", "a.py"])
+
+    runner = CliRunner()
+    result = runner.invoke(pre_commit_hook, [])
+    assert_that(result.exit_code, equal_to(1))
+
+    store = results.get_store()
+    options = load_options()
+    key = results.file_key("a.py", results.blob_id(b"import os\n"),
+                           results.fingerprint(options))
+    assert_that(store.get(key), has_item(contains_string("F401")))
+
+    # a result is trusted as long as the content and the policy are the same
+    store.set(key, [])
+    result = runner.invoke(pre_commit_hook, [])
+    assert_that(result.exit_code, equal_to(0))
+
+    subprocess.check_call(["git", "commit", "-q", "--no-verify", "-m",
+                           "wrong message"])
+    result = runner.invoke(post_commit_hook, [])
+    assert_that(result.output, contains_string("M110"))
+    key = results.message_key(u"wrong message\n", results.fingerprint(
+        options, results.MESSAGE))
+    assert_that(store.get(key), has_item(contains_string("M110")))
+    assert_that(os.path.isdir(os.path.join(".git", "kwalitee", "results")))
+
+
+def test_hooks_large_file(repository):
+    """A file too large to be fully checked is reported, not refused."""
+    repository.join(".kwalitee.yml").write("license: false\n"
+                                           "pydocstyle: false\n"
+                                           "max_file_size: 10\n")
+    repository.join("a.py").write("import os\n\nos.getcwd()\n")
+    subprocess.check_call(["git", "add", "a.py"])
+
+    result = CliRunner().invoke(pre_commit_hook, [])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that(result.output, contains_string("a.py: 1: K110"))
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the fair share between the repositories."""
+
+import threading
+
+import pytest
+from hamcrest import assert_that, equal_to, greater_than_or_equal_to, \
+    has_entries, less_than_or_equal_to
+
+from kwalitee.scheduler import FairQueue, FairScheduler
+
+
+def _drain(queue):
+    items = []
+    while True:
+        try:
+            items.append(queue.get()[1])
+        except IndexError:
+            return items
+
+
+def test_fair_queue_round_robin():
+    """A small tenant does not wait for the large one."""
+    queue = FairQueue()
+    for number in range(4):
+        queue.put("big", "big{0}".format(number))
+    queue.put("small", "small0")
+    queue.put("small", "small1")
+
+    assert_that(len(queue), equal_to(6))
+    assert_that(queue.depth("big"), equal_to(4))
+    assert_that(_drain(queue), equal_to(
+        ["big0", "small0", "big1", "small1", "big2", "big3"]))
+
+
+def test_fair_queue_weights():
+    """A tenant weighing twice as much is served twice as often."""
+    queue = FairQueue(weights={"heavy": 2})
+    for number in range(4):
+        queue.put("heavy", "h{0}".format(number))
+        queue.put("light", "l{0}".format(number))
+
+    served = [item[0] for item in _drain(queue)]
+    assert_that(served[:6].count("h"), equal_to(4))
+    assert_that(served[:3].count("l"), equal_to(1))
+
+
+def test_fair_queue_idle_tenant():
+    """A tenant idle for a while gets no credit for it."""
+    queue = FairQueue()
+    for number in range(5):
+        queue.put("busy", "b{0}".format(number))
+        queue.get()
+    for number in range(5):
+        queue.put("idle", "i{0}".format(number))
+    queue.put("busy", "b5")
+
+    assert_that(_drain(queue).index("b5"), less_than_or_equal_to(2))
+
+
+def test_fair_queue_stats():
+    """The depth and the wait times are kept by tenant."""
+    queue = FairQueue()
+    queue.put("a", 1)
+    queue.put("a", 2)
+    queue.get()
+
+    assert_that(queue.stats()["a"], has_entries({
+        "queued": 1, "served": 1,
+        "wait_max": greater_than_or_equal_to(0)}))
+    with pytest.raises(IndexError):
+        FairQueue().get()
+
+
+def test_fair_scheduler():
+    """The tasks of the tenants are interleaved."""
+    gate = threading.Event()
+    order = []
+
+    def task(name):
+        gate.wait(10)
+        order.append(name)
+        return name
+
+    # the futures backport is needed on Python 2
+    executor = pytest.importorskip(
+        "concurrent.futures").ThreadPoolExecutor(max_workers=1)
+    scheduler = FairScheduler(executor, slots=1)
+    big = scheduler.tenant("big")
+    futures = [big.submit(task, "big{0}".format(number))
+               for number in range(4)]
+    futures += [scheduler.submit("small", task, "small{0}".format(number))
+                for number in range(2)]
+    cancelled = scheduler.submit("small", task, "cancelled")
+    assert_that(cancelled.cancel(), equal_to(True))
+
+    gate.set()
+    assert_that([future.result(10) for future in futures], equal_to(
+        ["big0", "big1", "big2", "big3", "small0", "small1"]))
+    executor.shutdown()
+    assert_that(order, equal_to(
+        ["big0", "small0", "big1", "small1", "big2", "big3"]))
+    assert_that(scheduler.stats()["small"], has_entries({"served": 3}))
+
+
+def test_fair_scheduler_errors():
+    """The exceptions of the tasks are given to their future."""
+    executor = pytest.importorskip(
+        "concurrent.futures").ThreadPoolExecutor(max_workers=1)
+    scheduler = FairScheduler(executor, slots=1)
+    future = scheduler.submit("a", int, "nan")
+    with pytest.raises(ValueError):
+        future.result(10)
+    assert_that(scheduler.running, equal_to(0))
+    executor.shutdown()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Tests of the background checks."""
+
+import os
+import subprocess
+import time
+
+import pytest
+from click.testing import CliRunner
+from hamcrest import assert_that, contains_string, equal_to, has_entries, \
+    has_item, has_length, is_, none
+
+from kwalitee import status
+from kwalitee.cli.status import status as status_command
+from kwalitee.hooks import post_commit_hook, pre_commit_hook
+
+pytestmark = pytest.mark.skipif(not status.can_fork(),
+                                reason="background jobs need fork")
+
+
+def _slow(seconds, errors):
+    time.sleep(seconds)
+    return errors
+
+
+def _fail():
+    raise ValueError("boom")
+
+
+@pytest.fixture
+def store(tmpdir):
+    return status.StatusStore(str(tmpdir.join("status")))
+
+
+def test_store(store):
+    """Records are kept by key, the most recent first."""
+    store.set("a", state=status.DONE, errors=[])
+    store.set("b", state=status.RUNNING)
+    store.update("a", errors=["1: M100 needs more reviewers"])
+
+    assert_that(store.get("a"), has_entries({"state": status.DONE,
+                                             "errors": has_length(1)}))
+    assert_that([r["key"] for r in store.list()], equal_to(["a", "b"]))
+
+    store.prune(keep=1)
+    assert_that(store.get("b"), is_(none()))
+
+
+def test_concurrent_updates(store):
+    """The updates of two processes are not lost."""
+    store.set("a", state=status.RUNNING)
+    pid = os.fork()
+    if not pid:
+        try:
+            for index in range(100):
+                store.update("a", job=index)
+        finally:
+            os._exit(0)
+    for index in range(100):
+        store.update("a", commit=index)
+    os.waitpid(pid, 0)
+
+    assert_that(store.get("a"), has_entries({"job": 99, "commit": 99}))
+    assert_that(store.update("a", states=(status.PENDING, ),
+                             state=status.DONE), is_(none()))
+    assert_that(store.get("a"), has_entries({"state": status.RUNNING}))
+
+
+def test_spawn(store):
+    """The job runs detached and records its errors."""
+    pid = status.spawn(store, "sha", _slow, (0, ["error"]), slot="test")
+
+    assert_that(pid, is_(int))
+    record = status.wait(store, "sha", timeout=10)
+    assert_that(record, has_entries({"state": status.DONE,
+                                     "errors": ["error"], "pid": pid}))
+    assert_that(store.get_slot("test"), is_(none()))
+
+
+def test_spawn_failure(store):
+    """A failing job is recorded as such."""
+    status.spawn(store, "sha", _fail, slot="test")
+
+    record = status.wait(store, "sha", timeout=10)
+    assert_that(record, has_entries({"state": status.FAILED,
+                                     "errors": has_item(
+                                         contains_string("boom"))}))
+
+
+def test_newer_job_cancels_stale_one(store):
+    """Only the last job of a slot runs to completion."""
+    first = status.spawn(store, "old", _slow, (30, ["old"]), slot="test")
+    status.spawn(store, "new", _slow, (0, ["new"]), slot="test")
+
+    assert_that(store.get("old"), has_entries({"state": status.CANCELLED}))
+    assert_that(status.wait(store, "new", timeout=10),
+                has_entries({"state": status.DONE, "errors": ["new"]}))
+
+    for _ in range(100):
+        if not status.is_alive(first):
+            break
+        time.sleep(0.05)
+    assert_that(status.is_alive(first), is_(False))
+    assert_that(store.get("old"), has_entries({"state": status.CANCELLED}))
+
+
+def test_background_post_commit(tmpdir, monkeypatch):
+    """The post-commit hook returns at once, the status tells the errors."""
+    for name in ("GIT_DIR", "GIT_CONFIG_PARAMETERS"):
+        monkeypatch.delenv(name, raising=False)
+    for name in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(name + "_NAME", "A")
+        monkeypatch.setenv(name + "_EMAIL", "a@example.org")
+    repository = tmpdir.mkdir("repository")
+    monkeypatch.chdir(repository)
+    subprocess.check_call(["git", "init", "-q"])
+    repository.join(".kwalitee.yml").write("post_commit_background: true\n")
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m",
+                           "wrong message"])
+    sha = subprocess.check_output(["git", "rev-parse", "HEAD"])
+    sha = sha.decode("ascii").strip()
+
+    runner = CliRunner()
+    result = runner.invoke(post_commit_hook, [])
+    assert_that(result.exit_code, equal_to(0))
+
+    result = runner.invoke(status_command, ["--wait"])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output, contains_string(
+        "message {0}: done".format(sha)))
+    assert_that(result.output, contains_string("M110"))
+
+    result = runner.invoke(status_command, [sha[:7]])
+    assert_that(result.output, contains_string(sha))
+    assert_that(os.path.isdir(os.path.join(".git", "kwalitee", "status")))
+
+
+def test_pre_commit_budget(tmpdir, monkeypatch):
+    """The files left when the budget is spent are checked after the hook."""
+    for name in ("GIT_DIR", "GIT_INDEX_FILE", "GIT_CONFIG_PARAMETERS"):
+        monkeypatch.delenv(name, raising=False)
+    for name in ("GIT_AUTHOR", "GIT_COMMITTER"):
+        monkeypatch.setenv(name + "_NAME", "A")
+        monkeypatch.setenv(name + "_EMAIL", "a@example.org")
+    repository = tmpdir.mkdir("repository")
+    monkeypatch.chdir(repository)
+    subprocess.check_call(["git", "init", "-q"])
+    subprocess.check_call(["git", "commit", "-q", "--allow-empty", "-m",
+                           "global: initial commit"])
+    repository.join(".kwalitee.yml").write("pre_commit_budget: 0\n"
+                                           "license: false\n"
+                                           "pydocstyle: false\n")
+    repository.join("a.py").write("import os\n")
+    subprocess.check_call(["git", "add", "a.py"])
+
+    runner = CliRunner()
+    result = runner.invoke(pre_commit_hook, [])
+    assert_that(result.exit_code, equal_to(0))
+    assert_that(result.output, contains_string("1 file(s) left to check"))
+
+    subprocess.check_call(["git", "commit", "-q", "--no-verify", "-m",
+                           "global: a"])
+    result = runner.invoke(status_command, ["--wait"])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output, contains_string("files "))
+    assert_that(result.output, contains_string("F401"))
+
+    result = runner.invoke(post_commit_hook, [])
+    assert_that(result.output, contains_string("F401"))
+    assert_that(result.output, contains_string("git commit --amend"))
+
+
+def test_pre_commit_budget_inline_errors(tmpdir, monkeypatch):
+    """The license is checked within the hook, whatever the budget."""
+    for name in ("GIT_DIR", "GIT_INDEX_FILE", "GIT_CONFIG_PARAMETERS"):
+        monkeypatch.delenv(name, raising=False)
+    repository = tmpdir.mkdir("repository")
+    monkeypatch.chdir(repository)
+    subprocess.check_call(["git", "init", "-q"])
+    subprocess.check_call(["git", "-c", "user.name=A", "-c",
+                           "user.email=a@example.org", "commit", "-q",
+                           "--allow-empty", "-m", "global: initial commit"])
+    repository.join(".kwalitee.yml").write("pre_commit_budget: 0\n")
+    repository.join("a.py").write("import os\n")
+    subprocess.check_call(["git", "add", "a.py"])
+
+    result = CliRunner().invoke(pre_commit_hook, [])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output, contains_string("L101"))
+    assert_that(os.path.isdir(os.path.join(".git", "kwalitee", "status")),
+                is_(False))
+
+
+def test_pre_commit_budget_templates(tmpdir, monkeypatch):
+    """The files checked only for the license are not checked twice."""
+    for name in ("GIT_DIR", "GIT_INDEX_FILE", "GIT_CONFIG_PARAMETERS"):
+        monkeypatch.delenv(name, raising=False)
+    repository = tmpdir.mkdir("repository")
+    monkeypatch.chdir(repository)
+    subprocess.check_call(["git", "init", "-q"])
+    subprocess.check_call(["git", "-c", "user.name=A", "-c",
+                           "user.email=a@example.org", "commit", "-q",
+                           "--allow-empty", "-m", "global: initial commit"])
+    repository.join(".kwalitee.yml").write("pre_commit_budget: 60\n")
+    repository.join("a.js").write("var a = 1;\n")
+    repository.join("a.html").write("<p>a</p>\n")
+    subprocess.check_call(["git", "add", "a.js", "a.html"])
+
+    result = CliRunner().invoke(pre_commit_hook, [])
+    assert_that(result.exit_code, equal_to(1))
+    assert_that(result.output.count("a.js: 1: L101"), equal_to(1))
+    assert_that(result.output.count("a.html: 1: L101"), equal_to(1))
+    assert_that(os.path.isdir(os.path.join(".git", "kwalitee", "status")),
+                is_(False))
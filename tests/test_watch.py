@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Tests of the watch mode."""
+
+import os
+import subprocess
+import time
+
+import pytest
+from hamcrest import assert_that, contains, contains_string, equal_to, \
+    has_item, has_items, instance_of, is_
+
+from kwalitee.watch import InotifyWatcher, PollingWatcher, diff_errors, \
+    get_watcher, watch
+
+try:
+    import inotify_simple  # noqa
+    inotify = True
+except ImportError:
+    inotify = False
+
+
+@pytest.fixture
+def root(tmpdir, monkeypatch):
+    """Working tree with a clean file."""
+    monkeypatch.delenv("GIT_DIR", raising=False)
+    path = tmpdir.mkdir("repository")
+    subprocess.check_call(["git", "init", "-q", str(path)])
+    path.join(".kwalitee.yml").write("license: false\npydocstyle: false\n")
+    path.join("a.py").write("import os\n\nos.getcwd()\n")
+    return str(path)
+
+
+class ScriptedWatcher(object):
+    """Modify the files instead of waiting for it."""
+
+    def __init__(self, root, steps):
+        self.root = root
+        self.steps = list(steps)
+
+    def wait(self, timeout=None):
+        if timeout is not None:
+            # the burst is over
+            return set()
+        changed = set()
+        for filename, content in self.steps.pop(0):
+            path = os.path.join(self.root, filename)
+            if content is None:
+                os.remove(path)
+            else:
+                with open(path, "w") as fh:
+                    fh.write(content)
+            changed.add(filename)
+        return changed
+
+    def close(self):
+        pass
+
+
+def test_diff_errors():
+    """Only the files whose errors changed are reported."""
+    previous = {"a.py": ["1: E1"], "b.py": [], "c.py": ["1: E3"]}
+    current = {"a.py": ["1: E1"], "b.py": ["2: E2"], "d.py": None}
+
+    assert_that(diff_errors(previous, current),
+                equal_to([("b.py", ["2: E2"]), ("c.py", [])]))
+
+
+def test_watch(root):
+    """The modified files are checked again, the options reloaded."""
+    reports = []
+    watcher = ScriptedWatcher(root, [
+        [("a.py", "import os\n")],
+        [("b.py", "x=1\n"), ("a.py", "import os\n\nos.getcwd()\n")],
+        [(".kwalitee.yml", "license: false\npydocstyle: false\n"
+                           "excludes: ['.*/b.py']\n")],
+        [("a.py", None)],
+    ])
+
+    errors = watch(root, reports.append, watcher=watcher, iterations=4)
+
+    assert_that(reports[0], equal_to([]))
+    assert_that(reports[1], contains(contains("a.py", has_item(
+        contains_string("F401")))))
+    assert_that(reports[2], contains(
+        equal_to(("a.py", [])),
+        contains("b.py", has_item(contains_string("E225")))))
+    assert_that(reports[3], equal_to([("b.py", [])]))
+    assert_that(reports[4], equal_to([]))
+    assert_that(errors, equal_to({".kwalitee.yml": [], "b.py": None}))
+
+
+class OverflowWatcher(ScriptedWatcher):
+    """Lose the events of the files modified during the burst."""
+
+    def wait(self, timeout=None):
+        if timeout is None:
+            return ScriptedWatcher.wait(self)
+        if not self.steps:
+            return set()
+        ScriptedWatcher.wait(self)
+        return None
+
+
+def test_watch_overflow(root):
+    """The whole tree is checked again once events were lost."""
+    reports = []
+    watcher = OverflowWatcher(root, [
+        [("a.py", "import os\n")],
+        [("b.py", "x=1\n")],
+    ])
+
+    watch(root, reports.append, watcher=watcher, iterations=1)
+
+    assert_that(reports[1], contains(
+        contains("a.py", has_item(contains_string("F401"))),
+        contains("b.py", has_item(contains_string("E225")))))
+
+
+def test_polling_watcher(root):
+    """The scan finds the modified and the deleted files."""
+    watcher = get_watcher(root, polling=True, interval=0.01)
+    assert_that(watcher, is_(instance_of(PollingWatcher)))
+    assert_that(watcher.wait(timeout=0.05), equal_to(set()))
+
+    with open(os.path.join(root, "b.py"), "w") as fh:
+        fh.write("")
+    os.remove(os.path.join(root, "a.py"))
+    assert_that(watcher.wait(timeout=1), equal_to(set(["a.py", "b.py"])))
+
+
+@pytest.mark.skipif(not inotify, reason="inotify_simple is not installed")
+def test_inotify_watcher(root):
+    """The files of the new directories are watched too."""
+    watcher = get_watcher(root)
+    assert_that(watcher, is_(instance_of(InotifyWatcher)))
+    try:
+        os.makedirs(os.path.join(root, "pkg", "sub"))
+        with open(os.path.join(root, "pkg", "sub", "c.py"), "w") as fh:
+            fh.write("")
+        time.sleep(0.1)
+        changed = watcher.wait(timeout=1)
+        with open(os.path.join(root, "pkg", "sub", "c.py"), "w") as fh:
+            fh.write("x = 1\n")
+        changed.update(watcher.wait(timeout=1))
+        assert_that(changed, has_items(os.path.join("pkg", "sub", "c.py")))
+    finally:
+        watcher.close()
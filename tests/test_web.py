@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the webhook service."""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import sqlite3
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+from fake_github import FakeGithub
+from hamcrest import assert_that, contains, equal_to, has_entries, has_item, \
+    is_not
+
+from kwalitee.web import Service
+from kwalitee.worker import get_config
+
+GOOD_MESSAGE = """base: fix of the frobnicator
+
+* FIX Fixes the frobnicator.
+
+Signed-off-by: Herp Derpson <herp.derpson@example.org>
+"""
+
+
+class Running(object):
+    """Service running in a thread."""
+
+    def __init__(self, config):
+        self.service = Service(config)
+        self.loop = asyncio.new_event_loop()
+        self.url = None
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            host, port = self.loop.run_until_complete(
+                self.service.start("127.0.0.1", 0))
+            self.url = "http://{0}:{1}/".format(host, port)
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(self.service.close())
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run)
+        self.thread.start()
+        started.wait(10)
+
+    def post(self, event, payload, secret=None):
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"X-GitHub-Event": event,
+                   "Content-Type": "application/json"}
+        if secret:
+            headers["X-Hub-Signature"] = "sha1=" + hmac.new(
+                secret.encode("utf-8"), body, hashlib.sha1).hexdigest()
+        try:
+            response = urlopen(Request(self.url + "payload", data=body,
+                                       headers=headers), timeout=10)
+        except HTTPError as e:
+            return e.code, json.loads(e.read().decode("utf-8"))
+        return response.getcode(), json.loads(
+            response.read().decode("utf-8"))
+
+    def stats(self):
+        response = urlopen(self.url, timeout=10)
+        return json.loads(response.read().decode("utf-8"))
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(30)
+
+
+@pytest.fixture
+def github(request):
+    """Fake API with a repository."""
+    fake = FakeGithub().start()
+    request.addfinalizer(fake.stop)
+    fake.base = fake.commit("acme/project", "base: initial", {
+        ".kwalitee.yml": b"license: false\npydocstyle: false\n",
+        "AUTHORS.rst": b"- Herp Derpson <herp.derpson@example.org>\n"})
+    return fake
+
+
+@pytest.fixture
+def service(request, github):
+    """Service publishing to the fake API."""
+    running = Running(get_config({"GITHUB_API": github.url,
+                                  "WEBHOOK_SECRET": "s3cr3t",
+                                  "WORKER_PROCESSES": 2}))
+    request.addfinalizer(running.stop)
+    return running
+
+
+def _wait(condition, timeout=30):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_pull_request(github, service):
+    """The event is accepted at once, the job publishes a status later."""
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": b"FROBNICATOR=42\n"},
+                         parent=github.base)
+    status, body = service.post("pull_request", github.pull_request(
+        "acme/project", 1, github.base, head), secret="s3cr3t")
+
+    assert_that(status, equal_to(202))
+    assert_that(body, has_entries({"key": "acme/project#1"}))
+    _wait(lambda: len(github.statuses.get(head, [])) == 2)
+    assert_that(github.statuses[head][-1], has_entries({
+        "state": "error", "description": "1 errors"}))
+    _wait(lambda: service.stats()["reports"])
+    assert_that(service.stats(), has_entries({
+        "queued": 0, "reports": contains(has_entries({
+            "id": body["id"], "state": "error"})),
+        "tenants": has_entries({"acme/project": has_entries({
+            "jobs": has_entries({"queued": 0, "served": 1}),
+            "tasks": has_entries({"served": 2})})})}))
+
+
+def test_superseded(github):
+    """Only the latest head of a pull request is reported."""
+    running = Running(get_config({"GITHUB_API": github.url,
+                                  "WORKER_JOBS": 1,
+                                  "WORKER_PROCESSES": 1}))
+    try:
+        heads = [github.commit("acme/project", GOOD_MESSAGE,
+                               {"frobnicator.py": "FROBNICATOR = {0}\n".format(
+                                   number).encode("ascii")},
+                               parent=github.base)
+                 for number in range(3)]
+        github.delay = 0.2
+        for head in heads:
+            status, _ = running.post("pull_request", github.pull_request(
+                "acme/project", 1, github.base, head, action="synchronize"))
+            assert_that(status, equal_to(202))
+
+        _wait(lambda: len(github.statuses.get(heads[-1], [])) == 2)
+        assert_that(github.statuses[heads[-1]][-1], has_entries({
+            "state": "success"}))
+        for head in heads[:-1]:
+            assert_that([status["state"]
+                         for status in github.statuses.get(head, [])],
+                        is_not(has_item("success")))
+        _wait(lambda: len(running.stats()["reports"]) == 3)
+        stats = running.stats()
+        assert_that(stats["queued"], equal_to(0))
+        assert_that(stats["superseded"] + stats["cancelled"], equal_to(2))
+        assert_that([report["state"]
+                     for report in running.stats()["reports"]],
+                    has_item("success"))
+    finally:
+        github.delay = 0
+        running.stop()
+
+
+def test_signature(github, service):
+    """The payloads whose signature does not match are refused."""
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": b"FROBNICATOR = 42\n"},
+                         parent=github.base)
+    payload = github.pull_request("acme/project", 1, github.base, head)
+
+    assert_that(service.post("pull_request", payload)[0], equal_to(403))
+    assert_that(service.post("pull_request", payload, secret="wrong")[0],
+                equal_to(403))
+    assert_that(github.statuses, equal_to({}))
+
+
+def test_ignored_events(github, service):
+    """The events without anything to check are answered."""
+    assert_that(service.post("ping", {}, secret="s3cr3t"),
+                equal_to((200, {"message": "pong"})))
+    assert_that(service.post("issues", {}, secret="s3cr3t"),
+                equal_to((200, {"message": "nothing to check"})))
+    assert_that(service.post("pull_request", [], secret="s3cr3t")[0],
+                equal_to(400))
+    assert_that(service.post("pull_request", {"action": "opened",
+                                              "pull_request": []},
+                             secret="s3cr3t")[0], equal_to(400))
+    assert_that(service.stats(), has_entries({"queued": 0, "running": 0}))
+
+
+def test_durable_queue(github, tmpdir):
+    """With a durable queue, the jobs are left to the workers."""
+    from kwalitee.github import Github
+    from kwalitee.worker import get_queue, work
+    config = get_config({"GITHUB_API": github.url,
+                         "WORKER_QUEUE": str(tmpdir.join("jobs.sqlite"))})
+    running = Running(config)
+    try:
+        head = github.commit("acme/project", GOOD_MESSAGE,
+                             {"frobnicator.py": b"FROBNICATOR = 42\n"},
+                             parent=github.base)
+        status, body = running.post("pull_request", github.pull_request(
+            "acme/project", 1, github.base, head))
+        assert_that(status, equal_to(202))
+        assert_that(running.stats(), has_entries({
+            "states": {"queued": 1}}))
+
+        # the loop keeps answering while the workers lock the database
+        locked = sqlite3.connect(config["WORKER_QUEUE"],
+                                 isolation_level=None)
+        locked.execute("BEGIN IMMEDIATE")
+        posting = threading.Thread(target=running.post, args=(
+            "pull_request", github.pull_request(
+                "acme/project", 2, github.base, head)))
+        posting.start()
+        time.sleep(0.2)
+        try:
+            urlopen(running.url + "missing", timeout=5)
+        except HTTPError as e:
+            assert_that(e.code, equal_to(404))
+        locked.rollback()
+        locked.close()
+        posting.join(10)
+        assert_that(running.stats(), has_entries({
+            "states": {"queued": 2}}))
+    finally:
+        running.stop()
+    assert_that(github.statuses, equal_to({}))
+
+    queue = get_queue(config)
+    try:
+        assert_that(work(queue, Github(github.url), config, burst=True),
+                    equal_to(2))
+    finally:
+        queue.close()
+    assert_that(github.statuses[head][-1], has_entries({"state": "success"}))
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+
+"""Tests of the check jobs of the webhook service."""
+
+import threading
+
+import pytest
+from fake_github import FakeGithub
+from hamcrest import assert_that, contains, contains_string, equal_to, \
+    has_entries, has_item, has_length
+
+from kwalitee.github import Github, GithubError
+from kwalitee.worker import coalesce, diff_positions, expand, get_job, run_job
+
+GOOD_MESSAGE = """base: fix of the frobnicator
+
+* FIX Fixes the frobnicator.
+
+Signed-off-by: Herp Derpson <herp.derpson@example.org>
+"""
+
+GOOD_FILE = b"""\"\"\"Frobnicator.\"\"\"
+
+FROBNICATOR = 42
+"""
+
+BAD_FILE = b"""\"\"\"Frobnicator.\"\"\"
+
+FROBNICATOR=42
+"""
+
+
+@pytest.fixture
+def github(request):
+    """Fake API with a repository."""
+    fake = FakeGithub().start()
+    request.addfinalizer(fake.stop)
+    fake.base = fake.commit("acme/project", "base: initial", {
+        ".kwalitee.yml": b"license: false\npydocstyle: false\n",
+        "AUTHORS.rst": b"- Herp Derpson <herp.derpson@example.org>\n",
+        "frobnicator.py": GOOD_FILE})
+    return fake
+
+
+def test_diff_positions():
+    """The positions count the lines from the first hunk header."""
+    patch = "\n".join(["@@ -1,2 +1,2 @@",
+                       " a",
+                       "-b",
+                       "+c",
+                       "@@ -10,1 +10,2 @@",
+                       " d",
+                       "+e"])
+    assert_that(diff_positions(patch),
+                equal_to({1: 1, 2: 3, 10: 5, 11: 6}))
+    assert_that(diff_positions(None), equal_to({}))
+
+
+def test_expand():
+    """Optional parts of the templates are dropped when missing."""
+    assert_that(expand("/commits{/sha}", sha="abc"),
+                equal_to("/commits/abc"))
+    assert_that(expand("/commits{/sha}"), equal_to("/commits"))
+    assert_that(expand("/statuses/{sha}", sha="abc"),
+                equal_to("/statuses/abc"))
+
+
+def test_get_job(github):
+    """Only the events with something to check make a job."""
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": BAD_FILE}, parent=github.base)
+    payload = github.pull_request("acme/project", 1, github.base, head)
+    assert_that(get_job("pull_request", payload), has_entries({
+        "key": "acme/project#1", "sha": head, "event": "pull_request"}))
+
+    payload["action"] = "closed"
+    assert_that(get_job("pull_request", payload), equal_to(None))
+
+    payload = github.push("acme/project", "refs/heads/master", github.base,
+                          [head])
+    assert_that(get_job("push", payload), has_entries({
+        "key": "acme/project:refs/heads/master", "sha": head,
+        "commits": contains(has_entries({"sha": head}))}))
+
+    payload["deleted"] = True
+    assert_that(get_job("push", payload), equal_to(None))
+    assert_that(get_job("issues", {}), equal_to(None))
+
+
+def test_run_job_pull_request(github):
+    """The errors are commented, the status and the label are set."""
+    first = github.commit("acme/project", "Fixed stuff",
+                          {"frobnicator.py": BAD_FILE}, parent=github.base)
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"README.rst": b"Frobnicator\n"}, parent=first)
+    job = get_job("pull_request", github.pull_request(
+        "acme/project", 1, github.base, head))
+
+    report = run_job(job, Github(github.url))
+
+    assert_that(report, has_entries({"state": "error", "errors": 4,
+                                     "label": "in_review"}))
+    assert_that(github.statuses[head], contains(
+        has_entries({"state": "pending", "context": "kwalitee"}),
+        has_entries({"state": "error", "description": "4 errors",
+                     "context": "kwalitee"})))
+    assert_that(github.comments[first], contains(
+        has_entries({"body": contains_string("M110 missing component")})))
+    assert_that(github.comments[head], has_length(1))
+    assert_that(github.comments[head], has_item(has_entries({
+        "path": "frobnicator.py", "position": 4,
+        "body": contains_string("E225")})))
+    assert_that(github.labels[("acme/project", 1)], equal_to(["in_review"]))
+
+
+def test_run_job_pull_request_ready(github):
+    """A pull request without errors is ready, the other labels stay."""
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": GOOD_FILE + b"\nFOO = 1\n"},
+                         parent=github.base)
+    github.labels[("acme/project", 1)] = ["bug", "in_work"]
+    job = get_job("pull_request", github.pull_request(
+        "acme/project", 1, github.base, head))
+
+    report = run_job(job, Github(github.url))
+
+    assert_that(report, has_entries({"state": "success", "errors": 0}))
+    assert_that(github.statuses[head][-1], has_entries({
+        "state": "success", "description": "Everything is OK."}))
+    assert_that(github.comments, equal_to({}))
+    assert_that(github.labels[("acme/project", 1)],
+                equal_to(["bug", "in_integration"]))
+
+
+def test_run_job_push(github):
+    """Each pushed commit gets its own status."""
+    first = github.commit("acme/project", GOOD_MESSAGE,
+                          {"frobnicator.py": BAD_FILE}, parent=github.base)
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": GOOD_FILE}, parent=first)
+    job = get_job("push", github.push("acme/project", "refs/heads/master",
+                                      github.base, [first, head]))
+
+    report = run_job(job, Github(github.url))
+
+    assert_that(report, has_entries({"state": "error", "errors": 1}))
+    assert_that(github.statuses[first], contains(has_entries({
+        "state": "error", "description": "1 errors"})))
+    assert_that(github.statuses[head][-1], has_entries({
+        "state": "success"}))
+
+
+def test_run_job_timeout(github):
+    """A job taking too long is abandoned."""
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": BAD_FILE}, parent=github.base)
+    job = get_job("pull_request", github.pull_request(
+        "acme/project", 1, github.base, head))
+
+    report = run_job(job, Github(github.url), timeout=0)
+
+    assert_that(report, has_entries({"state": "timeout"}))
+    assert_that(github.statuses[head][-1], has_entries({
+        "state": "error", "description": contains_string("Timed out")}))
+
+
+def test_run_job_failure(github):
+    """A failing job replaces its pending status."""
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": GOOD_FILE}, parent=github.base)
+    job = get_job("pull_request", github.pull_request(
+        "acme/project", 1, github.base, head))
+    job["url"] += "/missing"
+
+    with pytest.raises(GithubError):
+        run_job(job, Github(github.url))
+
+    assert_that(github.statuses[head][-1], has_entries({
+        "state": "error", "description": "Check failed."}))
+
+
+def test_run_job_cancelled(github):
+    """A cancelled job publishes nothing."""
+    head = github.commit("acme/project", GOOD_MESSAGE,
+                         {"frobnicator.py": BAD_FILE}, parent=github.base)
+    job = get_job("pull_request", github.pull_request(
+        "acme/project", 1, github.base, head))
+    cancelled = threading.Event()
+    cancelled.set()
+
+    report = run_job(job, Github(github.url), cancelled=cancelled)
+
+    assert_that(report, has_entries({"state": "cancelled"}))
+    assert_that(github.statuses[head], contains(has_entries({
+        "state": "pending"})))
+    assert_that(github.comments, equal_to({}))
+    assert_that(github.labels, equal_to({}))
+
+
+def test_coalesce(github):
+    """The commits of a push not reported yet are kept."""
+    first = github.commit("acme/project", GOOD_MESSAGE,
+                          {"frobnicator.py": BAD_FILE}, parent=github.base)
+    second = github.commit("acme/project", GOOD_MESSAGE,
+                           {"frobnicator.py": GOOD_FILE}, parent=first)
+    previous = get_job("push", github.push(
+        "acme/project", "refs/heads/master", github.base, [first]))
+    payload = github.push("acme/project", "refs/heads/master", first,
+                          [second])
+
+    job = coalesce(previous, get_job("push", payload))
+    assert_that([commit["sha"] for commit in job["commits"]],
+                equal_to([first, second]))
+    assert_that(job["sha"], equal_to(second))
+
+    payload["forced"] = True
+    job = coalesce(previous, get_job("push", payload))
+    assert_that([commit["sha"] for commit in job["commits"]],
+                equal_to([second]))
+
+    pull_request = get_job("pull_request", github.pull_request(
+        "acme/project", 1, github.base, second))
+    assert_that(coalesce(previous, pull_request), equal_to(pull_request))
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of kwalitee
+# Copyright (C) 2016 CERN.
+#
+# kwalitee is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# kwalitee is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with kwalitee; if not, write to the Free Software Foundation,
+# Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+#
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization
+# or submit itself to any jurisdiction.
+
+"""Tests of the checks of the working tree."""
+
+import os
+import subprocess
+import time
+
+import pytest
+from hamcrest import assert_that, contains_inanyorder, contains_string, \
+    equal_to, has_entries, has_item, is_, none
+from mock import patch
+
+from kwalitee.options import Options
+from kwalitee.worktree import check_worktree, get_root, list_files
+
+
+@pytest.fixture
+def root(tmpdir, monkeypatch):
+    """Working tree with a tracked, an untracked and an ignored file."""
+    monkeypatch.delenv("GIT_DIR", raising=False)
+    path = tmpdir.mkdir("repository")
+    subprocess.check_call(["git", "init", "-q", str(path)])
+    path.join(".gitignore").write("build/\n")
+    path.mkdir("build").join("generated.py").write("import os\n")
+    path.join("tracked.py").write("import os\n")
+    path.join("untracked.py").write("x = 1\n")
+    path.join("README.rst").write("")
+    subprocess.check_call(["git", "add", "tracked.py"], cwd=str(path))
+    # the files are older than the stat cache
+    past = time.time() - 60
+    for name in ("tracked.py", "untracked.py"):
+        os.utime(str(path.join(name)), (past, past))
+    return str(path)
+
+
+OPTIONS = Options(license=False, pydocstyle=False, excludes=(".*/README",))
+
+
+def test_list_files(root):
+    """The ignored files are left out."""
+    assert_that(get_root(os.path.join(root, "build")), equal_to(root))
+    assert_that(list_files(root),
+                contains_inanyorder(".gitignore", "README.rst", "tracked.py",
+                                    "untracked.py"))
+
+
+def test_stat_cache(root):
+    """Only the modified files are checked again."""
+    errors = check_worktree(root, OPTIONS)
+
+    assert_that(errors, has_entries({
+        "tracked.py": has_item(contains_string("F401")),
+        "untracked.py": [],
+        "README.rst": none()}))
+
+    with patch("kwalitee.kwalitee.check_file",
+               side_effect=AssertionError("checked again")):
+        assert_that(check_worktree(root, OPTIONS), equal_to(errors))
+
+    with open(os.path.join(root, "tracked.py"), "w") as fh:
+        fh.write("import os\n\nos.getcwd()\n")
+    assert_that(check_worktree(root, OPTIONS)["tracked.py"], equal_to([]))
+
+    os.remove(os.path.join(root, "tracked.py"))
+    assert_that(check_worktree(root, OPTIONS).get("tracked.py"), is_(none()))